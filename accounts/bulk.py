@@ -0,0 +1,105 @@
+import csv
+import io
+
+from django.contrib.auth.models import Group, User
+from django.db import transaction
+
+from .roles import ROLE_NAMES, clear_role_cache
+
+# Ids per DELETE/SELECT, within SQLite's bound-parameter limit
+CHUNK_SIZE = 10000
+MAX_BULK_USERS = 100000
+
+
+class RoleAssignmentError(ValueError):
+    pass
+
+
+def _chunks(items, size=CHUNK_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def assign_roles(assignments):
+    """
+    Give every user in `assignments` ({user id: role name}) exactly that
+    role among ROLE_NAMES; other groups are kept. One transaction: a DELETE
+    of their role rows in auth_user_groups per CHUNK_SIZE users, then one
+    bulk INSERT. No m2m_changed signal fires, so the role cache is cleared
+    here, once the change is committed. Returns the number of users.
+    """
+    if len(assignments) > MAX_BULK_USERS:
+        raise RoleAssignmentError(f"More than {MAX_BULK_USERS} users; split the file.")
+    groups = dict(Group.objects.filter(name__in=ROLE_NAMES).values_list("name", "pk"))
+    unknown = set(assignments.values()) - set(groups)
+    if unknown:
+        raise RoleAssignmentError(f"Unknown role: {', '.join(sorted(unknown))}. Run `manage.py setup_roles`?")
+
+    membership = User.groups.through
+    user_ids = list(assignments)
+    with transaction.atomic():
+        for chunk in _chunks(user_ids):
+            membership.objects.filter(user_id__in=chunk, group_id__in=groups.values()).delete()
+        membership.objects.bulk_create(
+            [membership(user_id=user_id, group_id=groups[role]) for user_id, role in assignments.items()],
+            batch_size=CHUNK_SIZE,
+        )
+        # After commit, so no request caches the old roles in between
+        transaction.on_commit(lambda: clear_role_cache(*user_ids))
+    return len(user_ids)
+
+
+def _role_name(value):
+    names = {name.lower(): name for name in ROLE_NAMES}
+    try:
+        return names[value.strip().lower()]
+    except KeyError:
+        raise RoleAssignmentError(f"Unknown role {value!r}; use one of {', '.join(ROLE_NAMES)}.")
+
+
+def read_roles_csv(file, default_role=None):
+    """
+    {username: role name} from an uploaded CSV of `username[,role]` rows. A
+    header row naming a "username" column is skipped; rows without a role
+    get `default_role`.
+    """
+    rows = {}
+    reader = csv.reader(io.TextIOWrapper(file, encoding="utf-8-sig", newline=""))
+    try:
+        for line, row in enumerate(reader, 1):
+            row = [cell.strip() for cell in row]
+            if not row or not row[0] or (line == 1 and row[0].lower() == "username"):
+                continue
+            role = row[1] if len(row) > 1 and row[1] else default_role
+            if not role:
+                raise RoleAssignmentError(f"Line {line}: no role for {row[0]!r} and no default role chosen.")
+            rows[row[0]] = _role_name(role)
+            if len(rows) > MAX_BULK_USERS:
+                raise RoleAssignmentError(f"More than {MAX_BULK_USERS} users; split the file.")
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise RoleAssignmentError(f"Not a UTF-8 CSV file: {e}")
+    return rows
+
+
+def resolve_usernames(roles_by_username):
+    """{user id: role} for {username: role}; fails listing the unknown usernames."""
+    usernames = list(roles_by_username)
+    ids = {}
+    for chunk in _chunks(usernames):
+        ids.update(User.objects.filter(username__in=chunk).values_list("username", "pk"))
+    missing = [u for u in usernames if u not in ids]
+    if missing:
+        more = f" and {len(missing) - 10} more" if len(missing) > 10 else ""
+        raise RoleAssignmentError(f"Unknown users: {', '.join(missing[:10])}{more}.")
+    return {ids[username]: role for username, role in roles_by_username.items()}
+
+
+def check_user_ids(user_ids):
+    """Fails listing the ids in `user_ids` that match no user."""
+    found = set()
+    for chunk in _chunks(list(user_ids)):
+        found.update(User.objects.filter(pk__in=chunk).values_list("pk", flat=True))
+    missing = [str(pk) for pk in user_ids if pk not in found]
+    if missing:
+        more = f" and {len(missing) - 10} more" if len(missing) > 10 else ""
+        raise RoleAssignmentError(f"Unknown user ids: {', '.join(missing[:10])}{more}.")
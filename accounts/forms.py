@@ -0,0 +1,46 @@
+from django import forms
+
+from .bulk import check_user_ids, read_roles_csv, resolve_usernames
+from .roles import ROLE_NAMES
+
+
+class UserIdsField(forms.Field):
+    # Repeated user_ids=<pk> values from the picker's checkboxes
+    widget = forms.MultipleHiddenInput
+
+    def to_python(self, value):
+        if not value:
+            return []
+        try:
+            return sorted({int(v) for v in value})
+        except (TypeError, ValueError):
+            raise forms.ValidationError("Invalid user id.")
+
+
+class BulkRoleForm(forms.Form):
+    role = forms.ChoiceField(
+        choices=[("", "---------")] + [(r, r) for r in ROLE_NAMES],
+        required=False,
+        widget=forms.Select(attrs={"class": "form-select"}),
+    )
+
+    # Either the users ticked in the picker, or a CSV of username[,role] rows
+    user_ids = UserIdsField(required=False)
+    csv_file = forms.FileField(required=False, widget=forms.FileInput(attrs={"class": "form-control", "accept": ".csv"}))
+
+    def clean(self):
+        data = super().clean()
+        if not data.get("user_ids") and not data.get("csv_file"):
+            raise forms.ValidationError("Select users or upload a CSV file.")
+        if data.get("user_ids") and not data.get("role"):
+            self.add_error("role", "Choose a role.")
+        return data
+
+    def assignments(self):
+        """{user id: role name}; raises RoleAssignmentError for bad CSV rows or unknown users."""
+        data = self.cleaned_data
+        check_user_ids(data["user_ids"])
+        assignments = dict.fromkeys(data["user_ids"], data["role"])
+        if data["csv_file"]:
+            assignments.update(resolve_usernames(read_roles_csv(data["csv_file"], data["role"] or None)))
+        return assignments
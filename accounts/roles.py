@@ -0,0 +1,90 @@
+from django.conf import settings
+from django.core.cache import cache
+
+ROLE_NAMES = ["Employee", "Support", "Manager"]
+
+# Caches private to one process: clear_role_cache() could not reach the
+# entries of the other server processes, so roles are never cached in them
+LOCAL_CACHE_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def _cache_key(user_id):
+    return f"accounts:roles:{user_id}"
+
+
+def role_cache_timeout():
+    """ROLE_CACHE_TIMEOUT, or None when roles are not cached across requests."""
+    timeout = getattr(settings, "ROLE_CACHE_TIMEOUT", None)
+    if not timeout or settings.CACHES["default"]["BACKEND"] in LOCAL_CACHE_BACKENDS:
+        return None
+    return timeout
+
+
+def get_roles(user):
+    """
+    Return the set of group names for a user.
+
+    Loaded with a single query and memoised on the user object, so every
+    role check in the same request is free. When ROLE_CACHE_TIMEOUT is set
+    and the default cache is shared between processes, the names are also
+    kept in the cache across requests; anything that changes a user's
+    groups must call clear_role_cache().
+    """
+    if not user.is_authenticated:
+        return frozenset()
+
+    roles = getattr(user, "_role_names", None)
+    if roles is not None:
+        return roles
+
+    timeout = role_cache_timeout()
+    if timeout:
+        roles = cache.get(_cache_key(user.pk))
+    if roles is None:
+        roles = frozenset(user.groups.values_list("name", flat=True))
+        if timeout:
+            cache.set(_cache_key(user.pk), roles, timeout)
+
+    user._role_names = roles
+    return roles
+
+
+async def aget_roles(user):
+    """get_roles() for async views, using the async cache and ORM APIs."""
+    if not user.is_authenticated:
+        return frozenset()
+
+    roles = getattr(user, "_role_names", None)
+    if roles is not None:
+        return roles
+
+    timeout = role_cache_timeout()
+    if timeout:
+        roles = await cache.aget(_cache_key(user.pk))
+    if roles is None:
+        roles = frozenset([name async for name in user.groups.values_list("name", flat=True)])
+        if timeout:
+            await cache.aset(_cache_key(user.pk), roles, timeout)
+
+    user._role_names = roles
+    return roles
+
+
+def clear_role_cache(*user_ids):
+    cache.delete_many([_cache_key(uid) for uid in user_ids])
+
+
+def is_manager(user):
+    return "Manager" in get_roles(user)
+
+
+def is_support(user):
+    return "Support" in get_roles(user)
+
+
+def is_employee(user):
+    roles = get_roles(user)
+    return "Employee" in roles or not ({"Manager", "Support"} & roles)
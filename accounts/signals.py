@@ -0,0 +1,18 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
+
+from .roles import clear_role_cache
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_roles(sender, instance, action, reverse, pk_set, **kwargs):
+    # Covers admin edits and group.user_set changes, not just access_rights
+    if action == "pre_clear" and reverse:
+        clear_role_cache(*instance.user_set.values_list("pk", flat=True))
+    elif action in ("post_add", "post_remove", "post_clear"):
+        if reverse:
+            clear_role_cache(*(pk_set or ()))
+        else:
+            clear_role_cache(instance.pk)
+            instance.__dict__.pop("_role_names", None)
@@ -1,3 +1,117 @@
-from django.test import TestCase
+import tempfile
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .roles import _cache_key, get_roles
+
+# Role caching needs a cache shared by all processes
+SHARED_CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": tempfile.mkdtemp(prefix="helpdesk-test-cache-"),
+    },
+    "template_fragments": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+}
+
+
+@override_settings(ROLE_CACHE_TIMEOUT=300, CACHES=SHARED_CACHES)
+class AccessRightsTests(TestCase):
+    USERS = 60
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command("setup_roles", stdout=StringIO())
+        cls.manager = User.objects.create_user(username="boss", password="pw")
+        cls.manager.groups.add(Group.objects.get(name="Manager"))
+        employee = Group.objects.get(name="Employee")
+        cls.users = User.objects.bulk_create([User(username=f"user{i:03}") for i in range(cls.USERS)])
+        User.groups.through.objects.bulk_create(
+            [User.groups.through(user_id=u.pk, group_id=employee.pk) for u in cls.users]
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.manager)
+
+    def roles(self, user):
+        return sorted(User.objects.get(pk=user.pk).groups.values_list("name", flat=True))
+
+    def test_user_search_pages_by_prefix(self):
+        url = reverse("access_rights_users")
+        first = self.client.get(url, {"q": "user"}).json()
+        self.assertEqual(len(first["results"]), 50)
+        self.assertEqual(first["results"][0], {"id": self.users[0].pk, "username": "user000", "name": "",
+                                               "roles": ["Employee"]})
+        rest = self.client.get(url, {"q": "user", "after": first["next"]}).json()
+        self.assertEqual([u["username"] for u in rest["results"]], [f"user{i:03}" for i in range(50, 60)])
+        self.assertIsNone(rest["next"])
+        self.assertEqual([u["username"] for u in self.client.get(url, {"q": "user05"}).json()["results"]],
+                         [f"user05{i}" for i in range(10)])
+
+    def test_picker_queries_do_not_grow_with_users(self):
+        # session + user, 2 for permissions + roles, the page of users and
+        # their roles, the role choices
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("access_rights"))
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(ctx), 8)
+
+    def test_bulk_assign_replaces_roles(self):
+        picked = self.users[:30]
+        for user in picked:
+            get_roles(user)  # cached
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("access_rights_bulk"),
+                                        {"role": "Support", "user_ids": [u.pk for u in picked]})
+        self.assertRedirects(response, reverse("access_rights"))
+        self.assertLessEqual(len(ctx), 9)
+        self.assertEqual(self.roles(picked[0]), ["Support"])
+        self.assertEqual(self.roles(self.users[30]), ["Employee"])
+        self.assertEqual(get_roles(User.objects.get(pk=picked[-1].pk)), {"Support"})
+
+    def test_roles_are_not_cached_in_a_per_process_cache(self):
+        user = User.objects.get(pk=self.users[0].pk)
+        self.assertEqual(get_roles(user), {"Employee"})
+        self.assertEqual(cache.get(_cache_key(user.pk)), {"Employee"})
+        with self.settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}):
+            user = User.objects.get(pk=self.users[1].pk)
+            self.assertEqual(get_roles(user), {"Employee"})
+            self.assertIsNone(cache.get(_cache_key(user.pk)))
+
+    def test_bulk_assign_from_csv(self):
+        data = b"username,role\nuser001,manager\nuser002\n"
+        response = self.client.post(reverse("access_rights_bulk"), {
+            "role": "Support", "csv_file": SimpleUploadedFile("roles.csv", data, "text/csv"),
+        })
+        self.assertRedirects(response, reverse("access_rights"))
+        self.assertEqual(self.roles(self.users[1]), ["Manager"])
+        self.assertEqual(self.roles(self.users[2]), ["Support"])
+
+    def test_bulk_assign_with_unknown_user_changes_nothing(self):
+        data = b"user001,Manager\nnobody,Manager\n"
+        response = self.client.post(reverse("access_rights_bulk"), {
+            "csv_file": SimpleUploadedFile("roles.csv", data, "text/csv"),
+        }, follow=True)
+        self.assertContains(response, "Unknown users: nobody.")
+        self.assertEqual(self.roles(self.users[1]), ["Employee"])
+
+    def test_bulk_assign_with_unknown_user_id_changes_nothing(self):
+        response = self.client.post(reverse("access_rights_bulk"), {
+            "role": "Manager", "user_ids": [self.users[0].pk, 424242],
+        }, follow=True)
+        self.assertContains(response, "Unknown user ids: 424242.")
+        self.assertEqual(self.roles(self.users[0]), ["Employee"])
+
+    def test_managers_only(self):
+        self.client.force_login(self.users[0])
+        self.assertEqual(self.client.get(reverse("access_rights_users")).status_code, 403)
+        response = self.client.post(reverse("access_rights_bulk"), {"role": "Manager", "user_ids": [self.users[0].pk]})
+        self.assertEqual(response.status_code, 403)
@@ -6,4 +6,6 @@ urlpatterns = [
     path("login/", views.user_login, name="login"),
     path("logout/", views.user_logout, name="logout"),
     path("access-rights/", views.access_rights, name="access_rights"),
+    path("access-rights/users/", views.access_rights_users, name="access_rights_users"),
+    path("access-rights/bulk/", views.access_rights_bulk, name="access_rights_bulk"),
 ]
@@ -0,0 +1,35 @@
+from django.contrib.auth.models import Group, User
+from django.db.models import Prefetch
+
+from .roles import ROLE_NAMES
+
+PAGE_SIZE = 50
+
+# Above any character a username can contain
+_PREFIX_END = "\U0010ffff"
+
+
+def search_users(prefix="", after="", limit=PAGE_SIZE):
+    """
+    Users whose username starts with `prefix` (case-sensitive), in username
+    order after `after`, with their roles prefetched. Returns (users, next
+    cursor or None).
+
+    The prefix is a range on the unique username index, so a page costs the
+    same with 30 users or 30,000 (LIKE 'x%' cannot use the index on SQLite).
+    """
+    users = User.objects.order_by("username").only("pk", "username", "first_name", "last_name", "is_active")
+    if prefix:
+        users = users.filter(username__gte=prefix, username__lt=prefix + _PREFIX_END)
+    if after:
+        users = users.filter(username__gt=after)
+    roles = Group.objects.filter(name__in=ROLE_NAMES).only("name")
+    users = list(users.prefetch_related(Prefetch("groups", queryset=roles, to_attr="role_groups"))[:limit + 1])
+    more = len(users) > limit
+    users = users[:limit]
+    return users, users[-1].username if more else None
+
+
+def user_roles(user):
+    """Role names of a user from search_users()."""
+    return sorted(g.name for g in user.role_groups)
@@ -2,8 +2,13 @@ from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required, permission_required
 from django.contrib.auth.models import Group, Permission, User
 from django.shortcuts import render, redirect
-from django.http import HttpResponseForbidden
+from django.http import HttpResponseBadRequest, HttpResponseForbidden, JsonResponse
 from django.contrib import messages
+from django.urls import reverse
+from .bulk import RoleAssignmentError, assign_roles
+from .forms import BulkRoleForm
+from .roles import ROLE_NAMES, aget_roles, get_roles, is_manager, is_support
+from .users import search_users, user_roles
 
 def user_login(request):
     if request.method == "POST":
@@ -22,61 +27,100 @@ def user_logout(request):
     return redirect("login")
 
 @login_required
-def dashboard(request):
+async def dashboard(request):
     # Simple role-based redirect/summary
-    if request.user.groups.filter(name="Manager").exists():
-        return redirect("manager_ticket_list")
-    if request.user.groups.filter(name="Support").exists():
+    user = await request.auser()
+    await aget_roles(user)
+    if is_manager(user):
+        return redirect("manager_dashboard")
+    if is_support(user):
         return redirect("support_ticket_list")
     # default: Employee
     return redirect("employee_ticket_list")
 
 
+def _user_row(user):
+    return {"id": user.pk, "username": user.username, "name": user.get_full_name(), "roles": user_roles(user)}
+
+
 @login_required
 @permission_required("auth.change_user", raise_exception=True)
 def access_rights(request):
-    if not request.user.groups.filter(name="Manager").exists():
+    if not is_manager(request.user):
         return HttpResponseForbidden("Managers only.")
 
     # Only these roles are managed here (simple)
-    role_names = ["Employee", "Support", "Manager"]
-    roles = Group.objects.filter(name__in=role_names).order_by("name")
-    users = User.objects.all().order_by("username")
+    roles = Group.objects.filter(name__in=ROLE_NAMES).order_by("name")
+
+    if request.method == "POST":
+        user_id = request.POST.get("user_id")
+        role_name = request.POST.get("role_name")  # new field name
+
+        u = User.objects.filter(id=user_id).first()
+        if u is None or role_name not in ROLE_NAMES:
+            return HttpResponseBadRequest("Unknown user or role.")
+        # Replaces the user's other roles (one user = one role)
+        assign_roles({u.pk: role_name})
 
-    # Helper: get a user's current role (first match)
-    def get_user_role(u):
-        user_roles = u.groups.filter(name__in=role_names).values_list("name", flat=True)
-        return list(user_roles)
+        messages.success(request, f"Role updated: {u.username} → {role_name}")
+        return redirect(f"{reverse('access_rights')}?user_id={u.id}")
+
+    # Picker: one page of users by username prefix (the JS version pages
+    # through access_rights_users instead of reloading)
+    query = request.GET.get("q", "").strip()
+    users, next_after = search_users(query, request.GET.get("after", ""))
 
     selected_user = None
     selected_user_roles = []
 
     # If user chosen by GET (so page can show current role)
     selected_user_id = request.GET.get("user_id")
-    if selected_user_id:
+    if selected_user_id and selected_user_id.isdigit():
         selected_user = User.objects.filter(id=selected_user_id).first()
         if selected_user:
-            selected_user_roles = get_user_role(selected_user)
+            selected_user_roles = [name for name in ROLE_NAMES if name in get_roles(selected_user)]
 
-    if request.method == "POST":
-        user_id = request.POST.get("user_id")
-        role_name = request.POST.get("role_name")  # new field name
+    return render(request, "accounts/access_rights.html", {
+        "users": [_user_row(u) for u in users],
+        "query": query,
+        "next_after": next_after,
+        "roles": roles,
+        "role_names": ROLE_NAMES,
+        "selected_user": selected_user,
+        "selected_user_roles": selected_user_roles,
+        "bulk_form": BulkRoleForm(),
+    })
 
-        u = User.objects.get(id=user_id)
-        new_role = Group.objects.get(name=role_name)
 
-        # ✅ Remove all old roles first (so user has ONLY ONE role)
-        u.groups.remove(*roles)
+@login_required
+@permission_required("auth.change_user", raise_exception=True)
+def access_rights_users(request):
+    """Picker endpoint: ?q=<username prefix>&after=<cursor>, as JSON."""
+    if not is_manager(request.user):
+        return HttpResponseForbidden("Managers only.")
+    users, next_after = search_users(request.GET.get("q", "").strip(), request.GET.get("after", ""))
+    return JsonResponse({"results": [_user_row(u) for u in users], "next": next_after})
 
-        # ✅ Add new role
-        u.groups.add(new_role)
 
-        messages.success(request, f"Role updated: {u.username} → {new_role.name}")
-        return redirect(f"/access-rights/?user_id={u.id}")
+@login_required
+@permission_required("auth.change_user", raise_exception=True)
+def access_rights_bulk(request):
+    """Set one role for the ticked users, or roles from a CSV upload, in one transaction."""
+    if not is_manager(request.user):
+        return HttpResponseForbidden("Managers only.")
+    if request.method != "POST":
+        return redirect("access_rights")
 
-    return render(request, "accounts/access_rights.html", {
-        "users": users,
-        "roles": roles,
-        "selected_user": selected_user,
-        "selected_user_roles": selected_user_roles,
-    })
\ No newline at end of file
+    form = BulkRoleForm(request.POST, request.FILES)
+    if not form.is_valid():
+        for errors in form.errors.values():
+            for error in errors:
+                messages.warning(request, error)
+        return redirect("access_rights")
+    try:
+        count = assign_roles(form.assignments())
+    except RoleAssignmentError as e:
+        messages.warning(request, str(e))
+    else:
+        messages.success(request, f"Roles updated for {count} user{'s' if count != 1 else ''}.")
+    return redirect("access_rights")
@@ -0,0 +1,302 @@
+"""
+Per-view request metrics.
+
+RequestMetricsMiddleware times every request and, for a sample of them
+(REQUEST_METRICS_SAMPLE_RATE), counts the SQL queries, the time spent in
+the database, the slowest statement and template render time. Results are
+kept in in-process histograms labelled by URL name and served in the
+Prometheus text format by metrics_view. Nothing depends on DEBUG: queries
+are seen through a database execute wrapper, not connection.queries.
+"""
+import logging
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from functools import cache
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+from django.template.backends.django import DjangoTemplates
+from django.utils.crypto import constant_time_compare
+
+logger = logging.getLogger("helpdesk_support.requests")
+
+# Seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+# Views of these URLconfs get their own series; everything else is "other"
+INSTRUMENTED_URLCONFS = ("tickets.urls", "accounts.urls")
+OTHER = "other"
+
+SLOW_SQL_CHARS = 500
+
+# RequestStats of the current request when it is sampled. Context variables
+# follow the request into sync_to_async threads, so async views count too.
+_current = ContextVar("request_stats", default=None)
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_time", "slowest_sql", "slowest_time", "render_time")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = self.slowest_time = self.render_time = 0.0
+        self.slowest_sql = ""
+
+    def add_query(self, sql, duration):
+        self.queries += 1
+        self.db_time += duration
+        if duration > self.slowest_time:
+            self.slowest_time, self.slowest_sql = duration, sql
+
+
+def record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.add_query(sql, time.perf_counter() - start)
+
+
+def install_query_wrapper(sender=None, connection=None, **kwargs):
+    # Runs on every new connection, in whichever thread opens it
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class TimedTemplate:
+    """Backend template wrapper adding render time to the sampled request."""
+
+    def __init__(self, template):
+        self._template = template
+
+    def __getattr__(self, name):
+        return getattr(self._template, name)
+
+    def render(self, context=None, request=None):
+        stats = _current.get()
+        if stats is None:
+            return self._template.render(context, request)
+        start = time.perf_counter()
+        try:
+            return self._template.render(context, request)
+        finally:
+            stats.render_time += time.perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """
+    The Django template backend, timing top-level renders (includes are part
+    of their parent). Queries run by the template count as render time too.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip((*self.buckets, "+Inf"), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f"{name}_sum{{{labels}}} {self.sum:.6f}"
+        yield f"{name}_count{{{labels}}} {self.count}"
+
+
+class ViewSeries:
+    def __init__(self):
+        self.responses = {}  # status class ("2xx") -> count
+        self.duration = Histogram(LATENCY_BUCKETS)
+        # Sampled requests only
+        self.db_time = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.render_time = Histogram(LATENCY_BUCKETS)
+        self.slowest_time = 0.0
+        self.slowest_sql = ""
+
+
+HISTOGRAMS = (
+    ("duration", "helpdesk_request_duration_seconds", "Time to build the response, all requests."),
+    ("db_time", "helpdesk_request_db_seconds", "Time spent in SQL per sampled request."),
+    ("queries", "helpdesk_request_queries", "SQL queries per sampled request."),
+    ("render_time", "helpdesk_request_render_seconds", "Template render time per sampled request."),
+)
+
+
+class Registry:
+    """Per-view series for this process, safe to update from any thread."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+
+    def record(self, view, status, duration, stats=None):
+        with self.lock:
+            series = self.views.get(view)
+            if series is None:
+                series = self.views[view] = ViewSeries()
+            status_class = f"{status // 100}xx"
+            series.responses[status_class] = series.responses.get(status_class, 0) + 1
+            series.duration.observe(duration)
+            if stats is not None:
+                series.db_time.observe(stats.db_time)
+                series.queries.observe(stats.queries)
+                series.render_time.observe(stats.render_time)
+                if stats.slowest_time > series.slowest_time:
+                    series.slowest_time, series.slowest_sql = stats.slowest_time, stats.slowest_sql
+
+    def reset(self):
+        with self.lock:
+            self.views = {}
+
+    def render(self):
+        """The registry in the Prometheus text exposition format."""
+        with self.lock:
+            views = sorted(self.views.items())
+            lines = [
+                "# HELP helpdesk_requests_total Responses by view and status class.",
+                "# TYPE helpdesk_requests_total counter",
+            ]
+            for view, series in views:
+                for status_class, count in sorted(series.responses.items()):
+                    lines.append(f'helpdesk_requests_total{{view="{view}",status="{status_class}"}} {count}')
+            for attr, name, help_text in HISTOGRAMS:
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+                for view, series in views:
+                    lines.extend(getattr(series, attr).lines(name, f'view="{view}"'))
+            lines += [
+                "# HELP helpdesk_request_slowest_query_seconds Slowest single SQL statement seen per view.",
+                "# TYPE helpdesk_request_slowest_query_seconds gauge",
+            ]
+            for view, series in views:
+                if series.slowest_sql:
+                    # Plain comment lines are ignored by Prometheus but handy when reading by hand
+                    lines.append(f"# slowest_sql view={view} {_one_line(series.slowest_sql)}")
+                    lines.append(f'helpdesk_request_slowest_query_seconds{{view="{view}"}} {series.slowest_time:.6f}')
+        lines.append("")
+        return "\n".join(lines)
+
+
+REGISTRY = Registry()
+
+
+def _one_line(sql):
+    sql = " ".join(sql.split())
+    return sql if len(sql) <= SLOW_SQL_CHARS else sql[:SLOW_SQL_CHARS] + "..."
+
+
+@cache
+def instrumented_names():
+    from importlib import import_module
+
+    return frozenset(
+        p.name for urlconf in INSTRUMENTED_URLCONFS for p in import_module(urlconf).urlpatterns if p.name
+    )
+
+
+def view_label(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None or match.namespace or match.url_name not in instrumented_names():
+        return OTHER
+    return match.url_name
+
+
+class RequestMetricsMiddleware:
+    """
+    Put first in MIDDLEWARE so the timings include the other middleware.
+    Streaming responses are timed until the response object is returned;
+    the body is not.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        connection_created.connect(install_query_wrapper, dispatch_uid="request_metrics")
+        for connection in connections.all(initialized_only=True):
+            install_query_wrapper(connection=connection)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        start, stats, token = self._begin()
+        try:
+            response = self.get_response(request)
+        finally:
+            if token is not None:
+                _current.reset(token)
+        self._end(request, response, start, stats)
+        return response
+
+    async def __acall__(self, request):
+        start, stats, token = self._begin()
+        try:
+            response = await self.get_response(request)
+        finally:
+            if token is not None:
+                _current.reset(token)
+        self._end(request, response, start, stats)
+        return response
+
+    def _begin(self):
+        stats = token = None
+        if random.random() < getattr(settings, "REQUEST_METRICS_SAMPLE_RATE", 1.0):
+            stats = RequestStats()
+            token = _current.set(stats)
+        return time.perf_counter(), stats, token
+
+    def _end(self, request, response, start, stats):
+        duration = time.perf_counter() - start
+        view = view_label(request)
+        REGISTRY.record(view, response.status_code, duration, stats)
+
+        slow_ms = getattr(settings, "REQUEST_METRICS_SLOW_MS", 0)
+        if slow_ms and duration * 1000 >= slow_ms:
+            message = "Slow request %s %s (view %s, status %s): %.0fms"
+            args = [request.method, request.path, view, response.status_code, duration * 1000]
+            if stats is not None:
+                message += ", %d queries in %.0fms, render %.0fms"
+                args += [stats.queries, stats.db_time * 1000, stats.render_time * 1000]
+                if stats.slowest_sql:
+                    message += "; slowest query %.0fms: %s"
+                    args += [stats.slowest_time * 1000, _one_line(stats.slowest_sql)]
+            logger.warning(message, *args)
+
+
+def metrics_view(request):
+    """Prometheus scrape target: staff users, or `Authorization: Bearer <REQUEST_METRICS_TOKEN>`."""
+    token = getattr(settings, "REQUEST_METRICS_TOKEN", "")
+    authorized = token and constant_time_compare(request.headers.get("Authorization", ""), f"Bearer {token}")
+    if not authorized and not request.user.is_staff:
+        return HttpResponseForbidden("Staff or metrics token only.")
+    return HttpResponse(REGISTRY.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
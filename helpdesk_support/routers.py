@@ -0,0 +1,160 @@
+"""
+Read replica routing.
+
+Views decorated with using_replica run their ORM reads on the "replica"
+database alias (REPLICA_DATABASE_URL, see helpdesk_support.database);
+everything else, and every write, uses "default". Without a replica alias,
+or with REPLICA_READS off, all of this is a no-op.
+
+A replica lags behind the primary, so a client that has just written must
+not be sent to it: PrimaryPinMiddleware notices requests that wrote through
+the ORM and sets a cookie that keeps the client's reads on the primary for
+REPLICA_PIN_SECONDS, which covers the redirect after a POST and the next
+page loads. Keep it above the replication lag (replicate_db --interval).
+"""
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA = "replica"
+PIN_COOKIE = "helpdesk_primary"
+
+_replica_reads = ContextVar("replica_reads", default=False)
+# {"wrote": bool} of the current request, set by PrimaryPinMiddleware. A
+# mutable dict so writes made in sync_to_async threads are seen too.
+_request_writes = ContextVar("request_writes", default=None)
+
+
+def replica_configured():
+    return REPLICA in settings.DATABASES and settings.REPLICA_READS
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get() and replica_configured():
+            return REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        writes = _request_writes.get()
+        if writes is not None:
+            writes["wrote"] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # The replica gets its schema with the data (replicate_db)
+        return db != REPLICA
+
+
+@contextmanager
+def replica_reads():
+    """ORM reads in this block go to the replica, when there is one."""
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def _stream_from_replica(content):
+    # Streaming bodies are read after the view returns
+    with replica_reads():
+        yield from content
+
+
+async def _astream_from_replica(content):
+    # Set around each step only: the variable must not leak into the server
+    # code between chunks. sync_to_async copies it into its thread.
+    content = aiter(content)
+    try:
+        while True:
+            with replica_reads():
+                try:
+                    chunk = await anext(content)
+                except StopAsyncIteration:
+                    return
+            yield chunk
+    finally:
+        if hasattr(content, "aclose"):
+            await content.aclose()
+
+
+def _reads_for(request):
+    if request.method in ("GET", "HEAD") and PIN_COOKIE not in request.COOKIES:
+        return replica_reads()
+    return nullcontext()
+
+
+def _finish(response):
+    # Only when this request reads from the replica (not pinned, GET/HEAD)
+    if getattr(response, "streaming", False) and _replica_reads.get() and replica_configured():
+        if response.is_async:
+            response.streaming_content = _astream_from_replica(response.streaming_content)
+        else:
+            response.streaming_content = _stream_from_replica(response.streaming_content)
+    return response
+
+
+def using_replica(view):
+    """
+    View decorator: GET/HEAD requests read from the replica unless the
+    client is pinned to the primary. Put it below login_required, so the
+    session's user is still loaded from the primary.
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            with _reads_for(request):
+                return _finish(await view(request, *args, **kwargs))
+    else:
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            with _reads_for(request):
+                return _finish(view(request, *args, **kwargs))
+    return wrapper
+
+
+class PrimaryPinMiddleware:
+    """Pins clients that wrote in a request to the primary for a while."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        writes = {"wrote": False}
+        token = _request_writes.set(writes)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_writes.reset(token)
+        return self._pin(response, writes)
+
+    async def __acall__(self, request):
+        writes = {"wrote": False}
+        token = _request_writes.set(writes)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_writes.reset(token)
+        return self._pin(response, writes)
+
+    def _pin(self, response, writes):
+        if writes["wrote"] and replica_configured():
+            response.set_cookie(PIN_COOKIE, "1", max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite="Lax")
+        return response
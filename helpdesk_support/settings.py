@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 
 from pathlib import Path
 
+from helpdesk_support.database import databases
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -39,9 +41,14 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     "accounts",
     "tickets",
+    "jobs",
 ]
 
 MIDDLEWARE = [
+    # First, so its timings include all the other middleware
+    'helpdesk_support.instrumentation.RequestMetricsMiddleware',
+    # Before SessionMiddleware, so session writes pin the client too
+    'helpdesk_support.routers.PrimaryPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -55,7 +62,8 @@ ROOT_URLCONF = 'helpdesk_support.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates that also reports render time to the request metrics
+        'BACKEND': 'helpdesk_support.instrumentation.TimedDjangoTemplates',
         'DIRS': [BASE_DIR / "templates"],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -63,6 +71,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'tickets.context_processors.live_updates',
             ],
         },
     },
@@ -74,12 +83,17 @@ WSGI_APPLICATION = 'helpdesk_support.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
-}
+# Configured from the environment (DATABASE_URL, DB_CONN_MAX_AGE, SQLITE_*
+# pragmas, REPLICA_DATABASE_URL), see helpdesk_support/database.py. Defaults
+# to BASE_DIR/db.sqlite3 in WAL mode with persistent connections.
+DATABASES = databases(BASE_DIR)
+
+# List, export and dashboard views read from the "replica" alias when there
+# is one and REPLICA_READS is on. Clients that wrote stay on the primary for
+# REPLICA_PIN_SECONDS.
+DATABASE_ROUTERS = ['helpdesk_support.routers.ReplicaRouter']
+REPLICA_READS = True
+REPLICA_PIN_SECONDS = 15
 
 
 # Password validation
@@ -126,7 +140,76 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    # Ticket attachments are deduplicated by sha256 under MEDIA_ROOT/blobs/
+    "attachments": {"BACKEND": "tickets.storage.ContentAddressedStorage"},
+}
+
 LOGIN_URL = "login"
 LOGIN_REDIRECT_URL = "dashboard"
 LOGOUT_REDIRECT_URL = "login"
 
+# Seconds a user's group names stay cached between requests (0 disables).
+# Role changes through access_rights/admin clear the entry, but only in a
+# cache every server process shares: with a per-process default cache
+# (LocMemCache, as below) a demoted manager would keep their rights in the
+# other processes, so roles are not cached at all. Point CACHES["default"]
+# at Redis/Memcached/the database before turning this on.
+ROLE_CACHE_TIMEOUT = int(os.environ.get("ROLE_CACHE_TIMEOUT", 0))
+
+
+# Rendered fragments of ticket pages (tickets.fragments), replaced whenever
+# the ticket, a comment or an attachment changes. "locmem" caches per server
+# process; "file" shares the cache between the processes of one host, under
+# FRAGMENT_CACHE_DIR. Entries also expire after FRAGMENT_CACHE_TIMEOUT seconds.
+FRAGMENT_CACHE_BACKEND = os.environ.get("FRAGMENT_CACHE_BACKEND", "locmem")
+FRAGMENT_CACHE_DIR = os.environ.get("FRAGMENT_CACHE_DIR", str(BASE_DIR / "cache" / "fragments"))
+FRAGMENT_CACHE_TIMEOUT = 3600
+
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    # Used by the {% cache %} template tag
+    "template_fragments": {
+        "locmem": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "fragments"},
+        "file": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": FRAGMENT_CACHE_DIR},
+    }[FRAGMENT_CACHE_BACKEND] | {"OPTIONS": {"MAX_ENTRIES": 20000}},
+}
+
+
+# Ticket search: "auto" uses SQLite FTS5 when the table exists, else the
+# SearchPosting inverted index ("fts5" / "python" force one or the other).
+# Run `manage.py rebuild_search_index` after switching or on existing data.
+TICKET_SEARCH_BACKEND = "auto"
+
+# Background jobs are queued in the DB and run by `manage.py run_workers`.
+# JOBS_EAGER runs them inline on commit instead (no worker needed).
+JOBS_EAGER = False
+
+# Live ticket updates (/tickets/events/) go through this pub/sub broker.
+# LocalBroker is in-process only: with several server processes, point this
+# at a shared broker class exposing publish(event) / subscribe().
+TICKET_EVENTS_BROKER = "tickets.events.LocalBroker"
+
+# New tickets are assigned to a support user of their department:
+# "least_loaded" (fewest open tickets), "round_robin", or None to leave
+# them unassigned for a manager.
+TICKET_AUTO_ASSIGN = "least_loaded"
+
+# A new ticket is linked to an open ticket of its department from the last
+# TICKET_DUPLICATE_DAYS whose subject and description are at least this
+# similar (estimated Jaccard similarity, 0-1; tickets.similarity). None
+# turns linking off.
+TICKET_DUPLICATE_THRESHOLD = 0.7
+TICKET_DUPLICATE_DAYS = 7
+
+# Per-view request metrics, served at /metrics in the Prometheus text format
+# to staff users or with "Authorization: Bearer <REQUEST_METRICS_TOKEN>".
+# Every request is timed; query count, DB time, slowest query and render
+# time are collected for REQUEST_METRICS_SAMPLE_RATE (0-1) of them. Requests
+# slower than REQUEST_METRICS_SLOW_MS are logged to "helpdesk_support.requests"
+# (0 disables). Figures are per server process.
+REQUEST_METRICS_SAMPLE_RATE = 1.0
+REQUEST_METRICS_SLOW_MS = 1000
+REQUEST_METRICS_TOKEN = os.environ.get("REQUEST_METRICS_TOKEN", "")
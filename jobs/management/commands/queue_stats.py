@@ -0,0 +1,12 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from jobs import queue
+
+
+class Command(BaseCommand):
+    help = "Print background job queue depth and latency as JSON."
+
+    def handle(self, *args, **options):
+        self.stdout.write(json.dumps(queue.stats(), indent=2))
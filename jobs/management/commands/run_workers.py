@@ -0,0 +1,119 @@
+import multiprocessing
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+from django.utils import timezone
+
+from jobs import queue
+
+
+def work_loop(stop, batch, poll_interval, stale_after, once):
+    """Body of one worker process: claim, run, repeat until `stop` is set."""
+    # Shutdown is coordinated by the parent through `stop`
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    processed = 0
+    while not stop.is_set():
+        close_old_connections()
+        jobs = queue.claim(limit=batch, stale_after=stale_after)
+        for job in jobs:
+            queue.run(job)
+            processed += 1
+        if not jobs:
+            if once:
+                break
+            stop.wait(poll_interval)
+    connections.close_all()
+    return processed
+
+
+class Command(BaseCommand):
+    help = "Run background job workers in a process pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=os.cpu_count() or 2)
+        parser.add_argument("--batch", type=int, default=10, help="Jobs claimed per poll.")
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds to wait when idle.")
+        parser.add_argument("--stale-after", type=int, default=600,
+                            help="Re-run RUNNING jobs whose worker has been silent this many seconds.")
+        parser.add_argument("--stats-interval", type=float, default=60.0,
+                            help="Seconds between queue depth/latency reports.")
+        parser.add_argument("--keep-done", type=float, default=7.0,
+                            help="Days to keep DONE jobs; older ones are deleted with each report (0 keeps all).")
+        parser.add_argument("--once", action="store_true", help="Exit once the queue is drained.")
+
+    def handle(self, *args, **options):
+        processes = options["processes"]
+        manager = multiprocessing.Manager()
+        stop = manager.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+
+        # Children must open their own DB connections
+        connections.close_all()
+        loop_args = (stop, options["batch"], options["poll_interval"], options["stale_after"], options["once"])
+
+        processed = 0
+        while True:
+            done, died = self.run_pool(stop, processes, loop_args, options)
+            processed += done
+            if not died or stop.is_set():
+                break
+            # A job that kills its worker every time ends up FAILED (queue.claim)
+            self.stderr.write("A worker process died; restarting the workers.")
+            stop.wait(options["poll_interval"])
+
+        self.report()
+        self.stdout.write(self.style.SUCCESS(f"Workers stopped after {processed} jobs."))
+
+    def run_pool(self, stop, processes, loop_args, options):
+        """
+        Run the workers until they all return. Returns the number of jobs
+        they processed and whether one of them died; when a worker process
+        dies the pool is broken and the other workers are stopped with it.
+        """
+        processed, died = 0, False
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = [pool.submit(work_loop, *loop_args) for _ in range(processes)]
+            self.stdout.write(f"Started {processes} workers.")
+            last_report = time.monotonic()
+            self.purge(options["keep_done"])
+            while not all(f.done() for f in futures):
+                try:
+                    time.sleep(0.5)
+                except KeyboardInterrupt:
+                    self.stdout.write("Stopping workers after their current job...")
+                    stop.set()
+                if time.monotonic() - last_report >= options["stats_interval"]:
+                    self.report()
+                    self.purge(options["keep_done"])
+                    last_report = time.monotonic()
+            for future in futures:
+                try:
+                    processed += future.result()
+                except BrokenProcessPool:
+                    died = True
+                except Exception as e:
+                    self.stderr.write(f"A worker failed: {e!r}")
+                    died = True
+        return processed, died
+
+    def purge(self, days):
+        if days > 0:
+            deleted = queue.purge(timezone.now() - timedelta(days=days))
+            if deleted:
+                self.stdout.write(f"Deleted {deleted} jobs done over {days:g} days ago.")
+            connections.close_all()
+
+    def report(self):
+        s = queue.stats()
+        self.stdout.write(
+            "queue depth {depth} | oldest due {oldest_due_age:.1f}s | done {done_in_window} "
+            "(avg wait {avg_wait:.2f}s, avg run {avg_run:.2f}s)".format(**s)
+        )
+        connections.close_all()
@@ -0,0 +1,152 @@
+import logging
+import random
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Min
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger("jobs")
+
+_registry = {}
+
+BACKOFF_BASE = 5       # seconds before the first retry
+BACKOFF_MAX = 30 * 60  # never wait longer than this between attempts
+
+
+def task(name):
+    """Register a function as a job handler: @task("tickets.index_ticket")."""
+    def decorator(func):
+        _registry[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, payload=None, delay=0, max_attempts=5):
+    """
+    Queue a job once the current transaction commits (immediately when not
+    in one), so workers never pick up work for rows that were rolled back.
+    With JOBS_EAGER the handler runs in-process instead, for dev/tests.
+    """
+    if name not in _registry:
+        raise KeyError(f"Unknown job: {name}")
+    payload = payload or {}
+
+    def push():
+        if getattr(settings, "JOBS_EAGER", False):
+            _registry[name](**payload)
+            return
+        Job.objects.create(
+            name=name,
+            payload=payload,
+            max_attempts=max_attempts,
+            run_at=timezone.now() + timedelta(seconds=delay),
+        )
+
+    transaction.on_commit(push)
+
+
+def backoff(attempts):
+    # Exponential with jitter: ~5s, 10s, 20s, ... capped at BACKOFF_MAX
+    delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def claim(limit=10, stale_after=600):
+    """
+    Mark up to `limit` due jobs RUNNING and return them. Each job is taken
+    with a conditional UPDATE, so concurrent workers never run the same
+    job twice. Jobs left RUNNING by a dead worker for `stale_after`
+    seconds are picked up again; that counts as an attempt, and a job
+    that has used up `max_attempts` is marked FAILED instead, so one that
+    kills its worker every time does not run forever.
+    """
+    now = timezone.now()
+    due = Job.objects.filter(status=Job.Status.QUEUED, run_at__lte=now)
+    stale = Job.objects.filter(status=Job.Status.RUNNING, started_at__lt=now - timedelta(seconds=stale_after))
+    failed = stale.filter(attempts__gte=F("max_attempts")).update(
+        status=Job.Status.FAILED, finished_at=now,
+        last_error=f"Worker stopped responding for {stale_after}s on the last attempt.",
+    )
+    if failed:
+        logger.warning("%s stale jobs failed after their last attempt", failed)
+    stale = stale.filter(attempts__lt=F("max_attempts"))
+    fields = ("pk", "status", "started_at")
+    candidates = list(due.order_by("run_at").values_list(*fields)[:limit])
+    candidates += list(stale.values_list(*fields)[:limit])
+
+    claimed = []
+    for pk, status, started_at in candidates:
+        taken = Job.objects.filter(pk=pk, status=status, started_at=started_at).update(
+            status=Job.Status.RUNNING, started_at=now, attempts=F("attempts") + 1
+        )
+        if taken:
+            claimed.append(pk)
+    return list(Job.objects.filter(pk__in=claimed).order_by("run_at"))
+
+
+def run(job):
+    handler = _registry.get(job.name)
+    started = time.monotonic()
+    try:
+        if handler is None:
+            raise KeyError(f"Unknown job: {job.name}")
+        with transaction.atomic():
+            handler(**job.payload)
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            job.status = Job.Status.QUEUED
+            job.run_at = timezone.now() + timedelta(seconds=backoff(job.attempts))
+        else:
+            job.status = Job.Status.FAILED
+            job.finished_at = timezone.now()
+        logger.warning("job %s #%s failed (attempt %s/%s)", job.name, job.pk, job.attempts, job.max_attempts)
+    else:
+        job.status = Job.Status.DONE
+        job.finished_at = timezone.now()
+        logger.info(
+            "job %s #%s done in %.3fs, %.3fs after enqueue",
+            job.name, job.pk, time.monotonic() - started, (job.started_at - job.created_at).total_seconds(),
+        )
+    job.save(update_fields=["status", "run_at", "finished_at", "last_error"])
+    return job.status
+
+
+def purge(older_than, batch_size=1000):
+    """
+    Delete DONE jobs finished before `older_than` (a datetime), in batches
+    so workers are not held up by one long delete. Returns the number
+    deleted. FAILED jobs are kept for the admin.
+    """
+    old = Job.objects.filter(status=Job.Status.DONE, finished_at__lt=older_than)
+    total = 0
+    while True:
+        deleted, _ = Job.objects.filter(pk__in=list(old.values_list("pk", flat=True)[:batch_size])).delete()
+        total += deleted
+        if deleted < batch_size:
+            return total
+
+
+def stats(window=timedelta(minutes=15)):
+    """Queue depth per status plus wait/run latency of jobs finished within `window`."""
+    now = timezone.now()
+    depth = dict(Job.objects.values_list("status").annotate(n=Count("pk")))
+    oldest = Job.objects.filter(status=Job.Status.QUEUED, run_at__lte=now).aggregate(t=Min("run_at"))["t"]
+    recent = Job.objects.filter(status=Job.Status.DONE, finished_at__gte=now - window).aggregate(
+        wait=Avg(ExpressionWrapper(F("started_at") - F("created_at"), output_field=DurationField())),
+        run=Avg(ExpressionWrapper(F("finished_at") - F("started_at"), output_field=DurationField())),
+        done=Count("pk"),
+    )
+    return {
+        "depth": {status: depth.get(status, 0) for status in Job.Status.values},
+        "oldest_due_age": (now - oldest).total_seconds() if oldest else 0.0,
+        "done_in_window": recent["done"],
+        "avg_wait": recent["wait"].total_seconds() if recent["wait"] else 0.0,
+        "avg_run": recent["run"].total_seconds() if recent["run"] else 0.0,
+    }
@@ -0,0 +1,65 @@
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from . import queue
+from .management.commands import run_workers
+from .models import Job
+
+CRASHED = os.path.join(tempfile.mkdtemp(prefix="helpdesk-test-jobs-"), "crashed")
+
+
+def crash_once(stop, *args):
+    # Stands in for run_workers.work_loop in the (forked) worker processes
+    if not os.path.exists(CRASHED):
+        open(CRASHED, "w").close()
+        os._exit(1)
+    return 0
+
+
+class QueueTests(TestCase):
+    def job(self, **fields):
+        return Job.objects.create(name="tickets.index_ticket", run_at=timezone.now(), **fields)
+
+    def test_stale_jobs_count_as_attempts(self):
+        long_ago = timezone.now() - timedelta(hours=1)
+        retry = self.job(status=Job.Status.RUNNING, started_at=long_ago, attempts=1, max_attempts=3)
+        spent = self.job(status=Job.Status.RUNNING, started_at=long_ago, attempts=3, max_attempts=3)
+        running = self.job(status=Job.Status.RUNNING, started_at=timezone.now(), attempts=3, max_attempts=3)
+
+        with self.assertLogs("jobs", "WARNING"):
+            self.assertEqual([j.pk for j in queue.claim(stale_after=600)], [retry.pk])
+        retry.refresh_from_db()
+        self.assertEqual((retry.status, retry.attempts), (Job.Status.RUNNING, 2))
+        spent.refresh_from_db()
+        self.assertEqual(spent.status, Job.Status.FAILED)
+        self.assertIn("stopped responding", spent.last_error)
+        running.refresh_from_db()
+        self.assertEqual(running.status, Job.Status.RUNNING)
+
+    def test_purge_keeps_recent_and_failed_jobs(self):
+        now = timezone.now()
+        old = [self.job(status=Job.Status.DONE, finished_at=now - timedelta(days=10)) for _ in range(5)]
+        recent = self.job(status=Job.Status.DONE, finished_at=now)
+        failed = self.job(status=Job.Status.FAILED, finished_at=now - timedelta(days=10))
+
+        self.assertEqual(queue.purge(now - timedelta(days=7), batch_size=2), len(old))
+        self.assertEqual(set(Job.objects.values_list("pk", flat=True)), {recent.pk, failed.pk})
+        self.assertEqual(queue.stats()["done_in_window"], 1)
+
+
+class RunWorkersTests(TestCase):
+    def test_dead_worker_is_restarted(self):
+        out, err = StringIO(), StringIO()
+        with mock.patch.object(run_workers, "work_loop", crash_once):
+            call_command("run_workers", "--once", "--processes", "1", "--poll-interval", "0",
+                         stdout=out, stderr=err)
+        self.assertIn("A worker process died; restarting the workers.", err.getvalue())
+        self.assertEqual(out.getvalue().count("Started 1 workers."), 2)
+        self.assertIn("Workers stopped after 0 jobs.", out.getvalue())
@@ -0,0 +1,22 @@
+from django.db.models import Q, Subquery
+
+from accounts.roles import is_manager, is_support
+from .models import SupportProfile, Ticket
+
+
+def visible_tickets(user, model=Ticket):
+    """
+    Tickets a user may open, mirroring the checks in ticket_detail:
+    managers see everything, support sees tickets assigned to them plus
+    unassigned tickets in their department, employees see their own.
+    `model` may be ArchivedTicket, which has the same fields.
+    """
+    if is_manager(user):
+        return model.objects.all()
+    if is_support(user):
+        # A subquery, not a lookup first: no profile makes it NULL, which matches nothing
+        department = SupportProfile.objects.filter(user=user).values("department_id")[:1]
+        return model.objects.filter(
+            Q(assigned_support=user) | Q(department_id=Subquery(department), assigned_support__isnull=True)
+        )
+    return model.objects.filter(employee=user)
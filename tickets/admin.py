@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Department, EmployeeProfile, SupportProfile, Ticket, TicketAttachment, TicketComment
+from .models import (
+    Department, EmployeeProfile, SupportProfile, Ticket, TicketAttachment, TicketComment, AttachmentBlob,
+    ArchivedTicket, ArchivedComment, ArchivedAttachment,
+)
 
 admin.site.register(Department)
 admin.site.register(EmployeeProfile)
@@ -7,3 +10,7 @@ admin.site.register(SupportProfile)
 admin.site.register(Ticket)
 admin.site.register(TicketAttachment)
 admin.site.register(TicketComment)
+admin.site.register(AttachmentBlob)
+admin.site.register(ArchivedTicket)
+admin.site.register(ArchivedComment)
+admin.site.register(ArchivedAttachment)
@@ -4,3 +4,6 @@ class TicketsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tickets'
     verbose_name = 'Helpdesk Tickets'
+
+    def ready(self):
+        from . import signals  # noqa: F401
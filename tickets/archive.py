@@ -0,0 +1,114 @@
+"""
+Archival tier. Closed tickets untouched since a cutoff move, with their
+comments and attachment rows, from the live tables to the Archived* tables
+(same columns, same primary keys), so the tables and indexes the views work
+on only hold the working set. ticket_detail and attachment_preview fall
+back to the archive.
+
+Rows are copied with INSERT ... SELECT and removed with plain DELETEs, one
+transaction per batch: no model signals fire. What they would have done is
+done here instead: search documents and similarity signatures are removed,
+the Closed backlog count goes down, and attachment blobs keep their
+references (archived rows count). Daily and duration rollups keep the
+archived tickets' history. Live tickets linked to an archived one as its
+likely duplicate keep the link.
+"""
+from collections import Counter
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from jobs.queue import enqueue
+from . import metrics, search, similarity
+from .models import ArchivedAttachment, ArchivedComment, ArchivedTicket, Ticket, TicketAttachment, TicketComment
+
+BATCH_SIZE = 500
+
+def archivable(older_than):
+    """Closed tickets last updated before `older_than` (a datetime)."""
+    return Ticket.objects.filter(status=Ticket.Status.CLOSED, updated_at__lt=older_than)
+
+
+def _columns(model):
+    return [f.column for f in model._meta.concrete_fields]
+
+
+def _copy_sql(live, archived, key, count, extra=(), condition=""):
+    # INSERT INTO archive (columns) SELECT columns FROM live WHERE key IN (...);
+    # `extra` columns of the archive table are filled from parameters
+    qn = connection.ops.quote_name
+    columns = [qn(c) for c in _columns(live)]
+    targets = columns + [qn(c) for c in extra]
+    values = columns + ["%s"] * len(extra)
+    return (
+        f"INSERT INTO {qn(archived._meta.db_table)} ({', '.join(targets)}) "
+        f"SELECT {', '.join(values)} FROM {qn(live._meta.db_table)} "
+        f"WHERE {qn(key)} IN ({', '.join(['%s'] * count)}){condition}"
+    )
+
+
+def _delete_sql(model, key, count):
+    qn = connection.ops.quote_name
+    return f"DELETE FROM {qn(model._meta.db_table)} WHERE {qn(key)} IN ({', '.join(['%s'] * count)})"
+
+
+def archive_batch(pks, older_than):
+    """
+    Move the tickets among `pks` that are still archivable. Returns
+    (tickets, comments, attachments) moved.
+    """
+    adapt = connection.ops.adapt_datetimefield_value
+    qn = connection.ops.quote_name
+    with transaction.atomic():
+        # PostgreSQL: lock the tickets so no comment or reopen slips in
+        # between the copy and the delete
+        pks = list(archivable(older_than).filter(pk__in=pks).select_for_update().values_list("pk", flat=True))
+        if not pks:
+            return 0, 0, 0
+        with connection.cursor() as cursor:
+            # Ticket rows first, checking the conditions again: on SQLite this
+            # write takes the database lock, so the batch cannot change under us
+            condition = f" AND {qn('status')} = %s AND {qn('updated_at')} < %s"
+            cursor.execute(
+                _copy_sql(Ticket, ArchivedTicket, "id", len(pks), ["archived_at"], condition),
+                [adapt(timezone.now()), *pks, Ticket.Status.CLOSED.value, adapt(older_than)],
+            )
+            pks = list(ArchivedTicket.objects.filter(pk__in=pks).values_list("pk", flat=True))
+            if not pks:
+                return 0, 0, 0
+            comment_ids = list(TicketComment.objects.filter(ticket_id__in=pks).values_list("pk", flat=True))
+            backlog = Counter(Ticket.objects.filter(pk__in=pks).values_list("department_id", flat=True))
+            cursor.execute(_copy_sql(TicketComment, ArchivedComment, "ticket_id", len(pks)), pks)
+            cursor.execute(_copy_sql(TicketAttachment, ArchivedAttachment, "ticket_id", len(pks)), pks)
+
+            search.unindex_tickets(pks, comment_ids)
+            similarity.unindex_tickets(pks)
+            cursor.execute(_delete_sql(TicketAttachment, "ticket_id", len(pks)), pks)
+            attachments = cursor.rowcount
+            cursor.execute(_delete_sql(TicketComment, "ticket_id", len(pks)), pks)
+            cursor.execute(_delete_sql(Ticket, "id", len(pks)), pks)
+
+        ops = [metrics.backlog_op(d, Ticket.Status.CLOSED, -n) for d, n in backlog.items()]
+        enqueue("tickets.apply_metrics", {"ops": ops})
+    return len(pks), len(comment_ids), attachments
+
+
+def archive(older_than, batch_size=BATCH_SIZE, progress=None):
+    """
+    Archive every archivable ticket, oldest ids first, in batches.
+    Returns (tickets, comments, attachments) moved.
+    """
+    totals = [0, 0, 0]
+    last = 0
+    while True:
+        # Walk the primary key so each batch resumes where the last one stopped
+        pks = list(
+            archivable(older_than).filter(pk__gt=last).order_by("pk").values_list("pk", flat=True)[:batch_size]
+        )
+        if not pks:
+            return tuple(totals)
+        last = pks[-1]
+        for i, n in enumerate(archive_batch(pks, older_than)):
+            totals[i] += n
+        if progress:
+            progress(*totals)
@@ -0,0 +1,165 @@
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import SupportProfile, Ticket
+
+# Tickets that count towards a support user's load
+OPEN_STATUSES = (Ticket.Status.NEW, Ticket.Status.IN_PROGRESS, Ticket.Status.WAITING_EMPLOYEE)
+
+STRATEGIES = {
+    # Fewest open tickets; ties go to whoever was assigned longest ago
+    "least_loaded": ("open_tickets", F("last_assigned_at").asc(nulls_first=True), "pk"),
+    "round_robin": (F("last_assigned_at").asc(nulls_first=True), "pk"),
+}
+CLAIM_ATTEMPTS = 5
+
+
+def load_state(ticket):
+    """
+    (assigned user id, is open) as loaded from the DB, or None when either
+    field is deferred. Recorded on post_init and compared on post_save.
+    """
+    values = ticket.__dict__
+    if "assigned_support_id" not in values or "status" not in values:
+        return None
+    return values["assigned_support_id"], values["status"] in OPEN_STATUSES
+
+
+def load_deltas(before, after):
+    """Counter changes for one ticket going from state `before` to `after`."""
+    deltas = Counter()
+    if before and before[0] and before[1]:
+        deltas[before[0]] -= 1
+    if after and after[0] and after[1]:
+        deltas[after[0]] += 1
+    return deltas
+
+
+def adjust_loads(deltas):
+    for user_id, delta in deltas.items():
+        if delta:
+            SupportProfile.objects.filter(user_id=user_id).update(open_tickets=Greatest(F("open_tickets") + delta, 0))
+
+
+def bulk_load_deltas(pks, assigned_support_id=None, status=None):
+    """
+    Counter changes for setting assigned support and/or status on the
+    tickets `pks` with one UPDATE. Call before the UPDATE runs.
+    """
+    rows = (
+        Ticket.objects.filter(pk__in=pks, assigned_support__isnull=False)
+        .values_list("assigned_support_id")
+        .annotate(total=Count("pk"), open=Count("pk", filter=Q(status__in=OPEN_STATUSES)))
+    )
+    deltas = Counter()
+    for user_id, total, open_count in rows:
+        deltas[user_id] -= open_count
+        if assigned_support_id is None and status in OPEN_STATUSES:
+            deltas[user_id] += total  # same assignee, now open
+    if assigned_support_id is not None and status in OPEN_STATUSES:
+        deltas[assigned_support_id] += len(pks)
+    return deltas
+
+
+def _claim_returning(candidates, order, increment):
+    """
+    Pick and claim the next profile in one statement:
+    UPDATE ... WHERE id = (SELECT ... LIMIT 1) RETURNING user_id. A single
+    write needs no read-then-write lock upgrade, which SQLite refuses under
+    concurrency; on PostgreSQL SKIP LOCKED sends concurrent creates to
+    different people.
+    """
+    subquery = candidates.select_for_update(skip_locked=True, of=("self",)).order_by(*order).values("pk")[:1]
+    sub_sql, sub_params = subquery.query.sql_with_params()
+    qn = connection.ops.quote_name
+    sql = (
+        f"UPDATE {qn(SupportProfile._meta.db_table)} "
+        f"SET {qn('open_tickets')} = {qn('open_tickets')} + %s, {qn('last_assigned_at')} = %s "
+        f"WHERE {qn('id')} = ({sub_sql}) RETURNING {qn('user_id')}"
+    )
+    # FOR UPDATE needs a transaction; no savepoint needed for one statement
+    with transaction.atomic(savepoint=False), connection.cursor() as cursor:
+        cursor.execute(sql, [increment, connection.ops.adapt_datetimefield_value(timezone.now()), *sub_params])
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _claim_compare_and_set(candidates, order, increment):
+    # Backends without UPDATE ... RETURNING: read, then a conditional UPDATE
+    # that only succeeds if nobody claimed the profile in between
+    for _ in range(CLAIM_ATTEMPTS):
+        profile = candidates.order_by(*order).values("pk", "user_id", "open_tickets", "last_assigned_at").first()
+        if profile is None:
+            return None
+        claimed = SupportProfile.objects.filter(
+            pk=profile["pk"], open_tickets=profile["open_tickets"], last_assigned_at=profile["last_assigned_at"]
+        ).update(open_tickets=F("open_tickets") + increment, last_assigned_at=timezone.now())
+        if claimed:
+            return profile["user_id"]
+    return None
+
+
+def _supports_update_returning():
+    if connection.vendor == "postgresql":
+        return True
+    return connection.vendor == "sqlite" and connection.features.can_return_rows_from_bulk_insert  # SQLite 3.35+
+
+
+def auto_assign(ticket, strategy=None):
+    """
+    Assign a new, unassigned ticket to a support user of its department
+    and count it in their load; safe under concurrent creates. The ticket
+    is marked as already counted for the post_save handler. Returns the
+    chosen user id, or None.
+    """
+    strategy = strategy if strategy is not None else getattr(settings, "TICKET_AUTO_ASSIGN", "least_loaded")
+    if not strategy or ticket.assigned_support_id or not ticket.department_id:
+        return None
+    # A profile outlives its user's Support role; only current support staff get tickets
+    candidates = SupportProfile.objects.filter(
+        department_id=ticket.department_id, user__is_active=True, user__groups__name="Support",
+    )
+    is_open = ticket.status in OPEN_STATUSES
+    claim = _claim_returning if _supports_update_returning() else _claim_compare_and_set
+
+    user_id = claim(candidates, STRATEGIES[strategy], int(is_open))
+    if user_id is not None:
+        ticket.assigned_support_id = user_id
+        ticket._load_state = (user_id, is_open)
+    return user_id
+
+
+def department_support(ticket):
+    """Support users who can take `ticket` (plus its current assignee), least loaded first."""
+    return (
+        User.objects.filter(
+            Q(supportprofile__department_id=ticket.department_id) | Q(pk=ticket.assigned_support_id),
+            groups__name="Support",
+        )
+        .select_related("supportprofile")
+        .order_by("supportprofile__open_tickets", "username")
+    )
+
+
+def load_label(user):
+    profile = getattr(user, "supportprofile", None)  # None for support users without a profile
+    return f"{user.username} ({profile.open_tickets} open)" if profile else user.username
+
+
+def recount_loads():
+    """Recompute every open_tickets counter from the tickets table. Returns the number of profiles."""
+    counts = dict(
+        Ticket.objects.filter(status__in=OPEN_STATUSES, assigned_support__isnull=False)
+        .values_list("assigned_support_id").annotate(n=Count("pk"))
+    )
+    profiles = list(SupportProfile.objects.only("pk", "user_id", "open_tickets"))
+    for profile in profiles:
+        profile.open_tickets = counts.get(profile.user_id, 0)
+    SupportProfile.objects.bulk_update(profiles, ["open_tickets"], batch_size=500)
+    return len(profiles)
@@ -0,0 +1,278 @@
+"""
+Per-view benchmark: drives every URL of tickets/urls.py with realistic
+arguments picked from the database (e.g. one made by `seed_helpdesk`) and
+reports latency percentiles and queries per request. Used by the
+bench_views command; results are plain JSON so runs can be compared.
+"""
+import json
+import platform
+import random
+import re
+import statistics
+import subprocess
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from contextlib import nullcontext
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Max, Min
+from django.test import AsyncClient, Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Department, SupportProfile, Ticket, TicketAttachment
+
+SEARCH_TERMS = ("printer", "vpn password", "laptop slow", "invoice", "access denied", "air conditioning")
+BULK_TICKETS = 50
+
+
+def latency_summary(latencies):
+    """p50/p95/p99 and mean in milliseconds from latencies in seconds."""
+    latencies = sorted(latencies)
+    if not latencies:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "mean_ms": None}
+    q = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        "p50_ms": round(q[49] * 1000, 2),
+        "p95_ms": round(q[94] * 1000, 2),
+        "p99_ms": round(q[98] * 1000, 2),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2),
+    }
+
+
+class Fixtures:
+    """Users and objects the cases pick from, sampled once from the database."""
+
+    def __init__(self, sample=500, seed=0):
+        self.rng = random.Random(seed)
+        self.manager = User.objects.filter(groups__name="Manager", is_active=True).order_by("pk").first()
+        busiest = SupportProfile.objects.select_related("user").order_by("-open_tickets").first()
+        self.support = busiest.user if busiest else None
+        self.tickets = self._sample(Ticket, sample)
+        self.attachments = self._sample(TicketAttachment, sample)
+        latest = Ticket.objects.order_by("-pk").values("employee_id").first()
+        self.employee = User.objects.get(pk=latest["employee_id"]) if latest else None
+        self.employee_tickets = list(
+            Ticket.objects.filter(employee=self.employee).order_by("-created_at").values_list("pk", flat=True)[:sample]
+        ) if self.employee else []
+        self.department = Department.objects.order_by("pk").values_list("pk", flat=True).first()
+        if not (self.manager and self.support and self.employee and self.tickets):
+            raise ValueError("Needs a manager, a support user with a profile and tickets: run `manage.py seed_helpdesk`.")
+
+    def _sample(self, model, size):
+        # Random pks across the whole id range (an index lookup, not ORDER BY RANDOM())
+        bounds = model.objects.aggregate(low=Min("pk"), high=Max("pk"))
+        if bounds["low"] is None:
+            return []
+        wanted = {self.rng.randint(bounds["low"], bounds["high"]) for _ in range(size)}
+        return sorted(model.objects.filter(pk__in=wanted).values_list("pk", flat=True))
+
+    def ticket(self):
+        return self.rng.choice(self.tickets)
+
+
+# name -> (role, method, url and data builder, flags). "write" cases change
+# data: the client runner rolls them back, the server runner skips them.
+# "stream" responses are read to the end; "open" streams are never read.
+# "asgi" cases only work under ASGI: the client runner sends them through
+# the async test client.
+
+def _export_data(f):
+    return {"format": "jsonl", "from": (timezone.localdate() - timedelta(days=7)).isoformat(), "status": "NEW"}
+
+
+CASES = {
+    "employee_ticket_list": ("employee", "get", lambda f: (reverse("employee_ticket_list"), None), ()),
+    "ticket_create": ("employee", "post", lambda f: (reverse("ticket_create"), {
+        "department": f.department, "subject": "Benchmark ticket", "description": "Created by bench_views.",
+    }), ("write",)),
+    "manager_ticket_list": ("manager", "get", lambda f: (reverse("manager_ticket_list"), None), ()),
+    "manager_dashboard": ("manager", "get", lambda f: (reverse("manager_dashboard"), None), ()),
+    "manager_ticket_bulk": ("manager", "post", lambda f: (reverse("manager_ticket_bulk"), {
+        "action": "close", "ticket_ids": f.rng.sample(f.tickets, min(BULK_TICKETS, len(f.tickets))),
+    }), ("write",)),
+    "manager_ticket_export": ("manager", "get", lambda f: (reverse("manager_ticket_export"), _export_data(f)), ("stream",)),
+    "manager_ticket_assign": ("manager", "get", lambda f: (reverse("manager_ticket_assign", args=[f.ticket()]), None), ()),
+    "manager_ticket_duplicate": (
+        "manager", "get", lambda f: (reverse("manager_ticket_duplicate", args=[f.ticket()]), None), ("write",),
+    ),
+    "support_ticket_list": ("support", "get", lambda f: (reverse("support_ticket_list"), None), ()),
+    "ticket_search": ("manager", "get", lambda f: (reverse("ticket_search"), {"q": f.rng.choice(SEARCH_TERMS)}), ()),
+    "ticket_events": ("employee", "get", lambda f: (reverse("ticket_events"), None), ("open", "asgi")),
+    "ticket_detail": ("manager", "get", lambda f: (reverse("ticket_detail", args=[f.ticket()]), None), ()),
+    "ticket_add_comment": ("employee", "post", lambda f: (
+        reverse("ticket_add_comment", args=[f.rng.choice(f.employee_tickets)]), {"message": "Any update?"},
+    ), ("write",)),
+    "attachment_preview": ("manager", "get", lambda f: (
+        reverse("attachment_preview", args=[f.rng.choice(f.attachments or [0])]), None,
+    ), ()),
+}
+
+
+def _read(response):
+    if getattr(response, "streaming", False):
+        for _ in response:
+            pass
+
+
+def run_client(fixtures, requests=50, warmup=3, views=None):
+    """Run each case in-process through the test client. Returns {view: summary}."""
+    clients, async_clients = {}, {}
+    for role in ("employee", "support", "manager"):
+        clients[role], async_clients[role] = Client(), AsyncClient()
+        clients[role].force_login(getattr(fixtures, role))
+        async_clients[role].force_login(getattr(fixtures, role))
+
+    results = {}
+    for name, (role, method, build, flags) in CASES.items():
+        if views and name not in views:
+            continue
+        if "asgi" in flags:
+            send = async_to_sync(getattr(async_clients[role], method))
+        else:
+            send = getattr(clients[role], method)
+        latencies, queries, errors = [], [], 0
+        for i in range(warmup + requests):
+            url, data = build(fixtures)
+            # Writes run in a transaction that is rolled back, to keep runs
+            # repeatable; their on-commit jobs are therefore not counted
+            write = "write" in flags
+            with CaptureQueriesContext(connection) as ctx, transaction.atomic() if write else nullcontext():
+                started = time.perf_counter()
+                response = send(url, data)
+                if "stream" in flags:
+                    _read(response)
+                elapsed = time.perf_counter() - started
+                response.close()
+                if write:
+                    transaction.set_rollback(True)
+            if i >= warmup:
+                latencies.append(elapsed)
+                queries.append(len(ctx))
+                errors += response.status_code >= 400 and response.status_code != 404
+        results[name] = _summary(latencies, errors, queries)
+    return results
+
+
+def _summary(latencies, errors, queries=None):
+    summary = {"requests": len(latencies), "errors": errors, **latency_summary(latencies)}
+    if queries:
+        summary["queries_mean"] = round(statistics.fmean(queries), 1)
+        summary["queries_max"] = max(queries)
+    else:
+        summary["queries_mean"] = summary["queries_max"] = None
+    return summary
+
+
+METRIC_RE = re.compile(r'^helpdesk_request_queries_(sum|count)\{view="([^"]+)"\} ([0-9.e+-]+)$', re.M)
+
+
+def _scrape_queries(server, token):
+    # Query totals per view from the server's request metrics (/metrics), if reachable
+    request = urllib.request.Request(server.rstrip("/") + "/metrics")
+    if token:
+        request.add_header("Authorization", f"Bearer {token}")
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            text = response.read().decode()
+    except OSError:
+        return None
+    totals = {}
+    for kind, view, value in METRIC_RE.findall(text):
+        totals.setdefault(view, {})[kind] = float(value)
+    return totals
+
+
+def run_server(fixtures, server, requests=50, warmup=3, views=None, metrics_token=""):
+    """
+    Run the read-only cases over HTTP against a running server sharing this
+    database (sessions are created here). Queries per request come from the
+    server's /metrics when it can be read with `metrics_token`.
+    """
+    cookies = {}
+    for role in ("employee", "support", "manager"):
+        client = Client()
+        client.force_login(getattr(fixtures, role))
+        cookies[role] = f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+
+    results = {}
+    for name, (role, method, build, flags) in CASES.items():
+        if (views and name not in views) or "write" in flags or "open" in flags:
+            continue
+        before = _scrape_queries(server, metrics_token)
+        latencies, errors = [], 0
+        for i in range(warmup + requests):
+            url, data = build(fixtures)
+            if data:
+                url += "?" + urllib.parse.urlencode(data, doseq=True)
+            request = urllib.request.Request(server.rstrip("/") + url, headers={"Cookie": cookies[role]})
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=60) as response:
+                    response.read()
+                    failed = False
+            except urllib.error.HTTPError as e:
+                failed = e.code != 404
+            except OSError:
+                failed = True
+            if i >= warmup:
+                latencies.append(time.perf_counter() - started)
+                errors += failed
+        summary = _summary(latencies, errors)
+        after = _scrape_queries(server, metrics_token)
+        if before is not None and after is not None and name in after:
+            old = before.get(name, {"sum": 0, "count": 0})
+            count = after[name]["count"] - old["count"]
+            if count:
+                summary["queries_mean"] = round((after[name]["sum"] - old["sum"]) / count, 1)
+        results[name] = summary
+    return results
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=settings.BASE_DIR, timeout=5,
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def environment(mode, requests):
+    return {
+        "timestamp": timezone.now().isoformat(timespec="seconds"),
+        "git": _git_revision(),
+        "mode": mode,
+        "requests_per_view": requests,
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "database": connection.vendor,
+        "tickets": Ticket.objects.count(),
+    }
+
+
+def compare(baseline, current):
+    """Rows of (view, p95 before, p95 after, change %, queries before, queries after)."""
+    rows = []
+    for name, now in current["views"].items():
+        then = baseline["views"].get(name)
+        if not then:
+            continue
+        change = None
+        if then.get("p95_ms") and now.get("p95_ms") is not None:
+            change = round((now["p95_ms"] - then["p95_ms"]) / then["p95_ms"] * 100, 1)
+        rows.append((name, then.get("p95_ms"), now.get("p95_ms"), change, then.get("queries_mean"), now.get("queries_mean")))
+    return rows
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
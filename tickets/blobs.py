@@ -0,0 +1,78 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ArchivedAttachment, AttachmentBlob, TicketAttachment
+from .storage import attachment_storage, blob_digest
+
+
+def add_references(counts):
+    if not counts:
+        return
+    AttachmentBlob.objects.bulk_create([AttachmentBlob(name=name) for name in counts], ignore_conflicts=True)
+    now = timezone.now()
+    for name, n in counts.items():
+        AttachmentBlob.objects.filter(name=name).update(ref_count=F("ref_count") + n, updated_at=now)
+
+
+def retain_blobs(attachments):
+    """Add one reference per attachment to its blob (use after bulk_create, which skips signals)."""
+    add_references(Counter(a.file.name for a in attachments if blob_digest(a.file.name)))
+
+
+def reserve_blob(name):
+    """
+    Keep collect_garbage away from blob `name` for its minimum age. A save of
+    content that is already stored reuses the file, and its reference is
+    only added once the attachment row exists. If a collection is deleting
+    the blob, this waits for it to commit, so the storage's existence check
+    that follows sees the file gone and writes it again.
+    """
+    with transaction.atomic():
+        AttachmentBlob.objects.bulk_create([AttachmentBlob(name=name)], ignore_conflicts=True)
+        AttachmentBlob.objects.filter(name=name).update(updated_at=timezone.now())
+
+
+def release_blob(name):
+    if blob_digest(name):
+        AttachmentBlob.objects.filter(name=name).update(ref_count=F("ref_count") - 1, updated_at=timezone.now())
+
+
+def recount_blobs():
+    """Recompute every ref_count from attachment rows, live and archived. Returns the number of blobs."""
+    counts = Counter(
+        name
+        for model in (TicketAttachment, ArchivedAttachment)
+        for name in model.objects.values_list("file", flat=True).iterator()
+        if blob_digest(name)
+    )
+    with transaction.atomic():
+        AttachmentBlob.objects.update(ref_count=0)
+        add_references(counts)
+    return AttachmentBlob.objects.count()
+
+
+def collect_garbage(older_than):
+    """
+    Delete blobs nobody has referenced since `older_than` (a datetime).
+    Returns the names removed from storage.
+    """
+    storage = attachment_storage()
+    removed = []
+    candidates = AttachmentBlob.objects.filter(ref_count__lte=0, updated_at__lt=older_than)
+    for blob in candidates.iterator():
+        # Conditional delete: skip blobs referenced or reserved since the
+        # query ran. The deleted row stays locked until the file is gone,
+        # which holds off reserve_blob() for the same content.
+        with transaction.atomic():
+            deleted, _ = AttachmentBlob.objects.filter(
+                pk=blob.pk, ref_count__lte=0, updated_at__lt=older_than,
+            ).delete()
+            if deleted and not any(
+                m.objects.filter(file=blob.name).exists() for m in (TicketAttachment, ArchivedAttachment)
+            ):
+                storage.delete(blob.name)
+                removed.append(blob.name)
+    return removed
@@ -0,0 +1,97 @@
+from django.db import transaction
+from django.db.models import Case, F, When
+from django.utils import timezone
+
+from jobs.queue import enqueue
+from . import fragments, metrics
+from .assignment import adjust_loads, bulk_load_deltas
+from .events import comment_event, get_broker, ticket_event
+from .models import Ticket, TicketComment
+
+# Keeps the id list of one action within SQLite's bound-parameter limit
+MAX_BULK_TICKETS = 10000
+
+ASSIGN, STATUS, CLOSE = "assign", "status", "close"
+
+
+class BulkActionError(ValueError):
+    pass
+
+
+def _changes(action, support=None, status=None):
+    if action == ASSIGN:
+        # Same as manager_ticket_assign: assigning starts the work
+        return {"assigned_support": support, "status": Ticket.Status.IN_PROGRESS}
+    if action == STATUS:
+        return {"status": status}
+    if action == CLOSE:
+        return {"status": Ticket.Status.CLOSED}
+    raise BulkActionError(f"Unknown action {action!r}.")
+
+
+def _audit_message(action, support=None, status=None):
+    if action == ASSIGN:
+        return f"Bulk action: assigned to {support.username}."
+    if action == STATUS:
+        return f"Bulk action: status set to {Ticket.Status(status).label}."
+    return "Bulk action: closed."
+
+
+def apply_bulk_action(queryset, action, actor, support=None, status=None):
+    """
+    Apply one change to every ticket in `queryset` that it would actually
+    change: one SELECT for the ids, one UPDATE and one bulk INSERT of
+    internal audit comments, all in one transaction. Save signals do not
+    fire, so support load, metrics, indexing, cached fragments and live
+    updates are handled here. Returns the number of tickets changed.
+    """
+    changes = _changes(action, support, status)
+
+    with transaction.atomic():
+        pks = list(
+            queryset.exclude(**changes).select_for_update().order_by().values_list("pk", flat=True)[:MAX_BULK_TICKETS + 1]
+        )
+        if len(pks) > MAX_BULK_TICKETS:
+            raise BulkActionError(f"More than {MAX_BULK_TICKETS} tickets match; narrow the selection.")
+        if not pks:
+            return 0
+
+        support_id = changes["assigned_support"].pk if "assigned_support" in changes else None
+        deltas = bulk_load_deltas(pks, support_id, changes["status"])
+        now = timezone.now()
+        metric_ops = metrics.bulk_ops(pks, changes["status"], now)
+        if changes["status"] in metrics.DONE_STATUSES:
+            # Stamp only tickets that were open; the CASE sees the old status
+            resolved_at = Case(When(status__in=metrics.OPEN_STATUSES, then=now), default=F("resolved_at"))
+        else:
+            resolved_at = None
+        Ticket.objects.filter(pk__in=pks).update(updated_at=now, resolved_at=resolved_at, **changes)
+        adjust_loads(deltas)
+        if metric_ops:
+            enqueue("tickets.apply_metrics", {"ops": metric_ops})
+        message = _audit_message(action, support, status)
+        comments = TicketComment.objects.bulk_create(
+            [TicketComment(ticket_id=pk, author=actor, message=message, is_internal=True) for pk in pks]
+        )
+
+        comment_ids = [c.pk for c in comments if c.pk is not None]
+        if comment_ids:
+            enqueue("tickets.index_comments", {"comment_ids": comment_ids})
+        fragments.bump_on_commit(*pks)
+        transaction.on_commit(lambda: _publish(pks, comments))
+    return len(pks)
+
+
+def _publish(pks, comments):
+    tickets = {
+        t.pk: t for t in Ticket.objects.filter(pk__in=pks).select_related("assigned_support").only(
+            "pk", "ticket_id", "subject", "status", "employee", "department",
+            "assigned_support__username", "updated_at",
+        )
+    }
+    broker = get_broker()
+    for comment in comments:
+        ticket = tickets.get(comment.ticket_id)
+        if ticket is not None:
+            broker.publish(ticket_event(ticket))
+            broker.publish(comment_event(comment, ticket))
@@ -0,0 +1,142 @@
+"""
+Conditional GET for the ticket pages. Before a decorated view runs, a cheap
+precheck computes the page's ETag from the rows it shows (the ticket's
+updated_at and its latest comment and attachment, or the id and updated_at
+of every row of a list page) plus the user, their roles and their CSRF
+cookie (the page embeds a token). A client revalidating an unchanged page
+gets 304 Not Modified without the view running. Pages with a pending flash
+message are always rendered and get no ETag.
+
+ETags are HMACs under SECRET_KEY, so they say nothing about the ticket and
+cannot be guessed for a ticket the user was never shown. The precheck only
+reads rows the user may see (tickets.access), so a ticket they may not
+open gets no validators at all: the view runs and refuses it, whatever
+If-Modified-Since says. Responses are
+marked "private, no-cache": browsers keep them but revalidate every time.
+"""
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.db.models import Count, Max, OuterRef, Subquery, Sum
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.crypto import salted_hmac
+from django.utils.http import http_date
+
+from accounts.roles import get_roles, is_manager
+from .access import visible_tickets
+from .models import ArchivedTicket, SupportProfile, Ticket, TicketAttachment, TicketComment
+from .pagination import keyset_paginate
+
+
+def _etag(request, *parts):
+    value = repr((request.user.pk, sorted(get_roles(request.user)),
+                  request.COOKIES.get(settings.CSRF_COOKIE_NAME), *parts))
+    return f'W/"{salted_hmac("tickets.conditional", value).hexdigest()[:32]}"'
+
+
+def _latest(model, field):
+    # (count, newest `field`) of the ticket's rows, from the (ticket, ...) index
+    rows = model.objects.filter(ticket=OuterRef("pk")).order_by().values("ticket")
+    return (
+        Subquery(rows.annotate(n=Count("pk")).values("n")),
+        Subquery(rows.annotate(last=Max(field)).values("last")),
+    )
+
+
+def ticket_state(request, pk):
+    """
+    (ETag, Last-Modified) of a ticket detail page, or (None, None) if there
+    is no such ticket or the user may not open it.
+    """
+    comments, last_comment = _latest(TicketComment, "created_at")
+    attachments, last_attachment = _latest(TicketAttachment, "uploaded_at")
+    fields = dict(comment_count=comments, last_comment=last_comment, attachment_count=attachments,
+                  last_attachment=last_attachment)
+    if is_manager(request.user):
+        # The assignment dropdown shows the department's support load
+        profiles = SupportProfile.objects.filter(department_id=OuterRef("department_id")).order_by().values(
+            "department_id"
+        )
+        fields["load"] = Subquery(profiles.annotate(n=Sum("open_tickets")).values("n"))
+        fields["last_assigned"] = Subquery(profiles.annotate(last=Max("last_assigned_at")).values("last"))
+    state = visible_tickets(request.user).filter(pk=pk).values("updated_at", **fields).first()
+    if state is None:
+        # Archived tickets no longer change
+        state = visible_tickets(request.user, ArchivedTicket).filter(pk=pk).values(
+            "updated_at", "archived_at"
+        ).first()
+    if state is None:
+        return None, None
+    modified = max(t for t in (state["updated_at"], state.get("last_comment"), state.get("last_attachment")) if t)
+    return _etag(request, "ticket", pk, sorted(state.items())), modified
+
+
+def _page(queryset, request, prefix=""):
+    # The rows keyset_paginate() would show, and whether there are more
+    page = keyset_paginate(queryset.only("pk", "created_at", "updated_at"), request, prefix)
+    return [(t.pk, t.updated_at) for t in page], page.has_next, page.has_previous
+
+
+def list_state(querysets):
+    """
+    ETag function for a list view: `querysets(request)` returns
+    {prefix: queryset} of the paginated lists on the page, or None when the
+    user may not see the page.
+    """
+    def state(request, *args, **kwargs):
+        lists = querysets(request)
+        if lists is None:
+            return None, None
+        pages = sorted((prefix, _page(qs, request, prefix)) for prefix, qs in lists.items())
+        return _etag(request, request.resolver_match.view_name, request.GET.urlencode(), pages), None
+    return state
+
+
+def conditional(state_func):
+    """
+    View decorator: GET/HEAD requests get ETag (and Last-Modified, when
+    `state_func` returns one) and a 304 when the client's copy is current.
+    `state_func(request, *args, **kwargs)` returns (etag, last_modified).
+    Put it below login_required.
+    """
+    def check(request, *args, **kwargs):
+        if len(get_messages(request)):
+            # Shown once, so this response must not be reused; not consumed here
+            return None, None, None
+        etag, modified = state_func(request, *args, **kwargs)
+        last_modified = int(modified.timestamp()) if modified else None
+        return get_conditional_response(request, etag=etag, last_modified=last_modified), etag, last_modified
+
+    def finish(request, response, etag, last_modified):
+        if response.status_code in (200, 304):
+            if etag:
+                response.headers.setdefault("ETag", etag)
+            if last_modified:
+                response.headers.setdefault("Last-Modified", http_date(last_modified))
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                if request.method not in ("GET", "HEAD"):
+                    return await view(request, *args, **kwargs)
+                request.user = await request.auser()
+                response, *state = await sync_to_async(check)(request, *args, **kwargs)
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                return finish(request, response, *state)
+        else:
+            @wraps(view)
+            def wrapper(request, *args, **kwargs):
+                if request.method not in ("GET", "HEAD"):
+                    return view(request, *args, **kwargs)
+                response, *state = check(request, *args, **kwargs)
+                if response is None:
+                    response = view(request, *args, **kwargs)
+                return finish(request, response, *state)
+        return wrapper
+    return decorator
@@ -0,0 +1,6 @@
+from .events import streaming_supported
+
+
+def live_updates(request):
+    # Pages only open the event stream when it can be served (tickets.events)
+    return {"live_updates": streaming_supported(request)}
@@ -0,0 +1,138 @@
+import asyncio
+import itertools
+import json
+import threading
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.utils.module_loading import import_string
+
+_broker = None
+
+
+class Subscription:
+    def __init__(self, broker, loop, maxsize):
+        self.broker = broker
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def _put(self, event):
+        # Runs on the subscriber's loop. A consumer this far behind has to
+        # resync from the page anyway, so drop instead of growing unbounded.
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    """
+    In-process pub/sub. publish() may be called from any thread (signal
+    handlers run in the request/worker thread); events are handed to each
+    subscriber's event loop. Only sees events published by this process:
+    swap in a shared broker via TICKET_EVENTS_BROKER for multi-process
+    deployments.
+    """
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def publish(self, event):
+        event = {**event, "id": next(self._ids)}
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            try:
+                sub.loop.call_soon_threadsafe(sub._put, event)
+            except RuntimeError:  # loop already closed
+                self.unsubscribe(sub)
+
+    def subscribe(self, maxsize=100):
+        sub = Subscription(self, asyncio.get_running_loop(), maxsize)
+        with self._lock:
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+
+def streaming_supported(request):
+    """
+    Whether the request came in over ASGI. Under WSGI a streaming response
+    with an async iterator is collected into a list before anything is sent,
+    so an endless event stream would hold a server thread and never deliver.
+    """
+    return isinstance(request, ASGIRequest)
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        _broker = import_string(getattr(settings, "TICKET_EVENTS_BROKER", "tickets.events.LocalBroker"))()
+    return _broker
+
+
+def ticket_event(ticket):
+    # Delta for a changed ticket; "scope" is used for filtering and never sent
+    return {
+        "type": "ticket",
+        "ticket": ticket.pk,
+        "ticket_id": ticket.ticket_id,
+        "subject": ticket.subject,
+        "status": ticket.status,
+        "status_display": ticket.get_status_display(),
+        "assigned_support": ticket.assigned_support.username if ticket.assigned_support_id else None,
+        "updated_at": ticket.updated_at.isoformat(),
+        "scope": {
+            "employee": ticket.employee_id,
+            "department": ticket.department_id,
+            "assigned_support": ticket.assigned_support_id,
+            "internal": False,
+        },
+    }
+
+
+def comment_event(comment, ticket):
+    return {
+        "type": "comment",
+        "ticket": comment.ticket_id,
+        "comment": comment.pk,
+        "author": comment.author.username if comment.author_id else None,
+        "message": comment.message,
+        "is_internal": comment.is_internal,
+        "created_at": comment.created_at.isoformat(),
+        "scope": {
+            "employee": ticket.employee_id,
+            "department": ticket.department_id,
+            "assigned_support": ticket.assigned_support_id,
+            "internal": comment.is_internal,
+        },
+    }
+
+
+def can_see(event, user_id, roles, department_id):
+    """Same rules as ticket_detail; employees also never get internal comments."""
+    scope = event["scope"]
+    if "Manager" in roles:
+        return True
+    if "Support" in roles:
+        return scope["assigned_support"] == user_id or (
+            scope["assigned_support"] is None and department_id is not None and scope["department"] == department_id
+        )
+    return scope["employee"] == user_id and not scope["internal"]
+
+
+def format_sse(event):
+    data = {k: v for k, v in event.items() if k not in ("scope", "id")}
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(data)}\n\n"
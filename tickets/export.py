@@ -0,0 +1,154 @@
+import csv
+import json
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.db.models import Prefetch
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import Department, Ticket, TicketAttachment, TicketComment
+
+FORMATS = ("csv", "jsonl")
+CHUNK_SIZE = 2000
+ASYNC_LINES = 500  # lines per trip to the sync thread in astream()
+
+CSV_FIELDS = [
+    "ticket_id", "subject", "description", "status", "department", "employee", "assigned_support",
+    "internal_notes", "created_at", "updated_at", "comment_count", "attachment_count", "comments", "attachments",
+]
+
+
+class ExportError(ValueError):
+    pass
+
+
+def _day_start(value, name):
+    try:
+        day = parse_date(value) if isinstance(value, str) else value
+    except ValueError:  # well formed but not a calendar date, e.g. 2024-13-45
+        day = None
+    if day is None:
+        raise ExportError(f"{name} must be a date (YYYY-MM-DD), got {value!r}.")
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def export_queryset(date_from=None, date_to=None, statuses=(), department=None):
+    """
+    Tickets to export, oldest first. `date_to` is inclusive. Dates become
+    created_at bounds (not __date lookups) so the created_at index is used.
+    `department` is a pk or a name.
+    """
+    queryset = Ticket.objects.select_related("employee", "department", "assigned_support").prefetch_related(
+        Prefetch("comments", queryset=TicketComment.objects.select_related("author")),
+        Prefetch("attachments", queryset=TicketAttachment.objects.select_related("uploaded_by")),
+    )
+    if date_from:
+        queryset = queryset.filter(created_at__gte=_day_start(date_from, "from"))
+    if date_to:
+        queryset = queryset.filter(created_at__lt=_day_start(date_to, "to") + timedelta(days=1))
+    statuses = [s for s in statuses if s]
+    unknown = set(statuses) - set(Ticket.Status.values)
+    if unknown:
+        raise ExportError(f"Unknown status: {', '.join(sorted(unknown))}.")
+    if statuses:
+        queryset = queryset.filter(status__in=statuses)
+    if department:
+        lookup = {"pk": department} if str(department).isdigit() else {"name": department}
+        dept_id = Department.objects.filter(**lookup).values_list("pk", flat=True).first()
+        if dept_id is None:
+            raise ExportError(f"Unknown department: {department}.")
+        queryset = queryset.filter(department_id=dept_id)
+    return queryset.order_by("created_at", "id")
+
+
+def _username(user):
+    return user.username if user else None
+
+
+def ticket_record(ticket):
+    return {
+        "ticket_id": ticket.ticket_id,
+        "subject": ticket.subject,
+        "description": ticket.description,
+        "status": ticket.status,
+        "department": ticket.department.name,
+        "employee": ticket.employee.username,
+        "assigned_support": _username(ticket.assigned_support),
+        "internal_notes": ticket.internal_notes,
+        "created_at": ticket.created_at.isoformat(),
+        "updated_at": ticket.updated_at.isoformat(),
+        "comments": [
+            {
+                "author": _username(c.author),
+                "message": c.message,
+                "is_internal": c.is_internal,
+                "created_at": c.created_at.isoformat(),
+            }
+            for c in ticket.comments.all()
+        ],
+        "attachments": [
+            {
+                "name": a.display_name,
+                "file": a.file.name,
+                "sha256": a.sha256,
+                "uploaded_by": _username(a.uploaded_by),
+                "uploaded_at": a.uploaded_at.isoformat(),
+            }
+            for a in ticket.attachments.all()
+        ],
+    }
+
+
+def records(queryset, chunk_size=CHUNK_SIZE):
+    # iterator() streams from a server-side cursor where the backend has one;
+    # with chunk_size the prefetches run per chunk, so memory stays flat
+    for ticket in queryset.iterator(chunk_size=chunk_size):
+        yield ticket_record(ticket)
+
+
+class _Echo:
+    # csv.writer wants a file; hand each formatted line straight back instead
+    def write(self, value):
+        return value
+
+
+def stream_csv(queryset, chunk_size=CHUNK_SIZE):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_FIELDS)
+    for record in records(queryset, chunk_size):
+        record["comment_count"] = len(record["comments"])
+        record["attachment_count"] = len(record["attachments"])
+        # Nested lists stay one cell each, as JSON
+        record["comments"] = json.dumps(record["comments"])
+        record["attachments"] = json.dumps(record["attachments"])
+        yield writer.writerow([record[f] for f in CSV_FIELDS])
+
+
+def stream_jsonl(queryset, chunk_size=CHUNK_SIZE):
+    for record in records(queryset, chunk_size):
+        yield json.dumps(record) + "\n"
+
+
+def stream(fmt, queryset, chunk_size=CHUNK_SIZE):
+    if fmt not in FORMATS:
+        raise ExportError(f"Format must be one of {', '.join(FORMATS)}.")
+    return (stream_csv if fmt == "csv" else stream_jsonl)(queryset, chunk_size)
+
+
+async def astream(lines, batch=ASYNC_LINES):
+    """
+    Async iterator over a stream() for ASGI. Given a sync iterator,
+    StreamingHttpResponse collects all of it with sync_to_async(list) before
+    sending a byte; here each batch of lines is produced in the sync thread
+    (the ORM cursor lives there) and sent before the next one is read.
+    """
+    lines = iter(lines)
+    take = sync_to_async(lambda: "".join(islice(lines, batch)))
+    try:
+        while chunk := await take():
+            yield chunk
+    finally:
+        if hasattr(lines, "close"):
+            await sync_to_async(lines.close)()
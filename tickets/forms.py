@@ -1,5 +1,6 @@
 from django import forms
-from .models import Ticket, TicketComment
+from django.contrib.auth.models import User
+from .models import Department, Ticket, TicketComment
 
 
 class TicketCreateForm(forms.ModelForm):
@@ -32,3 +33,50 @@ class CommentForm(forms.ModelForm):
     class Meta:
         model = TicketComment
         fields = ["message", "is_internal"]
+
+class TicketIdsField(forms.Field):
+    # Repeated ticket_ids=<pk> values, e.g. from row checkboxes
+    widget = forms.MultipleHiddenInput
+
+    def to_python(self, value):
+        if not value:
+            return []
+        try:
+            return sorted({int(v) for v in value})
+        except (TypeError, ValueError):
+            raise forms.ValidationError("Invalid ticket id.")
+
+class BulkTicketActionForm(forms.Form):
+    action = forms.ChoiceField(choices=[("assign", "Assign to"), ("status", "Set status"), ("close", "Close")])
+    support = forms.ModelChoiceField(queryset=User.objects.filter(groups__name="Support"), required=False)
+    status = forms.ChoiceField(choices=[("", "---------")] + Ticket.Status.choices, required=False)
+
+    # Either the selected tickets, or every ticket matching the filter
+    ticket_ids = TicketIdsField(required=False)
+    filter_status = forms.ChoiceField(choices=[("", "Any status")] + Ticket.Status.choices, required=False)
+    filter_department = forms.ModelChoiceField(queryset=Department.objects.all(), required=False)
+    filter_unassigned = forms.BooleanField(required=False)
+
+    def clean(self):
+        data = super().clean()
+        if data.get("action") == "assign" and not data.get("support"):
+            self.add_error("support", "Choose a support user.")
+        if data.get("action") == "status" and not data.get("status"):
+            self.add_error("status", "Choose a status.")
+        has_filter = data.get("filter_status") or data.get("filter_department") or data.get("filter_unassigned")
+        if not data.get("ticket_ids") and not has_filter:
+            raise forms.ValidationError("Select tickets or set a filter.")
+        return data
+
+    def tickets(self):
+        data = self.cleaned_data
+        if data["ticket_ids"]:
+            return Ticket.objects.filter(pk__in=data["ticket_ids"])
+        queryset = Ticket.objects.all()
+        if data["filter_status"]:
+            queryset = queryset.filter(status=data["filter_status"])
+        if data["filter_department"]:
+            queryset = queryset.filter(department=data["filter_department"])
+        if data["filter_unassigned"]:
+            queryset = queryset.filter(assigned_support__isnull=True)
+        return queryset
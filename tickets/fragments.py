@@ -0,0 +1,90 @@
+"""
+Fragment caching for ticket pages. Rendered fragments are cached under the
+ticket's pk, a per-ticket version counter and the audience, so any change
+to the ticket, its comments or attachments (signals, bulk actions) moves
+the ticket to a new version and old fragments are simply never read again.
+
+Counters live in the same cache as the fragments ("template_fragments",
+see FRAGMENT_CACHE_BACKEND). A missing counter starts from the current
+time in nanoseconds, so a counter that was evicted never comes back with a
+value that old fragments are stored under.
+
+Bumps come from every web process and from the job workers, so versioned
+fragments are only cached when that cache is shared by all of them. With a
+per-process cache (locmem) the detail page is rendered every time.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from accounts.roles import LOCAL_CACHE_BACKENDS
+
+CACHE_ALIAS = "template_fragments"
+
+# Internal comments are only rendered for the staff audience
+STAFF = "staff"
+EMPLOYEE = "employee"
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def enabled():
+    """Whether the fragment cache is shared by all processes, so bumps reach every reader."""
+    return settings.CACHES[CACHE_ALIAS]["BACKEND"] not in LOCAL_CACHE_BACKENDS
+
+
+def _key(pk):
+    return f"tickets:fragment-version:{pk}"
+
+
+def audience(roles):
+    return STAFF if {"Manager", "Support"} & roles else EMPLOYEE
+
+
+def version(pk):
+    if not enabled():
+        return 0
+    cache = _cache()
+    value = cache.get(_key(pk))
+    if value is None:
+        cache.add(_key(pk), time.time_ns(), None)
+        value = cache.get(_key(pk))
+    return value
+
+
+async def aversion(pk):
+    if not enabled():
+        return 0
+    cache = _cache()
+    value = await cache.aget(_key(pk))
+    if value is None:
+        await cache.aadd(_key(pk), time.time_ns(), None)
+        value = await cache.aget(_key(pk))
+    return value
+
+
+def bump(*pks):
+    if not enabled():
+        return
+    cache = _cache()
+    for pk in pks:
+        try:
+            cache.incr(_key(pk))
+        except ValueError:  # not cached: any new value will do
+            cache.set(_key(pk), time.time_ns(), None)
+
+
+def bump_on_commit(*pks):
+    # After commit, so a page rendered in between cannot cache the old rows
+    # under the new version
+    transaction.on_commit(lambda: bump(*pks))
+
+
+def context(version, roles):
+    """What the {% cache %} blocks of a ticket vary on; a timeout of 0 stores nothing."""
+    timeout = settings.FRAGMENT_CACHE_TIMEOUT if enabled() else 0
+    return {"version": version, "audience": audience(roles), "timeout": timeout}
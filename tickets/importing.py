@@ -0,0 +1,237 @@
+import csv
+import hashlib
+import json
+import os
+from datetime import datetime
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import ArchivedTicket, Department, Ticket, TicketComment
+
+BATCH_SIZE = 1000
+TICKET_ID_PREFIX = "TCK"
+
+TICKET_FIELDS = (
+    "ticket_id", "employee", "department", "assigned_support", "subject", "description",
+    "status", "internal_notes", "created_at", "updated_at",
+)
+COMMENT_FIELDS = ("ticket", "author", "message", "is_internal", "created_at")
+STATUSES = frozenset(Ticket.Status.values)
+MAX_ERRORS = 20  # invalid records reported individually
+
+
+def read_records(path, fmt=None):
+    """
+    Yield (line number, record) per ticket from a JSONL or CSV file (the
+    export_tickets formats), one line at a time. In CSV the comments column
+    is JSON. A record that cannot be parsed is yielded as a ValueError, so
+    the import reports it and carries on.
+    """
+    fmt = fmt or ("csv" if path.endswith(".csv") else "jsonl")
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            reader = csv.DictReader(f)
+            line = reader.line_num + 1
+            for row in reader:
+                try:
+                    row["comments"] = json.loads(row.get("comments") or "[]")
+                except ValueError as e:
+                    row = ValueError(f"malformed comments column: {e}")
+                yield line, row
+                line = reader.line_num + 1
+        else:
+            for line, text in enumerate(f, 1):
+                if text.strip():
+                    try:
+                        yield line, json.loads(text)
+                    except ValueError as e:
+                        yield line, ValueError(f"malformed JSON: {e}")
+
+
+def record_ticket_id(record):
+    """
+    Ticket id for a record that has none, derived from its content, so
+    importing the same file again skips it instead of adding a copy.
+    """
+    data = json.dumps(record, sort_keys=True, default=str).encode()
+    return TICKET_ID_PREFIX + hashlib.sha256(data).hexdigest()[:16].upper()
+
+
+def generate_ticket_ids(count):
+    # Same shape as Ticket.save() ("TCK" + 8 hex), from one urandom call
+    raw = os.urandom(4 * count).hex().upper()
+    return [TICKET_ID_PREFIX + raw[i * 8:(i + 1) * 8] for i in range(count)]
+
+
+def existing_ticket_ids(ids):
+    """The ids among `ids` already used by a live or an archived ticket."""
+    return {
+        ticket_id
+        for model in (Ticket, ArchivedTicket)
+        for ticket_id in model.objects.filter(ticket_id__in=ids).values_list("ticket_id", flat=True)
+    }
+
+
+def _timestamp(value, default, tz):
+    if not value:
+        return default
+    try:
+        parsed = datetime.fromisoformat(value)  # much faster than parse_datetime
+    except ValueError:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise ValueError(f"bad timestamp {value!r}")
+    return parsed.replace(tzinfo=tz) if parsed.tzinfo is None else parsed
+
+
+def insert_sql(model, fields):
+    qn = connection.ops.quote_name
+    columns = ", ".join(qn(model._meta.get_field(f).column) for f in fields)
+    return f"INSERT INTO {qn(model._meta.db_table)} ({columns}) VALUES ({', '.join(['%s'] * len(fields))})"
+
+
+class Importer:
+    """
+    Batch importer. Users and departments are resolved from in-memory
+    maps loaded once; each batch is one transaction with one multi-row
+    insert for tickets and one for comments. Invalid records are counted
+    and skipped. Records whose ticket_id already exists (live or archived)
+    are skipped too, and records without one get an id derived from their
+    content, so an interrupted import can simply be re-run.
+    Signals do not fire: rebuild derived data (search index) afterwards.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE, create_missing=False):
+        self.batch_size = batch_size
+        self.create_missing = create_missing
+        self.users = dict(User.objects.values_list("username", "pk"))
+        self.departments = dict(Department.objects.values_list("name", "pk"))
+        self.tickets = self.comments = self.skipped = self.existing = 0
+        self.errors = []
+        self.tz = timezone.get_current_timezone()  # for timestamps without an offset
+        self.ticket_sql = insert_sql(Ticket, TICKET_FIELDS)
+        self.comment_sql = insert_sql(TicketComment, COMMENT_FIELDS)
+
+    def _user_id(self, username):
+        if not username:
+            return None
+        if username not in self.users and self.create_missing:
+            user = User(username=username)
+            user.set_unusable_password()
+            user.save()
+            self.users[username] = user.pk
+        return self.users.get(username)
+
+    def _department_id(self, name):
+        if name not in self.departments and self.create_missing and name:
+            self.departments[name] = Department.objects.create(name=name).pk
+        return self.departments.get(name)
+
+    def _skip(self, line, reason):
+        self.skipped += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append(f"line {line}: {reason}")
+
+    def build(self, line, record):
+        """(line, ticket values, comment values) for one record, or None when it is skipped."""
+        if isinstance(record, ValueError):
+            self._skip(line, str(record))
+            return None
+        if not isinstance(record, dict):
+            self._skip(line, "not a JSON object")
+            return None
+        try:
+            return self._build(line, record)
+        except (TypeError, AttributeError) as e:
+            # A field of the wrong type, e.g. comments that are not objects
+            self._skip(line, f"malformed record: {e}")
+        except ValueError as e:
+            self._skip(line, str(e))
+        return None
+
+    def _build(self, line, record):
+        employee_id = self._user_id(record.get("employee"))
+        department_id = self._department_id(record.get("department"))
+        if employee_id is None or department_id is None:
+            self._skip(line, f"unknown employee {record.get('employee')!r} or department {record.get('department')!r}")
+            return None
+        status = record.get("status") or Ticket.Status.NEW
+        if status not in STATUSES:
+            self._skip(line, f"unknown status {status!r}")
+            return None
+        adapt = connection.ops.adapt_datetimefield_value
+        created_at = _timestamp(record.get("created_at"), timezone.now(), self.tz)
+        ticket = [
+            record.get("ticket_id") or record_ticket_id(record),
+            employee_id,
+            department_id,
+            self._user_id(record.get("assigned_support")),
+            (record.get("subject") or "")[:200],
+            record.get("description") or "",
+            status,
+            record.get("internal_notes") or "",
+            adapt(created_at),
+            adapt(_timestamp(record.get("updated_at"), created_at, self.tz)),
+        ]
+        # Ticket pk is filled in once the ticket row exists
+        comments = [
+            [
+                None,
+                self._user_id(c.get("author")),
+                c.get("message") or "",
+                bool(c.get("is_internal")),
+                adapt(_timestamp(c.get("created_at"), created_at, self.tz)),
+            ]
+            for c in record.get("comments") or []
+        ]
+        return line, ticket, comments
+
+    def _drop_existing(self, rows):
+        """Drop rows whose ticket_id already exists, or came earlier in the file."""
+        taken = existing_ticket_ids([t[0] for _, t, _ in rows])
+        kept, seen = [], set()
+        for line, ticket, comments in rows:
+            if ticket[0] in taken or ticket[0] in seen:
+                self.existing += 1
+                continue
+            seen.add(ticket[0])
+            kept.append((ticket, comments))
+        return kept
+
+    def flush(self, rows):
+        # Plain executemany: bulk_create spends most of its time compiling
+        # SQL per object, and its pre_save would overwrite the timestamps
+        rows = self._drop_existing(rows)
+        if not rows:
+            return
+        comments = []
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(self.ticket_sql, [t for t, _ in rows])
+            ids = dict(Ticket.objects.filter(ticket_id__in=[t[0] for t, _ in rows]).values_list("ticket_id", "pk"))
+            for ticket, ticket_comments in rows:
+                for c in ticket_comments:
+                    c[0] = ids[ticket[0]]
+                    comments.append(c)
+            if comments:
+                cursor.executemany(self.comment_sql, comments)
+        self.tickets += len(rows)
+        self.comments += len(comments)
+
+    def run(self, records, progress=None):
+        """Import (line number, record) pairs, as read_records() yields them."""
+        batch = []
+        for line, record in records:
+            row = self.build(line, record)
+            if row is not None:
+                batch.append(row)
+            if len(batch) >= self.batch_size:
+                self.flush(batch)
+                batch = []
+                if progress:
+                    progress(self)
+        if batch:
+            self.flush(batch)
+        return self
@@ -0,0 +1,49 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from tickets import archive
+
+REPORT_EVERY = 5  # seconds between progress lines
+
+
+class Command(BaseCommand):
+    help = (
+        "Move closed tickets not updated for --older-than days, with their comments and attachment "
+        "rows, to the archive tables. Archived tickets stay readable on their detail page."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than", type=int, default=365, metavar="DAYS",
+            help="Only tickets closed and untouched for at least this many days (default 365).",
+        )
+        parser.add_argument("--batch-size", type=int, default=archive.BATCH_SIZE)
+        parser.add_argument("--dry-run", action="store_true", help="Only count the tickets that would move.")
+
+    def handle(self, *args, **options):
+        if options["older_than"] < 1:
+            raise CommandError("--older-than must be at least 1 day.")
+        cutoff = timezone.now() - timedelta(days=options["older_than"])
+
+        if options["dry_run"]:
+            count = archive.archivable(cutoff).count()
+            self.stdout.write(f"{count} closed tickets last updated before {cutoff:%Y-%m-%d %H:%M} would be archived.")
+            return
+
+        started = last_report = time.monotonic()
+
+        def progress(tickets, comments, attachments):
+            nonlocal last_report
+            now = time.monotonic()
+            if now - last_report >= REPORT_EVERY:
+                last_report = now
+                self.stdout.write(f"{tickets} tickets, {comments} comments, {attachments} attachments archived")
+
+        tickets, comments, attachments = archive.archive(cutoff, options["batch_size"], progress)
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {tickets} tickets, {comments} comments and {attachments} attachments "
+            f"in {time.monotonic() - started:.1f}s."
+        ))
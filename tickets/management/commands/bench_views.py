@@ -0,0 +1,62 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tickets import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark every ticket view with data picked from the database (see seed_helpdesk): "
+        "p50/p95/p99 latency and queries per request, optionally saved as JSON and compared with an earlier run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=50, help="Measured requests per view.")
+        parser.add_argument("--warmup", type=int, default=3, help="Unmeasured requests per view first.")
+        parser.add_argument("--view", action="append", dest="views", choices=sorted(benchmark.CASES),
+                            help="Only this view (repeatable).")
+        parser.add_argument("--server", help="Base URL of a running server using this database (e.g. "
+                                             "http://127.0.0.1:8000). Default: in-process test client.")
+        parser.add_argument("--metrics-token", default=os.environ.get("REQUEST_METRICS_TOKEN", ""),
+                            help="Bearer token for the server's /metrics, for query counts.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", "-o", help="Write the results to this JSON file.")
+        parser.add_argument("--compare", help="Earlier results JSON to compare with.")
+
+    def handle(self, *args, **options):
+        try:
+            fixtures = benchmark.Fixtures(seed=options["seed"])
+        except ValueError as e:
+            raise CommandError(e)
+        run = dict(requests=options["requests"], warmup=options["warmup"], views=options["views"])
+        if options["server"]:
+            views = benchmark.run_server(fixtures, options["server"], metrics_token=options["metrics_token"], **run)
+            mode = "server"
+        else:
+            views = benchmark.run_client(fixtures, **run)
+            mode = "client"
+        results = {"environment": benchmark.environment(mode, options["requests"]), "views": views}
+
+        self.stdout.write(f"{'view':28} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8} {'errors':>6}")
+        for name, r in views.items():
+            self.stdout.write(
+                f"{name:28} {r['p50_ms']:>9} {r['p95_ms']:>9} {r['p99_ms']:>9} "
+                f"{r['queries_mean'] if r['queries_mean'] is not None else '-':>8} {r['errors']:>6}"
+            )
+
+        if options["compare"]:
+            baseline = benchmark.load(options["compare"])
+            self.stdout.write(f"\nCompared with {options['compare']} ({baseline['environment'].get('git')}):")
+            for name, p95_then, p95_now, change, q_then, q_now in benchmark.compare(baseline, results):
+                style = self.style.ERROR if change is not None and change > 10 else self.style.SUCCESS
+                self.stdout.write(style(
+                    f"{name:28} p95 {p95_then} -> {p95_now} ms ({change:+}%)  queries {q_then} -> {q_now}"
+                    if change is not None else f"{name:28} p95 {p95_then} -> {p95_now} ms  queries {q_then} -> {q_now}"
+                ))
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}."))
@@ -0,0 +1,54 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from tickets import benchmark, write_benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Write-contention benchmark: processes posting comments and tickets at once (plus optional readers) "
+        "with the configured database settings and with SQLite defaults, in comments per second."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--writers", type=int, default=4, help="Processes posting comments.")
+        parser.add_argument("--readers", type=int, default=0, help="Processes reading ticket_detail meanwhile.")
+        parser.add_argument("--create-every", type=int, default=write_benchmark.CREATE_EVERY,
+                            help="One write in N creates a ticket instead of commenting (0: comments only).")
+        parser.add_argument("--seconds", type=float, default=10.0, help="Duration of each run.")
+        parser.add_argument("--profile", action="append", dest="profiles", choices=write_benchmark.PROFILES,
+                            help="Only this profile (repeatable). Default: both.")
+        parser.add_argument("--output", "-o", help="Write the results to this JSON file.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("bench_writes compares SQLite settings; the database is " + connection.vendor)
+        if options["writers"] < 1:
+            raise CommandError("--writers must be at least 1.")
+        try:
+            fixtures = benchmark.Fixtures()
+        except ValueError as e:
+            raise CommandError(e)
+
+        results = []
+        for profile in options["profiles"] or write_benchmark.PROFILES:
+            r = write_benchmark.run(
+                fixtures, profile, options["writers"], options["readers"], options["seconds"], options["create_every"],
+            )
+            results.append(r)
+            self.stdout.write(f"{profile} ({r['writers']} writers, {r['readers']} readers, {r['seconds']}s):")
+            for kind, k in r["requests"].items():
+                self.stdout.write(
+                    f"  {kind:8} {k['per_second']:>8}/s | p50 {k['p50_ms']}ms p95 {k['p95_ms']}ms "
+                    f"p99 {k['p99_ms']}ms | errors {k['errors']}/{k['requests']}"
+                )
+
+        if len(results) == 2 and results[0]["comments_per_second"]:
+            gain = results[1]["comments_per_second"] / results[0]["comments_per_second"]
+            self.stdout.write(self.style.SUCCESS(f"configured: {gain:.1f}x the comments per second of baseline"))
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump({"environment": benchmark.environment("writes", None), "results": results}, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}."))
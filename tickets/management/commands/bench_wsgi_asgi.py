@@ -0,0 +1,97 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client
+
+from tickets.benchmark import latency_summary
+
+
+def summarize(mode, latencies, elapsed, errors):
+    summary = latency_summary(latencies)
+    return {
+        "mode": mode,
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": summary["p50_ms"],
+        "p95_ms": summary["p95_ms"],
+        "p99_ms": summary["p99_ms"],
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare throughput of the sync (WSGI) and async (ASGI) request paths in-process: "
+        "a fixed pool of worker threads against one event loop with many concurrent requests."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--username", required=True, help="User to log in as.")
+        parser.add_argument("--url", action="append", dest="urls",
+                            help="URL to request (repeatable). Defaults to /tickets/manager/ and /.")
+        parser.add_argument("--requests", type=int, default=500, help="Requests per mode.")
+        parser.add_argument("--workers", type=int, default=4, help="WSGI worker threads.")
+        parser.add_argument("--concurrency", type=int, default=50, help="Concurrent ASGI requests.")
+        parser.add_argument("--json", dest="json_path", help="Also write the results to this file.")
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options["username"]).first()
+        if user is None:
+            raise CommandError(f"No user {options['username']!r}.")
+        urls = options["urls"] or ["/tickets/manager/", "/"]
+        total = options["requests"]
+        plan = [urls[i % len(urls)] for i in range(total)]
+
+        results = [
+            self.run_wsgi(user, plan, options["workers"]),
+            asyncio.run(self.run_asgi(user, plan, options["concurrency"])),
+        ]
+
+        for r in results:
+            self.stdout.write(
+                "{mode:5} {requests} req in {seconds}s = {rps} req/s | "
+                "p50 {p50_ms}ms p95 {p95_ms}ms p99 {p99_ms}ms | errors {errors}".format(**r)
+            )
+        if options["json_path"]:
+            with open(options["json_path"], "w") as f:
+                json.dump({"urls": urls, "results": results}, f, indent=2)
+
+    def run_wsgi(self, user, plan, workers):
+        # One client per thread: the test client keeps per-instance cookies
+        clients = []
+        for _ in range(workers):
+            client = Client()
+            client.force_login(user)
+            clients.append(client)
+
+        def fetch(i):
+            started = time.perf_counter()
+            response = clients[i % workers].get(plan[i])
+            return time.perf_counter() - started, response.status_code >= 400
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            outcomes = list(pool.map(fetch, range(len(plan))))
+        elapsed = time.perf_counter() - started
+        return summarize("wsgi", [o[0] for o in outcomes], elapsed, sum(o[1] for o in outcomes))
+
+    async def run_asgi(self, user, plan, concurrency):
+        client = AsyncClient()
+        await client.aforce_login(user)
+        limit = asyncio.Semaphore(concurrency)
+
+        async def fetch(url):
+            async with limit:
+                started = time.perf_counter()
+                response = await client.get(url)
+                return time.perf_counter() - started, response.status_code >= 400
+
+        started = time.perf_counter()
+        outcomes = await asyncio.gather(*(fetch(url) for url in plan))
+        elapsed = time.perf_counter() - started
+        return summarize("asgi", [o[0] for o in outcomes], elapsed, sum(o[1] for o in outcomes))
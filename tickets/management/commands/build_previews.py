@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from tickets import previews
+from tickets.models import TicketAttachment
+
+
+class Command(BaseCommand):
+    help = "Render missing attachment previews in a process pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=200)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        batch, rendered, total = [], 0, 0
+        for attachment in TicketAttachment.objects.only("pk", "file").iterator(chunk_size=options["batch_size"]):
+            batch.append(attachment)
+            if len(batch) >= options["batch_size"]:
+                rendered += sum(1 for p in previews.ensure_previews(batch).values() if p)
+                total += len(batch)
+                batch = []
+        if batch:
+            rendered += sum(1 for p in previews.ensure_previews(batch).values() if p)
+            total += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{rendered}/{total} attachments have previews ({time.monotonic() - started:.1f}s)."
+        ))
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tickets import queryplans
+
+
+class Command(BaseCommand):
+    help = (
+        "Run EXPLAIN on the hot queries of the ticket views and flag full table scans "
+        "and sorts that do not come from an index. Best run on a seeded database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--query", action="append", help="Only this query (repeatable); see the list without it.")
+        parser.add_argument("--analyze", action="store_true", help="Refresh the planner statistics first.")
+        parser.add_argument("--plans", action="store_true", help="Print every plan, not just the flagged ones.")
+        parser.add_argument(
+            "--fail-on-scan", action="store_true", help="Exit with an error when a full scan is found (for CI).",
+        )
+
+    def handle(self, *args, **options):
+        names = set(options["query"] or ())
+        unknown = names - {name for name, _, _ in queryplans.HOT_QUERIES}
+        if unknown:
+            raise CommandError(f"Unknown query: {', '.join(sorted(unknown))}")
+        if options["analyze"]:
+            queryplans.analyze()
+        try:
+            results = queryplans.run(names=names)
+        except ValueError as e:
+            raise CommandError(e)
+
+        flagged = 0
+        for name, plan, scans, sorts in results:
+            if scans:
+                flagged += 1
+                self.stdout.write(self.style.ERROR(f"FULL SCAN  {name}: {', '.join(scans)}"))
+            elif sorts:
+                self.stdout.write(self.style.WARNING(f"SORT       {name}"))
+            else:
+                self.stdout.write(f"ok         {name}")
+            if scans or sorts or options["plans"]:
+                self.stdout.write("\n".join(f"    {line}" for line in plan.splitlines()))
+
+        summary = f"{len(results)} queries, {flagged} with full scans."
+        if flagged and options["fail_on_scan"]:
+            raise CommandError(summary)
+        self.stdout.write(self.style.SUCCESS(summary) if not flagged else self.style.WARNING(summary))
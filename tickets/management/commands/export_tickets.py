@@ -0,0 +1,41 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tickets import export
+from tickets.models import Ticket
+
+
+class Command(BaseCommand):
+    help = "Stream tickets with their comments and attachment metadata as CSV or JSONL."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=export.FORMATS, default="jsonl")
+        parser.add_argument("--output", "-o", help="File to write (default: stdout).")
+        parser.add_argument("--from", dest="date_from", help="Created on or after this date (YYYY-MM-DD).")
+        parser.add_argument("--to", dest="date_to", help="Created on or before this date (YYYY-MM-DD).")
+        parser.add_argument("--status", action="append", default=[], choices=Ticket.Status.values,
+                            help="Only this status (repeatable).")
+        parser.add_argument("--department", help="Department id or name.")
+        parser.add_argument("--chunk-size", type=int, default=export.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            queryset = export.export_queryset(
+                options["date_from"], options["date_to"], options["status"], options["department"]
+            )
+            lines = export.stream(options["format"], queryset, options["chunk_size"])
+        except export.ExportError as e:
+            raise CommandError(e)
+
+        out = open(options["output"], "w", newline="", encoding="utf-8") if options["output"] else sys.stdout
+        count = -1 if options["format"] == "csv" else 0  # header row
+        try:
+            for line in lines:
+                out.write(line)
+                count += 1
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        if options["output"]:
+            self.stdout.write(self.style.SUCCESS(f"Exported {count} tickets to {options['output']}."))
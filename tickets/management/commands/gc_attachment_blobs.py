@@ -0,0 +1,30 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from tickets import blobs
+
+
+class Command(BaseCommand):
+    help = "Delete content-addressed attachment files that no attachment references any more."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--min-age", type=int, default=60,
+            help="Only collect blobs unreferenced for at least this many minutes (default 60).",
+        )
+        parser.add_argument(
+            "--recount", action="store_true",
+            help="Recompute reference counts from attachment rows (live and archived) first.",
+        )
+
+    def handle(self, *args, **options):
+        if options["recount"]:
+            total = blobs.recount_blobs()
+            self.stdout.write(f"Recounted references for {total} blobs.")
+
+        removed = blobs.collect_garbage(timezone.now() - timedelta(minutes=options["min_age"]))
+        for name in removed:
+            self.stdout.write(f"Deleted {name}")
+        self.stdout.write(self.style.SUCCESS(f"Removed {len(removed)} unreferenced blobs."))
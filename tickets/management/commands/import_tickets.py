@@ -0,0 +1,58 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tickets import importing
+
+REPORT_EVERY = 5  # seconds between progress lines
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-import tickets and their comments from JSONL or CSV (the export_tickets formats), "
+        "keeping the original ticket ids and timestamps. Attachment metadata is ignored."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=("csv", "jsonl"), help="Default: from the file extension.")
+        parser.add_argument("--batch-size", type=int, default=importing.BATCH_SIZE)
+        parser.add_argument("--create-missing", action="store_true",
+                            help="Create unknown users (without a usable password) and departments.")
+
+    def handle(self, *args, **options):
+        started = last_report = time.monotonic()
+
+        def progress(importer):
+            nonlocal last_report
+            now = time.monotonic()
+            if now - last_report < REPORT_EVERY:
+                return
+            last_report, elapsed = now, now - started
+            self.stdout.write(
+                f"{importer.tickets} tickets, {importer.comments} comments, "
+                f"{importer.existing} already present, {importer.skipped} invalid "
+                f"({importer.tickets / elapsed:.0f} tickets/s)"
+            )
+
+        importer = importing.Importer(options["batch_size"], options["create_missing"])
+        try:
+            importer.run(importing.read_records(options["path"], options["format"]), progress)
+        except (OSError, ValueError) as e:
+            raise CommandError(e)
+
+        for error in importer.errors:
+            self.stderr.write(error)
+        if importer.skipped > len(importer.errors):
+            self.stderr.write(f"... and {importer.skipped - len(importer.errors)} more invalid records")
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {importer.tickets} tickets and {importer.comments} comments in {elapsed:.1f}s "
+            f"({(importer.tickets + importer.comments) / elapsed:.0f} rows/s); "
+            f"{importer.existing} already present, {importer.skipped} invalid."
+        ))
+        if importer.tickets:
+            self.stdout.write(
+                "Search, support load and metrics are not updated by the import: run "
+                "`manage.py rebuild_search_index`, `manage.py recount_support_load` and `manage.py rebuild_metrics`."
+            )
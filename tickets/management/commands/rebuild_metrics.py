@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from tickets import metrics
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the dashboard rollups (backlog, daily counts, response and resolution "
+        "times) from the tickets table (after import_tickets, direct SQL changes or on upgrade)."
+    )
+
+    def handle(self, *args, **options):
+        count = metrics.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt dashboard metrics from {count} tickets."))
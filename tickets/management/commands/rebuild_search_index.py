@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from tickets import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the ticket search index from all tickets and comments."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        count = search.rebuild(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {count} documents with the {search.backend()} backend in {time.monotonic() - started:.1f}s."
+        ))
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from tickets import similarity
+
+
+class Command(BaseCommand):
+    help = "Recompute the near-duplicate signatures (tickets.similarity) of all tickets."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        count = similarity.rebuild(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {count} tickets in {time.monotonic() - started:.1f}s."
+        ))
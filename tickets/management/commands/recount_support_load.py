@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from tickets import assignment
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute each support user's open-ticket counter from the tickets table "
+        "(after import_tickets or direct SQL changes)."
+    )
+
+    def handle(self, *args, **options):
+        count = assignment.recount_loads()
+        self.stdout.write(self.style.SUCCESS(f"Recounted open tickets for {count} support profiles."))
@@ -0,0 +1,41 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections
+
+from helpdesk_support.routers import REPLICA
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database into the replica (REPLICA_DATABASE_URL) with SQLite's online backup, "
+        "once or every --interval seconds. For local testing of replica reads; use the database's own "
+        "replication in production."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, default=0,
+                            help="Copy again every this many seconds until interrupted (default: copy once).")
+
+    def handle(self, *args, **options):
+        if REPLICA not in settings.DATABASES:
+            raise CommandError("No replica database: set REPLICA_DATABASE_URL.")
+        primary, replica = connections[DEFAULT_DB_ALIAS], connections[REPLICA]
+        if primary.vendor != "sqlite" or replica.vendor != "sqlite":
+            raise CommandError("replicate_db copies SQLite files; use the database's replication instead.")
+        if primary.settings_dict["NAME"] == replica.settings_dict["NAME"]:
+            raise CommandError("The replica is the primary database file.")
+
+        while True:
+            close_old_connections()
+            started = time.perf_counter()
+            primary.ensure_connection()
+            replica.ensure_connection()
+            # A consistent snapshot of the primary, written in one transaction:
+            # replica readers see the old copy or the new one
+            primary.connection.backup(replica.connection)
+            self.stdout.write(f"Copied to the replica in {time.perf_counter() - started:.2f}s.")
+            if not options["interval"]:
+                return
+            time.sleep(options["interval"])
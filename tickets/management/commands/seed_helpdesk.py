@@ -0,0 +1,77 @@
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from tickets import seeding
+
+REPORT_EVERY = 5  # seconds between progress lines
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate realistic synthetic data for development and benchmarks: departments, users in the "
+        "Employee/Support/Manager groups, tickets, comments and attachment rows. Same --seed, same data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tickets", type=int, default=10000)
+        parser.add_argument("--departments", type=int, default=8)
+        parser.add_argument("--employees", type=int, help="Default: one per 50 tickets (at least 20).")
+        parser.add_argument("--support-per-department", type=int, default=3)
+        parser.add_argument("--managers", type=int, default=2)
+        parser.add_argument("--comments", type=float, default=3.0, help="Average comments per answered ticket.")
+        parser.add_argument("--attachments", type=float, default=0.2, help="Share of tickets with attachments.")
+        parser.add_argument("--days", type=int, default=365, help="Spread tickets over this many past days.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--password", default="helpdesk", help="Password of every generated user.")
+        parser.add_argument("--batch-size", type=int, default=seeding.BATCH_SIZE)
+        parser.add_argument("--index", action="store_true", help="Also rebuild the search index afterwards.")
+
+    def handle(self, *args, **options):
+        started = last_report = time.monotonic()
+
+        def progress(seeder):
+            nonlocal last_report
+            now = time.monotonic()
+            if now - last_report < REPORT_EVERY:
+                return
+            last_report, elapsed = now, now - started
+            self.stdout.write(
+                f"{seeder.tickets}/{seeder.total} tickets, {seeder.comments} comments, "
+                f"{seeder.attachments} attachments ({seeder.tickets / elapsed:.0f} tickets/s)"
+            )
+
+        seeder = seeding.Seeder(
+            options["tickets"],
+            departments=options["departments"],
+            employees=options["employees"],
+            support_per_department=options["support_per_department"],
+            managers=options["managers"],
+            comments=options["comments"],
+            attachments=options["attachments"],
+            days=options["days"],
+            seed=options["seed"],
+            password=options["password"],
+            batch_size=options["batch_size"],
+        )
+        try:
+            seeder.setup()
+        except ValueError as e:
+            raise CommandError(e)
+        seeder.run(progress)
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(
+            f"Inserted {seeder.tickets} tickets, {seeder.comments} comments and {seeder.attachments} "
+            f"attachments in {elapsed:.1f}s ({seeder.tickets / elapsed:.0f} tickets/s). Updating derived data..."
+        )
+        seeder.finish()
+        if options["index"]:
+            call_command("rebuild_search_index", stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(seeder.departments)} departments, {len(seeder.employees)} employees, "
+            f"{sum(map(len, seeder.support.values()))} support and {len(seeder.managers)} managers "
+            f"(password {options['password']!r})."
+        ))
+        if not options["index"]:
+            self.stdout.write("Search is not indexed: run `manage.py rebuild_search_index` (or pass --index).")
@@ -0,0 +1,312 @@
+import math
+from collections import Counter, defaultdict
+from datetime import timedelta
+from itertools import chain
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Min, OuterRef, Subquery, Sum
+from django.utils import timezone
+
+from .assignment import OPEN_STATUSES
+from .models import (
+    ArchivedTicket, DailyTicketStats, Department, DepartmentBacklog, DurationBucket, Ticket, TicketComment,
+)
+
+DONE_STATUSES = (Ticket.Status.RESOLVED, Ticket.Status.CLOSED)
+
+# Durations go into log-scale buckets 25% wide (so medians are within ~12%):
+# bucket b covers [BASE**b, BASE**(b+1)) seconds
+BUCKET_BASE = 1.25
+
+FIRST_RESPONSE = DurationBucket.Metric.FIRST_RESPONSE
+RESOLUTION = DurationBucket.Metric.RESOLUTION
+
+
+def bucket_for(seconds):
+    return int(math.log(max(seconds, 1), BUCKET_BASE))
+
+
+def bucket_value(bucket):
+    # Geometric middle of the bucket, in seconds
+    return BUCKET_BASE ** (bucket + 0.5)
+
+
+def _day(when):
+    return timezone.localdate(when).isoformat()
+
+
+# Changes are collected as small JSON-able ops and applied by a job
+# ("tickets.apply_metrics"), so a save costs one queue insert and the
+# rollups are only touched once the change has committed.
+
+def backlog_op(department_id, status, delta):
+    return ["backlog", department_id, status, delta]
+
+
+def daily_op(department_id, when, field, delta=1):
+    return ["daily", department_id, _day(when), field, delta]
+
+
+def duration_op(department_id, when, metric, seconds, delta=1):
+    return ["duration", department_id, _day(when), metric, bucket_for(seconds), delta]
+
+
+# What the rollups know about one ticket; recorded on post_init
+STATE_FIELDS = ("department_id", "status", "created_at", "first_response_at", "resolved_at")
+
+
+def ticket_state(ticket):
+    """The ticket's STATE_FIELDS as loaded, or None when any is deferred."""
+    values = ticket.__dict__
+    if any(f not in values for f in STATE_FIELDS):
+        return None
+    return tuple(values[f] for f in STATE_FIELDS)
+
+
+def mark_resolution(ticket, before):
+    """pre_save: stamp resolved_at when a ticket goes from open to done, clear it on reopen."""
+    was_done = before is not None and before[1] in DONE_STATUSES
+    if ticket.status in DONE_STATUSES and not was_done:
+        ticket.resolved_at = timezone.now()
+    elif ticket.status not in DONE_STATUSES and was_done:
+        ticket.resolved_at = None
+
+
+def _first_response(department_id, created_at, first_response_at, sign=1):
+    return [
+        daily_op(department_id, first_response_at, "first_responses", sign),
+        duration_op(department_id, first_response_at, FIRST_RESPONSE, (first_response_at - created_at).total_seconds(), sign),
+    ]
+
+
+def contribution(state, sign=1):
+    """
+    Ops that add (sign=1) or remove (sign=-1) one ticket in `state` from
+    the rollups. A change is the new state's contribution minus the old
+    one's, so incremental updates always agree with rebuild().
+    """
+    department_id, status, created_at, first_response_at, resolved_at = state
+    ops = [backlog_op(department_id, status, sign), daily_op(department_id, created_at, "created", sign)]
+    if first_response_at:
+        ops += _first_response(department_id, created_at, first_response_at, sign)
+    if resolved_at:
+        ops += [
+            daily_op(department_id, resolved_at, "resolved", sign),
+            duration_op(department_id, resolved_at, RESOLUTION, (resolved_at - created_at).total_seconds(), sign),
+        ]
+    return ops
+
+
+def change_ops(before, after):
+    """Ops for one ticket going from `before` to `after` (either may be None: created / deleted)."""
+    if before == after:
+        return []
+    ops = contribution(before, -1) if before else []
+    return merge_ops(ops + (contribution(after) if after else []))
+
+
+def first_response_ops(comment, ticket):
+    """
+    Record `comment` as the ticket's first response if it is one: public,
+    not by the ticket's employee, and no earlier response. The conditional
+    UPDATE makes concurrent replies count once.
+    """
+    if comment.is_internal or not comment.author_id or comment.author_id == ticket.employee_id:
+        return []
+    if ticket.__dict__.get("first_response_at") is not None:
+        return []
+    claimed = Ticket.objects.filter(pk=ticket.pk, first_response_at__isnull=True).update(
+        first_response_at=comment.created_at
+    )
+    if not claimed:
+        return []
+    ticket.first_response_at = comment.created_at  # so a later ticket.save() keeps it
+    return _first_response(ticket.department_id, ticket.created_at, comment.created_at)
+
+
+def bulk_ops(pks, status, now):
+    """
+    Ops for setting `status` on the tickets `pks` with one UPDATE that
+    stamps resolved_at with `now` the way mark_resolution() would
+    (assignment changes do not affect the rollups). Call before the UPDATE.
+    """
+    ops = []
+    for before in Ticket.objects.filter(pk__in=pks).exclude(status=status).values_list(*STATE_FIELDS).iterator():
+        if status in DONE_STATUSES:
+            resolved_at = before[4] if before[1] in DONE_STATUSES else now
+        else:
+            resolved_at = None
+        ops += change_ops(before, (before[0], status, before[2], before[3], resolved_at))
+    return merge_ops(ops)
+
+
+def merge_ops(ops):
+    """Sum repeated ops so each rollup row is written once; drops ops that cancel out."""
+    merged = Counter()
+    for op in ops:
+        *key, delta = op
+        merged[tuple(key)] += delta
+    return [[*key, delta] for key, delta in merged.items() if delta]
+
+
+def _bump(model, keys, field, delta):
+    if model.objects.filter(**keys).update(**{field: F(field) + delta}):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**keys, **{field: delta})
+    except IntegrityError:  # created concurrently
+        model.objects.filter(**keys).update(**{field: F(field) + delta})
+
+
+def apply_ops(ops):
+    for kind, *key, delta in merge_ops(ops):
+        if kind == "backlog":
+            department_id, status = key
+            _bump(DepartmentBacklog, {"department_id": department_id, "status": status}, "count", delta)
+        elif kind == "daily":
+            department_id, day, field = key
+            _bump(DailyTicketStats, {"department_id": department_id, "day": day}, field, delta)
+        elif kind == "duration":
+            department_id, day, metric, bucket = key
+            keys = {"department_id": department_id, "day": day, "metric": metric, "bucket": bucket}
+            _bump(DurationBucket, keys, "count", delta)
+
+
+@transaction.atomic
+def rebuild():
+    """
+    Recompute every rollup from tickets and comments, backfilling
+    first_response_at (and resolved_at from updated_at where unknown).
+    The backlog counts live tickets; daily counts and durations include
+    archived ones. Returns the number of tickets read.
+    """
+    first_reply = (
+        TicketComment.objects.filter(ticket=OuterRef("pk"), is_internal=False, author__isnull=False)
+        .exclude(author=OuterRef("employee"))
+        .order_by()
+        .values("ticket")
+        .annotate(first=Min("created_at"))
+        .values("first")
+    )
+    Ticket.objects.filter(first_response_at__isnull=True).update(first_response_at=Subquery(first_reply))
+    Ticket.objects.filter(status__in=DONE_STATUSES, resolved_at__isnull=True).update(resolved_at=F("updated_at"))
+    Ticket.objects.exclude(status__in=DONE_STATUSES).exclude(resolved_at=None).update(resolved_at=None)
+
+    DepartmentBacklog.objects.all().delete()
+    DailyTicketStats.objects.all().delete()
+    DurationBucket.objects.all().delete()
+
+    DepartmentBacklog.objects.bulk_create(
+        DepartmentBacklog(department_id=d, status=s, count=n)
+        for d, s, n in Ticket.objects.values_list("department_id", "status").annotate(n=Count("pk")).order_by()
+    )
+
+    daily = defaultdict(Counter)
+    buckets = Counter()
+    tickets = 0
+    fields = ("department_id", "created_at", "first_response_at", "resolved_at")
+    rows = chain.from_iterable(
+        model.objects.values_list(*fields).iterator(chunk_size=5000) for model in (Ticket, ArchivedTicket)
+    )
+    for department_id, created_at, first_response_at, resolved_at in rows:
+        tickets += 1
+        daily[department_id, _day(created_at)]["created"] += 1
+        if first_response_at:
+            day = _day(first_response_at)
+            daily[department_id, day]["first_responses"] += 1
+            seconds = (first_response_at - created_at).total_seconds()
+            buckets[department_id, day, FIRST_RESPONSE, bucket_for(seconds)] += 1
+        if resolved_at:
+            day = _day(resolved_at)
+            daily[department_id, day]["resolved"] += 1
+            buckets[department_id, day, RESOLUTION, bucket_for((resolved_at - created_at).total_seconds())] += 1
+
+    DailyTicketStats.objects.bulk_create(
+        (DailyTicketStats(department_id=d, day=day, **counts) for (d, day), counts in daily.items()),
+        batch_size=1000,
+    )
+    DurationBucket.objects.bulk_create(
+        (DurationBucket(department_id=d, day=day, metric=m, bucket=b, count=n) for (d, day, m, b), n in buckets.items()),
+        batch_size=1000,
+    )
+    return tickets
+
+
+def _median(histogram):
+    total = sum(histogram.values())
+    if not total:
+        return None
+    seen = 0
+    for bucket in sorted(histogram):
+        seen += histogram[bucket]
+        if seen * 2 >= total:
+            return timedelta(seconds=round(bucket_value(bucket)))
+
+
+def format_duration(value):
+    """'2d 4h', '3h 10m', '12m' for a timedelta; '–' for None."""
+    if value is None:
+        return "–"
+    minutes = int(value.total_seconds() // 60)
+    days, minutes = divmod(minutes, 24 * 60)
+    hours, minutes = divmod(minutes, 60)
+    if days:
+        return f"{days}d {hours}h"
+    if hours:
+        return f"{hours}h {minutes}m"
+    return f"{minutes}m"
+
+
+def dashboard(days=30):
+    """
+    Per-department backlog, throughput and median first-response and
+    resolution times over the last `days` days, read from the rollups only.
+    Returns (rows, totals); each row is a dict.
+    """
+    since = timezone.localdate() - timedelta(days=days - 1)
+    departments = dict(Department.objects.values_list("pk", "name"))
+
+    backlog = defaultdict(Counter)
+    for department_id, status, count in DepartmentBacklog.objects.values_list("department_id", "status", "count"):
+        backlog[department_id][status] += count
+
+    throughput = {
+        row["department_id"]: row
+        for row in DailyTicketStats.objects.filter(day__gte=since).values("department_id").annotate(
+            created=Sum("created"), first_responses=Sum("first_responses"), resolved=Sum("resolved"),
+        ).order_by()
+    }
+
+    histograms = defaultdict(Counter)
+    all_histograms = defaultdict(Counter)
+    for department_id, metric, bucket, count in (
+        DurationBucket.objects.filter(day__gte=since)
+        .values_list("department_id", "metric", "bucket").annotate(n=Sum("count")).order_by()
+    ):
+        histograms[department_id, metric][bucket] += count
+        all_histograms[metric][bucket] += count
+
+    rows = []
+    for department_id, name in sorted(departments.items(), key=lambda d: d[1]):
+        counts = backlog[department_id]
+        stats = throughput.get(department_id, {})
+        rows.append({
+            "department": name,
+            "statuses": [(label, counts[value]) for value, label in Ticket.Status.choices],
+            "open": sum(counts[s] for s in OPEN_STATUSES),
+            "created": stats.get("created", 0),
+            "resolved": stats.get("resolved", 0),
+            "median_first_response": _median(histograms[department_id, FIRST_RESPONSE]),
+            "median_resolution": _median(histograms[department_id, RESOLUTION]),
+        })
+
+    totals = {
+        "statuses": [(label, sum(r["statuses"][i][1] for r in rows)) for i, (_, label) in enumerate(Ticket.Status.choices)],
+        "open": sum(r["open"] for r in rows),
+        "created": sum(r["created"] for r in rows),
+        "resolved": sum(r["resolved"] for r in rows),
+        "median_first_response": _median(all_histograms[FIRST_RESPONSE]),
+        "median_resolution": _median(all_histograms[RESOLUTION]),
+    }
+    return rows, totals
@@ -0,0 +1,48 @@
+# Generated by Django 6.0 on 2026-10-18 13:45
+
+import django.db.models.deletion
+from django.db import OperationalError, migrations, models, transaction
+
+
+def create_fts_table(apps, schema_editor):
+    # Optional: without FTS5 the search falls back to SearchPosting
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute(
+                "CREATE VIRTUAL TABLE tickets_search_fts USING fts5("
+                "body, ticket_id UNINDEXED, is_internal UNINDEXED, tokenize='unicode61')"
+            )
+    except OperationalError:
+        pass
+
+
+def drop_fts_table(apps, schema_editor):
+    schema_editor.execute("DROP TABLE IF EXISTS tickets_search_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0004_ticket_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchPosting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('is_internal', models.BooleanField(default=False)),
+                ('comment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='tickets.ticketcomment')),
+                ('ticket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='tickets.ticket')),
+            ],
+            options={
+                'verbose_name': 'Search Posting',
+                'verbose_name_plural': 'Search Postings',
+                'indexes': [models.Index(fields=['term', 'ticket'], name='search_term_ticket_idx')],
+            },
+        ),
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
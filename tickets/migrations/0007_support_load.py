@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def count_open_tickets(apps, schema_editor):
+    Ticket = apps.get_model("tickets", "Ticket")
+    SupportProfile = apps.get_model("tickets", "SupportProfile")
+    counts = dict(
+        Ticket.objects.filter(status__in=["NEW", "IN_PROGRESS", "WAITING_EMPLOYEE"], assigned_support__isnull=False)
+        .values_list("assigned_support_id").annotate(n=models.Count("pk"))
+    )
+    for profile in SupportProfile.objects.all():
+        profile.open_tickets = counts.get(profile.user_id, 0)
+        profile.save(update_fields=["open_tickets"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0006_attachment_blobs'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='supportprofile',
+            name='last_assigned_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='supportprofile',
+            name='open_tickets',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='supportprofile',
+            index=models.Index(fields=['department', 'open_tickets'], name='support_dept_load_idx'),
+        ),
+        migrations.RunPython(count_open_tickets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def count_backlog(apps, schema_editor):
+    # Incremental updates need a correct starting backlog; history (daily
+    # counts and durations) is filled in by the rebuild_metrics command
+    Ticket = apps.get_model("tickets", "Ticket")
+    DepartmentBacklog = apps.get_model("tickets", "DepartmentBacklog")
+    DepartmentBacklog.objects.bulk_create(
+        DepartmentBacklog(department_id=d, status=s, count=n)
+        for d, s, n in Ticket.objects.values_list("department_id", "status").annotate(n=models.Count("pk")).order_by()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0007_support_load'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='first_response_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='resolved_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='DailyTicketStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('created', models.IntegerField(default=0)),
+                ('first_responses', models.IntegerField(default=0)),
+                ('resolved', models.IntegerField(default=0)),
+                ('department', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='tickets.department')),
+            ],
+            options={
+                'verbose_name': 'Daily Ticket Stats',
+                'verbose_name_plural': 'Daily Ticket Stats',
+                'constraints': [models.UniqueConstraint(fields=('department', 'day'), name='daily_dept_day_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DepartmentBacklog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('NEW', 'New'), ('IN_PROGRESS', 'In Progress'), ('WAITING_EMPLOYEE', 'Waiting for Employee'), ('RESOLVED', 'Resolved'), ('CLOSED', 'Closed')], max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('department', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='tickets.department')),
+            ],
+            options={
+                'verbose_name': 'Department Backlog',
+                'verbose_name_plural': 'Department Backlog',
+                'constraints': [models.UniqueConstraint(fields=('department', 'status'), name='backlog_dept_status_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DurationBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('metric', models.CharField(choices=[('first_response', 'Time to first response'), ('resolution', 'Time to resolution')], max_length=20)),
+                ('bucket', models.SmallIntegerField()),
+                ('count', models.IntegerField(default=0)),
+                ('department', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='tickets.department')),
+            ],
+            options={
+                'verbose_name': 'Duration Bucket',
+                'verbose_name_plural': 'Duration Buckets',
+                'constraints': [models.UniqueConstraint(fields=('department', 'day', 'metric', 'bucket'), name='duration_bucket_uniq')],
+            },
+        ),
+        migrations.RunPython(count_backlog, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0010_ticket_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketSignature',
+            fields=[
+                ('ticket', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='tickets.ticket')),
+                ('signature', models.BinaryField()),
+            ],
+            options={
+                'verbose_name': 'Ticket Signature',
+                'verbose_name_plural': 'Ticket Signatures',
+            },
+        ),
+        migrations.AddField(
+            model_name='archivedticket',
+            name='duplicate_of_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, db_constraint=False, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='likely_duplicates', to='tickets.ticket'),
+        ),
+        migrations.CreateModel(
+            name='TicketBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.BigIntegerField()),
+                ('ticket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='tickets.ticket')),
+            ],
+            options={
+                'verbose_name': 'Ticket Bucket',
+                'verbose_name_plural': 'Ticket Buckets',
+                'indexes': [models.Index(fields=['key', 'ticket'], name='bucket_key_ticket_idx')],
+            },
+        ),
+    ]
@@ -1,6 +1,7 @@
 import uuid
 from django.db import models
 from django.contrib.auth.models import User
+from .storage import attachment_storage, blob_digest
 
 class Department(models.Model):
     name = models.CharField(max_length=120, unique=True)
@@ -27,6 +28,9 @@ class EmployeeProfile(models.Model):
 class SupportProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     department = models.ForeignKey(Department, on_delete=models.PROTECT)
+    # Maintained incrementally by tickets.assignment; `recount_support_load` repairs drift
+    open_tickets = models.PositiveIntegerField(default=0, editable=False)
+    last_assigned_at = models.DateTimeField(null=True, blank=True, editable=False)
 
     def __str__(self):
         return f"{self.user.username} ({self.department})"
@@ -34,6 +38,9 @@ class SupportProfile(models.Model):
     class Meta:
         verbose_name = "Support Profile"
         verbose_name_plural = "Support Profiles"
+        indexes = [
+            models.Index(fields=["department", "open_tickets"], name="support_dept_load_idx"),
+        ]
 
 class Ticket(models.Model):
     class Status(models.TextChoices):
@@ -44,10 +51,12 @@ class Ticket(models.Model):
         CLOSED = "CLOSED", "Closed"
 
     ticket_id = models.CharField(max_length=20, unique=True, editable=False)
-    employee = models.ForeignKey(User, on_delete=models.CASCADE, related_name="tickets_created")
-    department = models.ForeignKey(Department, on_delete=models.PROTECT)
+    # No single-column FK indexes: the composite indexes in Meta start with
+    # these columns and serve the same lookups, for less work per write
+    employee = models.ForeignKey(User, on_delete=models.CASCADE, related_name="tickets_created", db_index=False)
+    department = models.ForeignKey(Department, on_delete=models.PROTECT, db_index=False)
     assigned_support = models.ForeignKey(
-        User, on_delete=models.SET_NULL, null=True, blank=True, related_name="tickets_assigned"
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name="tickets_assigned", db_index=False
     )
 
     subject = models.CharField(max_length=200)
@@ -58,6 +67,16 @@ class Ticket(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Set by tickets.metrics: first public reply by someone other than the employee,
+    # and when the ticket last went from open to Resolved/Closed
+    first_response_at = models.DateTimeField(null=True, blank=True, editable=False)
+    resolved_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # Set at creation when an open ticket of the department reads the same
+    # (tickets.similarity). No constraint: the original may be archived.
+    duplicate_of = models.ForeignKey(
+        "self", on_delete=models.SET_NULL, null=True, blank=True, editable=False,
+        related_name="likely_duplicates", db_constraint=False,
+    )
 
     def save(self, *args, **kwargs):
         if not self.ticket_id:
@@ -71,22 +90,61 @@ class Ticket(models.Model):
     class Meta:
         verbose_name = "Ticket"
         verbose_name_plural = "Tickets"
+        # Keyset pagination walks (created_at, id) newest first, per list.
+        # `manage.py explain_queries` checks the hot queries still use these.
+        indexes = [
+            models.Index(fields=["-created_at", "-id"], name="ticket_created_idx"),
+            models.Index(fields=["employee", "-created_at", "-id"], name="ticket_employee_created_idx"),
+            models.Index(fields=["assigned_support", "-created_at", "-id"], name="ticket_support_created_idx"),
+            # Support's "unassigned in my department" list: only the (few) unassigned rows
+            models.Index(
+                fields=["department", "-created_at", "-id"],
+                condition=models.Q(assigned_support__isnull=True),
+                name="ticket_unassigned_dept_idx",
+            ),
+            # Bulk action filters, metrics rebuild, department lookups
+            models.Index(fields=["department", "status"], name="ticket_dept_status_idx"),
+        ]
 
 def ticket_attachment_path(instance, filename):
     return f"tickets/{instance.ticket.ticket_id}/{filename}"
 
 class TicketAttachment(models.Model):
     ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name="attachments")
-    file = models.FileField(upload_to=ticket_attachment_path)
+    # Stored content-addressed (tickets.storage); upload_to only supplies the extension
+    file = models.FileField(upload_to=ticket_attachment_path, storage=attachment_storage)
+    original_name = models.CharField(max_length=255, blank=True)
     uploaded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
+    @property
+    def display_name(self):
+        return self.original_name or self.file.name.rsplit("/", 1)[-1]
+
+    @property
+    def sha256(self):
+        return blob_digest(self.file.name)
+
     class Meta:
         verbose_name = "Ticket Attachment"
         verbose_name_plural = "Ticket Attachments"
 
+class AttachmentBlob(models.Model):
+    # One row per stored file; ref_count = attachment rows (live or archived) pointing at it
+    name = models.CharField(max_length=100, unique=True)
+    ref_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count})"
+
+    class Meta:
+        verbose_name = "Attachment Blob"
+        verbose_name_plural = "Attachment Blobs"
+
 class TicketComment(models.Model):
-    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name="comments")
+    # Indexed by comment_ticket_created_idx
+    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name="comments", db_index=False)
     author = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     message = models.TextField()
     is_internal = models.BooleanField(default=False)  # internal manager/support notes
@@ -94,5 +152,161 @@ class TicketComment(models.Model):
 
     class Meta:
         ordering = ["created_at"]
+        # A ticket's comments come back in order without a sort
+        indexes = [
+            models.Index(fields=["ticket", "created_at"], name="comment_ticket_created_idx"),
+        ]
         verbose_name = "Ticket Comment"
         verbose_name_plural = "Ticket Comments"
+
+class SearchPosting(models.Model):
+    # Pure-Python inverted index, used when SQLite FTS5 is not available.
+    # One row per distinct term per document (ticket text or one comment).
+    term = models.CharField(max_length=64)
+    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name="+")
+    comment = models.ForeignKey(TicketComment, on_delete=models.CASCADE, null=True, blank=True, related_name="+")
+    is_internal = models.BooleanField(default=False)
+
+    class Meta:
+        verbose_name = "Search Posting"
+        verbose_name_plural = "Search Postings"
+        indexes = [
+            models.Index(fields=["term", "ticket"], name="search_term_ticket_idx"),
+        ]
+
+class TicketSignature(models.Model):
+    # MinHash signature of a ticket's subject and description (tickets.similarity)
+    ticket = models.OneToOneField(Ticket, on_delete=models.CASCADE, primary_key=True, related_name="+")
+    signature = models.BinaryField()
+
+    class Meta:
+        verbose_name = "Ticket Signature"
+        verbose_name_plural = "Ticket Signatures"
+
+class TicketBucket(models.Model):
+    # LSH buckets: one row per band of a ticket's signature. Tickets sharing
+    # a key are candidate duplicates.
+    key = models.BigIntegerField()
+    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name="+")
+
+    class Meta:
+        verbose_name = "Ticket Bucket"
+        verbose_name_plural = "Ticket Buckets"
+        indexes = [
+            models.Index(fields=["key", "ticket"], name="bucket_key_ticket_idx"),
+        ]
+
+# Metrics rollups, maintained from ticket/comment changes by tickets.metrics.
+# The manager dashboard reads only these; `rebuild_metrics` recomputes them.
+
+class DepartmentBacklog(models.Model):
+    # Current number of tickets per department and status
+    department = models.ForeignKey(Department, on_delete=models.CASCADE, related_name="+")
+    status = models.CharField(max_length=20, choices=Ticket.Status.choices)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Department Backlog"
+        verbose_name_plural = "Department Backlog"
+        constraints = [
+            models.UniqueConstraint(fields=["department", "status"], name="backlog_dept_status_uniq"),
+        ]
+
+class DailyTicketStats(models.Model):
+    # Throughput per department per (local) day
+    department = models.ForeignKey(Department, on_delete=models.CASCADE, related_name="+")
+    day = models.DateField()
+    created = models.IntegerField(default=0)
+    first_responses = models.IntegerField(default=0)
+    resolved = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Daily Ticket Stats"
+        verbose_name_plural = "Daily Ticket Stats"
+        constraints = [
+            models.UniqueConstraint(fields=["department", "day"], name="daily_dept_day_uniq"),
+        ]
+        # The dashboard reads the last N days of every department
+        indexes = [models.Index(fields=["day"], name="daily_day_idx")]
+
+class DurationBucket(models.Model):
+    # Histogram of first-response / resolution times per department per day,
+    # in logarithmic buckets (see tickets.metrics.bucket_for), so medians can
+    # be estimated without reading tickets
+    class Metric(models.TextChoices):
+        FIRST_RESPONSE = "first_response", "Time to first response"
+        RESOLUTION = "resolution", "Time to resolution"
+
+    department = models.ForeignKey(Department, on_delete=models.CASCADE, related_name="+")
+    day = models.DateField()
+    metric = models.CharField(max_length=20, choices=Metric.choices)
+    bucket = models.SmallIntegerField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Duration Bucket"
+        verbose_name_plural = "Duration Buckets"
+        constraints = [
+            models.UniqueConstraint(fields=["department", "day", "metric", "bucket"], name="duration_bucket_uniq"),
+        ]
+        indexes = [models.Index(fields=["day"], name="duration_bucket_day_idx")]
+
+# Archive tier, filled by tickets.archive (`archive_tickets`): closed tickets
+# past a cutoff, moved with their comments and attachment rows. Same columns
+# and primary keys as the live tables, so links to a ticket keep working.
+
+class ArchivedTicket(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    ticket_id = models.CharField(max_length=20, unique=True)
+    employee = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    department = models.ForeignKey(Department, on_delete=models.PROTECT, related_name="+")
+    assigned_support = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    subject = models.CharField(max_length=200)
+    description = models.TextField()
+    status = models.CharField(max_length=20, choices=Ticket.Status.choices)
+    internal_notes = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    first_response_at = models.DateTimeField(null=True, blank=True)
+    resolved_at = models.DateTimeField(null=True, blank=True)
+    duplicate_of_id = models.BigIntegerField(null=True, blank=True)
+    archived_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.ticket_id} - {self.subject}"
+
+    class Meta:
+        verbose_name = "Archived Ticket"
+        verbose_name_plural = "Archived Tickets"
+
+class ArchivedAttachment(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    ticket = models.ForeignKey(ArchivedTicket, on_delete=models.CASCADE, related_name="attachments")
+    # Still counted in AttachmentBlob.ref_count
+    file = models.FileField(storage=attachment_storage)
+    original_name = models.CharField(max_length=255, blank=True)
+    uploaded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    uploaded_at = models.DateTimeField()
+
+    display_name = TicketAttachment.display_name
+    sha256 = TicketAttachment.sha256
+
+    class Meta:
+        verbose_name = "Archived Attachment"
+        verbose_name_plural = "Archived Attachments"
+
+class ArchivedComment(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    ticket = models.ForeignKey(ArchivedTicket, on_delete=models.CASCADE, related_name="comments", db_index=False)
+    author = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    message = models.TextField()
+    is_internal = models.BooleanField(default=False)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ["created_at"]
+        indexes = [
+            models.Index(fields=["ticket", "created_at"], name="archived_comment_ticket_idx"),
+        ]
+        verbose_name = "Archived Comment"
+        verbose_name_plural = "Archived Comments"
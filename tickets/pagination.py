@@ -0,0 +1,135 @@
+import base64
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+
+PAGE_SIZE = 50
+
+
+def encode_cursor(obj):
+    raw = f"{obj.created_at.isoformat()}|{obj.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    # Returns (created_at, pk) or None for a missing/garbled cursor
+    if not token:
+        return None
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        created_at, pk = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+        created_at, pk = datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    # With USE_TZ, encode_cursor() always writes the offset; a naive value was edited by hand
+    if settings.USE_TZ and created_at.tzinfo is None:
+        return None
+    return created_at, pk
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor, prev_cursor, request, prefix):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.request = request
+        self.prefix = prefix
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.prev_cursor is not None
+
+    def _url(self, **params):
+        # Keep the other query params (filters, cursors of other lists on the page)
+        query = self.request.GET.copy()
+        query.pop(f"{self.prefix}after", None)
+        query.pop(f"{self.prefix}before", None)
+        for key, value in params.items():
+            query[f"{self.prefix}{key}"] = value
+        return f"?{query.urlencode()}" if query else "?"
+
+    @property
+    def next_url(self):
+        return self._url(after=self.next_cursor) if self.next_cursor else None
+
+    @property
+    def previous_url(self):
+        return self._url(before=self.prev_cursor) if self.prev_cursor else None
+
+    @property
+    def first_url(self):
+        return self._url()
+
+
+def _paginate(queryset, request, prefix, per_page):
+    # Generator shared by the sync and async entry points: yields each
+    # queryset to fetch, is sent back its rows, and returns the page.
+    after = decode_cursor(request.GET.get(f"{prefix}after"))
+    before = decode_cursor(request.GET.get(f"{prefix}before")) if not after else None
+
+    if before:
+        created_at, pk = before
+        qs = queryset.filter(
+            Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk)
+        ).order_by("created_at", "id")
+        rows = yield qs[:per_page + 1]
+        if len(rows) > per_page:
+            rows = rows[:per_page]
+            rows.reverse()
+            has_newer, has_older = True, True
+        else:
+            # Walked back to the newest rows: serve a full first page instead
+            before = None
+
+    if not before:
+        qs = queryset.order_by("-created_at", "-id")
+        if after:
+            created_at, pk = after
+            qs = qs.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+        rows = yield qs[:per_page + 1]
+        has_older = len(rows) > per_page
+        rows = rows[:per_page]
+        has_newer = after is not None
+
+    next_cursor = encode_cursor(rows[-1]) if rows and has_older else None
+    prev_cursor = encode_cursor(rows[0]) if rows and has_newer else None
+    return KeysetPage(rows, next_cursor, prev_cursor, request, prefix)
+
+
+def keyset_paginate(queryset, request, prefix="", per_page=PAGE_SIZE):
+    """
+    Cursor pagination on (created_at, id), newest first.
+
+    Only ever fetches per_page + 1 rows, so the cost of a page does not grow
+    with the size of the table (unlike OFFSET). The cursor is read from
+    ?<prefix>after= (older rows) or ?<prefix>before= (newer rows).
+    """
+    steps = _paginate(queryset, request, prefix, per_page)
+    try:
+        qs = next(steps)
+        while True:
+            qs = steps.send(list(qs))
+    except StopIteration as done:
+        return done.value
+
+
+async def akeyset_paginate(queryset, request, prefix="", per_page=PAGE_SIZE):
+    """keyset_paginate() for async views, fetching through the async ORM."""
+    steps = _paginate(queryset, request, prefix, per_page)
+    try:
+        qs = next(steps)
+        while True:
+            qs = steps.send([row async for row in qs])
+    except StopIteration as done:
+        return done.value
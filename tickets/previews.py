@@ -0,0 +1,131 @@
+import hashlib
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from PIL import Image, ImageOps
+
+from .uploads import SNIFF_LENGTH, sniff_content_type
+
+PREVIEW_SIZE = (320, 320)
+PDF_RENDER_TIMEOUT = 30
+
+_pool = None
+
+
+def preview_key(attachment):
+    # Content hash for deduplicated blobs, so identical files share one preview
+    return attachment.sha256 or hashlib.sha256(attachment.file.name.encode()).hexdigest()
+
+
+def preview_path(key):
+    root = getattr(settings, "PREVIEW_ROOT", os.path.join(settings.MEDIA_ROOT, "previews"))
+    return os.path.join(root, key[:2], f"{key}.webp")
+
+
+def _thumbnail(source, dest, size):
+    with Image.open(source) as im:
+        im.draft("RGB", size)  # JPEG: decode at reduced scale instead of full size
+        im = ImageOps.exif_transpose(im)
+        im.thumbnail(size)
+        if im.mode not in ("RGB", "RGBA"):
+            im = im.convert("RGBA" if "A" in im.getbands() else "RGB")
+        im.save(dest, "WEBP", quality=80)
+
+
+def _no_preview(dest):
+    # Negative cache so unsupported/broken files are not re-rendered on every view
+    open(f"{dest}.none", "w").close()
+
+
+def render_preview(source, dest, size=PREVIEW_SIZE):
+    """
+    Write a WebP thumbnail of `source` to `dest`. Runs in a pool process.
+    PDFs are rendered through poppler's pdftoppm when it is installed.
+    Returns dest, or None when the file has no preview.
+    """
+    with open(source, "rb") as f:
+        content_type = sniff_content_type(f.read(SNIFF_LENGTH))
+
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    tmp = f"{dest}.{os.getpid()}.tmp"
+    try:
+        if content_type == "application/pdf":
+            if not shutil.which("pdftoppm"):
+                return None
+            with tempfile.TemporaryDirectory() as workdir:
+                subprocess.run(
+                    ["pdftoppm", "-f", "1", "-l", "1", "-png", "-scale-to", str(max(size)),
+                     source, os.path.join(workdir, "page")],
+                    check=True, capture_output=True, timeout=PDF_RENDER_TIMEOUT,
+                )
+                pages = sorted(os.listdir(workdir))
+                if not pages:
+                    _no_preview(dest)
+                    return None
+                _thumbnail(os.path.join(workdir, pages[0]), tmp, size)
+        elif content_type and content_type.startswith("image/"):
+            _thumbnail(source, tmp, size)
+        else:
+            _no_preview(dest)
+            return None
+        os.replace(tmp, dest)  # atomic: readers never see a half-written file
+    except (OSError, subprocess.SubprocessError, Image.DecompressionBombError):
+        _no_preview(dest)
+        return None
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return dest
+
+
+def pool():
+    # spawn, not fork: the web process may be running threads
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=getattr(settings, "PREVIEW_WORKERS", 2),
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+def ensure_previews(attachments):
+    """
+    Return {attachment pk: preview path or None}, rendering missing
+    previews in the process pool. Cached previews cost one stat each.
+    """
+    results, pending = {}, {}
+    for attachment in attachments:
+        dest = preview_path(preview_key(attachment))
+        if os.path.exists(dest):
+            results[attachment.pk] = dest
+            continue
+        if os.path.exists(f"{dest}.none"):
+            results[attachment.pk] = None
+            continue
+        try:
+            source = attachment.file.path
+        except NotImplementedError:  # storage without local paths
+            results[attachment.pk] = None
+            continue
+        if not os.path.exists(source):
+            results[attachment.pk] = None
+            continue
+        # Same content in several attachments: render it once
+        if dest not in pending:
+            pending[dest] = pool().submit(render_preview, source, dest)
+        results[attachment.pk] = pending[dest]
+
+    for pk, value in results.items():
+        if value is not None and not isinstance(value, str):
+            results[pk] = value.result()
+    return results
+
+
+def ensure_preview(attachment):
+    return ensure_previews([attachment])[attachment.pk]
@@ -0,0 +1,134 @@
+"""
+The hot queries of the ticket views, as the views build them, for checking
+their plans (explain_queries). Each builder takes a Sample of real ids so
+the planner sees realistic parameters.
+"""
+import re
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.utils import timezone
+
+from jobs.models import Job
+from . import similarity
+from .assignment import OPEN_STATUSES, STRATEGIES
+from .models import DailyTicketStats, DurationBucket, SupportProfile, Ticket, TicketAttachment, TicketComment
+from .pagination import PAGE_SIZE
+
+
+class Sample:
+    def __init__(self):
+        latest = Ticket.objects.order_by("-pk").values("pk", "employee_id", "department_id", "created_at").first()
+        if latest is None:
+            raise ValueError("No tickets to explain queries with: run `manage.py seed_helpdesk` first.")
+        self.ticket = latest["pk"]
+        self.employee = latest["employee_id"]
+        self.department = latest["department_id"]
+        self.cursor = (latest["created_at"], latest["pk"])
+        self.support = (
+            SupportProfile.objects.order_by("-open_tickets").values_list("user_id", flat=True).first()
+            or User.objects.values_list("pk", flat=True).first()
+        )
+
+
+def _page(queryset):
+    # First page of keyset pagination (tickets.pagination)
+    return queryset.order_by("-created_at", "-id")[:PAGE_SIZE + 1]
+
+
+def _next_page(queryset, s):
+    created_at, pk = s.cursor
+    return _page(queryset.filter(created_at__lte=created_at).exclude(created_at=created_at, pk__gte=pk))
+
+
+# (name, builder, tables a full scan is fine for). Small lookup tables
+# (departments, users by pk) never show up as scans of the big ones. The
+# auto-assign sort is over one department's support staff, a handful of rows.
+HOT_QUERIES = [
+    ("employee_ticket_list", lambda s: _page(Ticket.objects.filter(employee_id=s.employee)), ()),
+    ("employee_ticket_list (next page)", lambda s: _next_page(Ticket.objects.filter(employee_id=s.employee), s), ()),
+    ("manager_ticket_list", lambda s: _page(
+        Ticket.objects.select_related("employee", "department", "assigned_support")
+    ), ()),
+    ("manager_ticket_list (next page)", lambda s: _next_page(Ticket.objects.all(), s), ()),
+    ("support_ticket_list: mine", lambda s: _page(Ticket.objects.filter(assigned_support_id=s.support)), ()),
+    ("support_ticket_list: unassigned", lambda s: _page(
+        Ticket.objects.filter(department_id=s.department, assigned_support__isnull=True)
+    ), ()),
+    ("ticket_detail: comments", lambda s: TicketComment.objects.filter(ticket_id=s.ticket).select_related("author"), ()),
+    ("ticket_detail: attachments", lambda s: TicketAttachment.objects.filter(ticket_id=s.ticket), ()),
+    ("manager_ticket_bulk: department + status", lambda s: Ticket.objects.filter(
+        department_id=s.department, status=Ticket.Status.NEW
+    ).values_list("pk", flat=True), ()),
+    ("manager_ticket_bulk: unassigned", lambda s: Ticket.objects.filter(
+        department_id=s.department, assigned_support__isnull=True, status__in=OPEN_STATUSES,
+    ).values_list("pk", flat=True), ()),
+    ("manager_ticket_export: date range", lambda s: Ticket.objects.filter(
+        created_at__gte=timezone.now() - timedelta(days=7)
+    ).order_by("created_at", "pk"), ()),
+    ("manager_dashboard: daily", lambda s: DailyTicketStats.objects.filter(
+        day__gte=timezone.localdate() - timedelta(days=29)
+    ).values("department_id"), ()),
+    ("manager_dashboard: durations", lambda s: DurationBucket.objects.filter(
+        day__gte=timezone.localdate() - timedelta(days=29)
+    ).values("department_id", "metric", "bucket"), ()),
+    ("ticket_create: duplicate candidates", lambda s: similarity.candidates(
+        similarity.signature(*Ticket.objects.values_list("subject", "description").get(pk=s.ticket)), s.department
+    ), ()),
+    ("auto-assign: candidates", lambda s: SupportProfile.objects.filter(
+        department_id=s.department, user__is_active=True, user__groups__name="Support"
+    ).order_by(*STRATEGIES["least_loaded"])[:1], ("auth_user",)),
+    ("jobs: due", lambda s: Job.objects.filter(
+        status=Job.Status.QUEUED, run_at__lte=timezone.now()
+    ).order_by("run_at")[:10], ()),
+    ("jobs: stats", lambda s: Job.objects.filter(
+        status=Job.Status.DONE, finished_at__gte=timezone.now() - timedelta(minutes=15)
+    ).values("created_at", "started_at", "finished_at"), ()),
+    ("jobs: purge", lambda s: Job.objects.filter(
+        status=Job.Status.DONE, finished_at__lt=timezone.now() - timedelta(days=7)
+    ).values("pk")[:1000], ()),
+]
+
+# SQLite: "SCAN t" is a full table scan. PostgreSQL: "Seq Scan on t".
+FULL_SCAN_RE = re.compile(r"\bSCAN (\w+)(?! USING)(?!\w)|Seq Scan on (\w+)")
+# "SCAN t USING [COVERING] INDEX" walks a whole index in order: fine under a
+# LIMIT (a page), a full scan in all but name without one
+INDEX_WALK_RE = re.compile(r"\bSCAN (\w+) USING (?:COVERING )?INDEX|Index (?:Only )?Scan using \w+ on (\w+)(?!.*Cond)")
+TEMP_SORT_RE = re.compile(r"USE TEMP B-TREE FOR (?:ORDER BY|RIGHT PART OF ORDER BY)|Sort Key:")
+
+
+def explain(queryset):
+    return queryset.explain()
+
+
+def check(plan, allowed=(), limited=False):
+    """
+    (full scans of tables not in `allowed`, whether the rows are sorted
+    outside an index). Unbounded index walks count as full scans unless the
+    query is `limited`.
+    """
+    scans = [a or b for a, b in FULL_SCAN_RE.findall(plan)]
+    if not limited:
+        scans += [a or b for a, b in INDEX_WALK_RE.findall(plan)]
+    return [t for t in scans if t not in allowed], bool(TEMP_SORT_RE.search(plan))
+
+
+def run(sample=None, names=None):
+    """[(name, plan, full scans, sorts)] for every hot query."""
+    sample = sample or Sample()
+    results = []
+    for name, build, allowed in HOT_QUERIES:
+        if names and name not in names:
+            continue
+        queryset = build(sample)
+        plan = explain(queryset)
+        scans, sorts = check(plan, allowed, limited=queryset.query.high_mark is not None)
+        results.append((name, plan, scans, sorts))
+    return results
+
+
+def analyze():
+    """Refresh the planner statistics (SQLite and PostgreSQL)."""
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
@@ -0,0 +1,144 @@
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+
+from .models import SearchPosting, Ticket, TicketComment
+
+FTS_TABLE = "tickets_search_fts"
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+MAX_TERM_LENGTH = 64
+
+_backend = None
+
+
+def tokenize(text):
+    # Lowercased word tokens; single characters are too common to be useful
+    return [t[:MAX_TERM_LENGTH] for t in TOKEN_RE.findall((text or "").lower()) if len(t) > 1]
+
+
+def backend():
+    """'fts5' or 'python', resolved once per process (TICKET_SEARCH_BACKEND overrides)."""
+    global _backend
+    if _backend is None:
+        choice = getattr(settings, "TICKET_SEARCH_BACKEND", "auto")
+        if choice == "auto":
+            has_fts = connection.vendor == "sqlite" and FTS_TABLE in connection.introspection.table_names()
+            choice = "fts5" if has_fts else "python"
+        _backend = choice
+    return _backend
+
+
+def _fts_write(rowid, ticket_id, body, is_internal, created=False):
+    # rowid = ticket pk * 2 for ticket text, comment pk * 2 + 1 for a comment,
+    # so a document is replaced or removed by rowid without a scan
+    with connection.cursor() as cursor:
+        if not created:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [rowid])
+        if body:
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, body, ticket_id, is_internal) VALUES (%s, %s, %s, %s)",
+                [rowid, body, ticket_id, int(is_internal)],
+            )
+
+
+def _postings_write(ticket_id, comment_id, text, is_internal, created=False):
+    if not created:
+        SearchPosting.objects.filter(ticket_id=ticket_id, comment_id=comment_id).delete()
+    SearchPosting.objects.bulk_create([
+        SearchPosting(term=term, ticket_id=ticket_id, comment_id=comment_id, is_internal=is_internal)
+        for term in set(tokenize(text))
+    ])
+
+
+def index_ticket(ticket, created=False):
+    text = f"{ticket.subject}\n{ticket.description}"
+    if backend() == "fts5":
+        _fts_write(ticket.pk * 2, ticket.pk, text, False, created)
+    else:
+        _postings_write(ticket.pk, None, text, False, created)
+
+
+def index_comment(comment, created=False):
+    if backend() == "fts5":
+        _fts_write(comment.pk * 2 + 1, comment.ticket_id, comment.message, comment.is_internal, created)
+    else:
+        _postings_write(comment.ticket_id, comment.pk, comment.message, comment.is_internal, created)
+
+
+def unindex_ticket(ticket_id):
+    # Postings cascade with the ticket; the FTS table needs explicit cleanup.
+    # Comment rows are removed by their own post_delete.
+    if backend() == "fts5":
+        _fts_write(ticket_id * 2, ticket_id, "", False)
+
+
+def unindex_comment(comment_id):
+    if backend() == "fts5":
+        _fts_write(comment_id * 2 + 1, None, "", False)
+
+
+def unindex_tickets(ticket_ids, comment_ids):
+    """Remove the documents of many tickets and their comments at once (archiving)."""
+    if backend() == "fts5":
+        rowids = [pk * 2 for pk in ticket_ids] + [pk * 2 + 1 for pk in comment_ids]
+        with connection.cursor() as cursor:
+            for start in range(0, len(rowids), 500):
+                chunk = rowids[start:start + 500]
+                cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({', '.join(['%s'] * len(chunk))})", chunk)
+    # Postings reference the ticket rows, so clear them whatever the backend
+    SearchPosting.objects.filter(ticket_id__in=ticket_ids).delete()
+
+
+@transaction.atomic
+def rebuild(batch_size=2000):
+    """Re-index every ticket and comment. Returns the number of documents indexed."""
+    if backend() == "fts5":
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+    else:
+        SearchPosting.objects.all().delete()
+
+    count = 0
+    for ticket in Ticket.objects.only("pk", "subject", "description").iterator(chunk_size=batch_size):
+        index_ticket(ticket, created=True)
+        count += 1
+    for comment in TicketComment.objects.only("pk", "ticket_id", "message", "is_internal").iterator(chunk_size=batch_size):
+        index_comment(comment, created=True)
+        count += 1
+    return count
+
+
+def search(queryset, query, include_internal=True):
+    """
+    Narrow a Ticket queryset to tickets whose subject, description or
+    comments contain every term in `query` (the last term as a prefix).
+    The match runs as an indexed subquery, so access filtering, ordering
+    and pagination stay on the caller's queryset.
+    """
+    terms = tokenize(query)
+    if not terms:
+        return queryset.none()
+
+    if backend() == "fts5":
+        sql = f"SELECT ticket_id FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s"
+        if not include_internal:
+            sql += " AND is_internal = 0"
+        # Terms may be spread over the ticket text and its comments, so each one
+        # is matched on its own and the ticket has to appear in every result
+        phrases = [f'"{t}"' for t in terms[:-1]] + [f'"{terms[-1]}"*']
+        for phrase in phrases:
+            queryset = queryset.filter(pk__in=RawSQL(sql, [phrase]))
+        return queryset
+
+    postings = SearchPosting.objects.all()
+    if not include_internal:
+        postings = postings.filter(is_internal=False)
+    for term in terms[:-1]:
+        queryset = queryset.filter(pk__in=postings.filter(term=term).values("ticket_id"))
+    last = terms[-1]
+    # Range instead of LIKE so the prefix lookup can use the term index
+    return queryset.filter(
+        pk__in=postings.filter(term__gte=last, term__lt=last + "\uffff").values("ticket_id")
+    )
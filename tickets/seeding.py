@@ -0,0 +1,296 @@
+import io
+import math
+import random
+from collections import Counter
+from datetime import timedelta, timezone as dt_timezone
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .blobs import add_references
+from .importing import TICKET_FIELDS, existing_ticket_ids, insert_sql, generate_ticket_ids
+from .models import Department, SupportProfile, Ticket, TicketAttachment, TicketComment
+from .storage import attachment_storage
+
+BATCH_SIZE = 2000
+
+SEED_TICKET_FIELDS = TICKET_FIELDS + ("first_response_at", "resolved_at")
+COMMENT_FIELDS = ("ticket", "author", "message", "is_internal", "created_at")
+ATTACHMENT_FIELDS = ("ticket", "file", "original_name", "uploaded_by", "uploaded_at")
+
+DEPARTMENTS = (
+    "IT", "Facilities", "HR", "Finance", "Procurement", "Security", "Legal",
+    "Sales Operations", "Marketing", "Logistics", "Customer Care", "Engineering",
+)
+
+# Subject templates per kind of request; {0} is filled from the kind's nouns
+SUBJECTS = (
+    (("{0} is not working", "{0} stopped working after the update", "Need a replacement {0}", "{0} is very slow"),
+     ("Printer on floor 3", "Laptop", "Docking station", "Monitor", "Keyboard", "Headset", "Desk phone", "Projector")),
+    (("Cannot log in to {0}", "Password reset for {0}", "Access request: {0}", "{0} account locked"),
+     ("VPN", "email", "the ERP", "the CRM", "the HR portal", "SharePoint", "the expense tool", "Wi-Fi")),
+    (("Question about {0}", "{0} is wrong", "Please update my {0}", "Missing {0}"),
+     ("payslip", "leave balance", "contract", "expense claim", "purchase order", "invoice", "bank details")),
+    (("{0} needs repair", "{0} in meeting room B", "Broken {0}", "{0} request"),
+     ("Air conditioning", "Door badge reader", "Chair", "Light", "Parking permit", "Locker", "Coffee machine")),
+)
+
+DESCRIPTION_SENTENCES = (
+    "This started this morning.", "It has been happening for a few days now.",
+    "I already tried restarting it.", "Several colleagues have the same problem.",
+    "It is blocking my work on a customer deadline.", "The error message says access denied.",
+    "Please let me know if you need more details.", "I am working from the office today.",
+    "It worked fine last week.", "Screenshots are attached.", "This is not urgent.",
+)
+
+SUPPORT_REPLIES = (
+    "Thanks, I am looking into it.", "Could you send a screenshot of the error?",
+    "I have reset it on our side, please try again.", "A replacement has been ordered.",
+    "Can you confirm the asset tag?", "This should be fixed now, please check.",
+    "We are waiting for the vendor.", "I will come by your desk this afternoon.",
+)
+EMPLOYEE_REPLIES = (
+    "Any update on this?", "Still not working, sorry.", "Works now, thank you!",
+    "Screenshot attached.", "The asset tag is on the back, I will check.", "Thanks for the quick help.",
+)
+INTERNAL_NOTES = (
+    "Known issue, linked to the vendor ticket.", "Escalated to second line.",
+    "Same root cause as last week's outage.", "Check licence count before approving.",
+)
+ATTACHMENT_NAMES = ("screenshot.png", "error.png", "photo.png", "scan.png")
+
+# Timing in hours (log-normal: median, spread)
+FIRST_RESPONSE_HOURS = (2.0, 1.2)
+RESOLUTION_HOURS = (30.0, 1.0)
+OPEN_HALF_LIFE_DAYS = 7  # share of tickets still open halves every week of age
+
+
+def _mix(i, salt):
+    # Bijective on 32-bit values: distinct indexes give distinct, random-looking ids
+    return (i * 2654435761 + salt) & 0xFFFFFFFF
+
+
+def _adapter():
+    # Timestamps are generated as naive UTC. On SQLite with a UTC connection
+    # str() gives exactly what adapt_datetimefield_value() would, 3x faster.
+    if connection.vendor == "sqlite" and connection.timezone_name == "UTC":
+        return str
+    adapt = connection.ops.adapt_datetimefield_value
+    return lambda value: adapt(value.replace(tzinfo=dt_timezone.utc))
+
+
+def _png(rng, size=48):
+    from PIL import Image
+
+    image = Image.new("RGB", (size, size), tuple(rng.randrange(256) for _ in range(3)))
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+class Seeder:
+    """
+    Generates departments, role users, tickets, comments and attachment rows.
+    The same `seed` gives the same data. Rows are written with executemany
+    in one transaction per batch, like tickets.importing. Signals do not
+    fire: Seeder.finish() rebuilds support load, metrics and blob counts.
+    """
+
+    def __init__(self, tickets, departments=8, employees=None, support_per_department=3, managers=2,
+                 comments=3.0, attachments=0.2, days=365, seed=0, password="helpdesk", batch_size=BATCH_SIZE):
+        self.total = tickets
+        self.department_count = departments
+        self.employee_count = employees or max(20, tickets // 50)
+        self.support_per_department = support_per_department
+        self.manager_count = managers
+        self.comments_per_ticket = comments
+        self.attachment_share = attachments
+        self.days = days
+        self.rng = random.Random(seed)
+        self.password = make_password(password)
+        self.batch_size = batch_size
+        self.tickets = self.comments = self.attachments = 0
+        self.now = timezone.now().astimezone(dt_timezone.utc).replace(tzinfo=None)
+        self.adapt = _adapter()
+        self.ticket_sql = insert_sql(Ticket, SEED_TICKET_FIELDS)
+        self.comment_sql = insert_sql(TicketComment, COMMENT_FIELDS)
+        self.attachment_sql = insert_sql(TicketAttachment, ATTACHMENT_FIELDS)
+        self.salt = self.rng.getrandbits(32)
+        self.offset = Ticket.objects.count()
+
+    # People and departments
+
+    def _users(self, prefix, count, group):
+        names = [f"{prefix}{i:06d}" for i in range(1, count + 1)]
+        existing = dict(User.objects.filter(username__startswith=prefix).values_list("username", "pk"))
+        missing = [User(username=n, password=self.password, email=f"{n}@example.com") for n in names if n not in existing]
+        User.objects.bulk_create(missing, batch_size=1000)
+        ids = dict(User.objects.filter(username__startswith=prefix).values_list("username", "pk"))
+        user_ids = [ids[n] for n in names]
+        Membership = User.groups.through
+        Membership.objects.bulk_create(
+            [Membership(user_id=pk, group_id=group.pk) for pk in user_ids], batch_size=1000, ignore_conflicts=True
+        )
+        return user_ids
+
+    def setup(self):
+        """Create (or reuse) departments, users and support profiles."""
+        groups = {g.name: g for g in Group.objects.filter(name__in=("Employee", "Support", "Manager"))}
+        if len(groups) != 3:
+            raise ValueError("Run `manage.py setup_roles` first.")
+        names = [
+            DEPARTMENTS[i] if i < len(DEPARTMENTS) else f"Department {i + 1}"
+            for i in range(self.department_count)
+        ]
+        Department.objects.bulk_create([Department(name=n) for n in names], ignore_conflicts=True)
+        self.departments = list(Department.objects.filter(name__in=names).order_by("pk").values_list("pk", flat=True))
+        # A few departments get most of the tickets
+        self.department_weights = [1 / (rank + 1) for rank in range(len(self.departments))]
+
+        self.employees = self._users("employee", self.employee_count, groups["Employee"])
+        self.managers = self._users("manager", self.manager_count, groups["Manager"])
+        support = self._users("support", self.support_per_department * len(self.departments), groups["Support"])
+        self.support = {d: support[i::len(self.departments)] for i, d in enumerate(self.departments)}
+        SupportProfile.objects.bulk_create(
+            [SupportProfile(user_id=u, department_id=d) for d, users in self.support.items() for u in users],
+            ignore_conflicts=True,
+        )
+
+        storage = attachment_storage()
+        self.blobs = [storage.save(name, ContentFile(_png(self.rng))) for name in ATTACHMENT_NAMES * 2]
+        return self
+
+    # Tickets
+
+    def _employee(self):
+        # Skewed: a small share of employees opens most tickets
+        return self.employees[int(len(self.employees) * self.rng.random() ** 3)]
+
+    def _hours(self, median_spread):
+        median, spread = median_spread
+        return timedelta(hours=self.rng.lognormvariate(math.log(median), spread))
+
+    def _subject(self):
+        templates, nouns = self.rng.choice(SUBJECTS)
+        return self.rng.choice(templates).format(self.rng.choice(nouns))
+
+    def ticket(self, index):
+        """(ticket values, comments, attachments) for ticket number `index` of the run."""
+        rng = self.rng
+        span = timedelta(days=self.days)
+        # Spread evenly over the period, oldest first, as they would have arrived
+        created_at = self.now - span + span * ((index + rng.random()) / self.total)
+        department = rng.choices(self.departments, self.department_weights)[0]
+        employee = self._employee()
+        support = self.support[department]
+        age_days = (self.now - created_at).total_seconds() / 86400
+
+        is_open = rng.random() < 0.5 ** (age_days / OPEN_HALF_LIFE_DAYS)
+        if is_open:
+            status = rng.choices(
+                (Ticket.Status.NEW, Ticket.Status.IN_PROGRESS, Ticket.Status.WAITING_EMPLOYEE), (3, 5, 2)
+            )[0]
+        else:
+            status = rng.choices((Ticket.Status.RESOLVED, Ticket.Status.CLOSED), (3, 7))[0]
+        assigned = rng.choice(support) if support and (status != Ticket.Status.NEW or rng.random() < 0.7) else None
+
+        first_response_at = resolved_at = None
+        if status != Ticket.Status.NEW and assigned:
+            first_response_at = min(created_at + self._hours(FIRST_RESPONSE_HOURS), self.now)
+        if not is_open:
+            resolved_at = min((first_response_at or created_at) + self._hours(RESOLUTION_HOURS), self.now)
+        end = resolved_at or self.now
+
+        comments = []
+        if first_response_at:
+            comments.append([assigned, rng.choice(SUPPORT_REPLIES), False, first_response_at])
+            for _ in range(min(int(rng.expovariate(1 / max(self.comments_per_ticket - 1, 0.1))), 30)):
+                when = first_response_at + (end - first_response_at) * rng.random()
+                if rng.random() < 0.5:
+                    comments.append([employee, rng.choice(EMPLOYEE_REPLIES), False, when])
+                elif rng.random() < 0.2:
+                    comments.append([assigned, rng.choice(INTERNAL_NOTES), True, when])
+                else:
+                    comments.append([assigned, rng.choice(SUPPORT_REPLIES), False, when])
+            comments.sort(key=lambda c: c[3])
+        elif rng.random() < 0.3:
+            comments.append([employee, rng.choice(EMPLOYEE_REPLIES), False, created_at + (end - created_at) * rng.random()])
+
+        attachments = []
+        if rng.random() < self.attachment_share:
+            for _ in range(rng.choice((1, 1, 1, 2, 3))):
+                attachments.append([rng.choice(self.blobs), rng.choice(ATTACHMENT_NAMES), employee, created_at])
+
+        updated_at = max([resolved_at or created_at, *(c[3] for c in comments)])
+        adapt = self.adapt
+        values = [
+            "",  # ticket_id, filled in by flush()
+            employee, department, assigned,
+            self._subject(),
+            " ".join(rng.sample(DESCRIPTION_SENTENCES, rng.randint(1, 4))),
+            status,
+            rng.choice(INTERNAL_NOTES) if rng.random() < 0.05 else "",
+            adapt(created_at), adapt(updated_at),
+            adapt(first_response_at) if first_response_at else None,
+            adapt(resolved_at) if resolved_at else None,
+        ]
+        for c in comments:
+            c[3] = adapt(c[3])
+        for a in attachments:
+            a[3] = adapt(a[3])
+        return values, comments, attachments
+
+    def _ticket_ids(self, start, count):
+        ids = [f"TCK{_mix(self.offset + start + i, self.salt):08X}" for i in range(count)]
+        taken = existing_ticket_ids(ids)
+        # Only when seeding on top of other data
+        while taken:
+            fresh = iter(generate_ticket_ids(len(taken)))
+            ids = [next(fresh) if ticket_id in taken else ticket_id for ticket_id in ids]
+            taken = existing_ticket_ids(ids)
+        return ids
+
+    def flush(self, rows):
+        for (ticket, _, _), ticket_id in zip(rows, self._ticket_ids(self.tickets, len(rows))):
+            ticket[0] = ticket_id
+        comments, attachments = [], []
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(self.ticket_sql, [t for t, _, _ in rows])
+            ids = dict(Ticket.objects.filter(ticket_id__in=[t[0] for t, _, _ in rows]).values_list("ticket_id", "pk"))
+            for ticket, ticket_comments, ticket_attachments in rows:
+                pk = ids[ticket[0]]
+                comments += [[pk, *c] for c in ticket_comments]
+                attachments += [[pk, *a] for a in ticket_attachments]
+            if comments:
+                cursor.executemany(self.comment_sql, comments)
+            if attachments:
+                cursor.executemany(self.attachment_sql, attachments)
+        self.tickets += len(rows)
+        self.comments += len(comments)
+        self.attachments += len(attachments)
+        self.blob_references.update(a[1] for a in attachments)
+
+    def run(self, progress=None):
+        self.blob_references = Counter()
+        batch = []
+        for index in range(self.total):
+            batch.append(self.ticket(index))
+            if len(batch) >= self.batch_size:
+                self.flush(batch)
+                batch = []
+                if progress:
+                    progress(self)
+        if batch:
+            self.flush(batch)
+        return self
+
+    def finish(self):
+        """Bring derived data up to date: blob references, support load and dashboard metrics."""
+        from . import assignment, metrics
+
+        add_references(self.blob_references)
+        assignment.recount_loads()
+        metrics.rebuild()
@@ -0,0 +1,157 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+
+from jobs.queue import enqueue
+from . import fragments, metrics
+from .assignment import adjust_loads, auto_assign, load_deltas, load_state
+from .blobs import release_blob, retain_blobs
+from .events import comment_event, get_broker, ticket_event
+from .models import ArchivedAttachment, Ticket, TicketAttachment, TicketComment
+
+
+# Search indexing runs in the job workers, after the request's transaction commits
+
+@receiver(post_save, sender=Ticket)
+def index_ticket(sender, instance, raw=False, **kwargs):
+    if not raw:
+        enqueue("tickets.index_ticket", {"ticket_id": instance.pk})
+
+
+@receiver(post_delete, sender=Ticket)
+def unindex_ticket(sender, instance, **kwargs):
+    enqueue("tickets.unindex_ticket", {"ticket_id": instance.pk})
+
+
+@receiver(post_save, sender=TicketComment)
+def index_comment(sender, instance, raw=False, **kwargs):
+    if not raw:
+        enqueue("tickets.index_comment", {"comment_id": instance.pk})
+
+
+@receiver(post_delete, sender=TicketComment)
+def unindex_comment(sender, instance, **kwargs):
+    enqueue("tickets.unindex_comment", {"comment_id": instance.pk})
+
+
+@receiver(post_save, sender=TicketAttachment)
+def retain_attachment_blob(sender, instance, created, raw=False, **kwargs):
+    # Views insert attachments with bulk_create and call retain_blobs themselves
+    if created and not raw:
+        retain_blobs([instance])
+
+
+@receiver(post_delete, sender=TicketAttachment)
+@receiver(post_delete, sender=ArchivedAttachment)
+def release_attachment_blob(sender, instance, **kwargs):
+    release_blob(instance.file.name)
+
+
+# Live updates: publish the delta once the change is committed and visible
+
+@receiver(post_save, sender=Ticket)
+def publish_ticket(sender, instance, raw=False, **kwargs):
+    if not raw:
+        event = ticket_event(instance)
+        transaction.on_commit(lambda: get_broker().publish(event))
+
+
+@receiver(post_save, sender=TicketComment)
+def publish_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        event = comment_event(instance, instance.ticket)
+        transaction.on_commit(lambda: get_broker().publish(event))
+
+
+# Support load counters: diff (assignee, open) between load and save
+
+@receiver(post_init, sender=Ticket)
+def remember_stored_state(sender, instance, **kwargs):
+    instance._load_state = load_state(instance)
+    instance._metrics_state = metrics.ticket_state(instance)
+
+
+@receiver(pre_save, sender=Ticket)
+def prepare_ticket_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if instance._state.adding:
+        auto_assign(instance)
+    elif instance._load_state is None or instance._metrics_state is None:
+        # Loaded with deferred fields: read what is stored now
+        stored = (
+            Ticket.objects.filter(pk=instance.pk)
+            .values("assigned_support_id", *metrics.STATE_FIELDS).first()
+        )
+        if stored:
+            stored = Ticket(**stored)
+            instance._load_state = load_state(stored)
+            instance._metrics_state = metrics.ticket_state(stored)
+    metrics.mark_resolution(instance, None if instance._state.adding else instance._metrics_state)
+
+
+@receiver(post_save, sender=Ticket)
+def update_support_load(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    state = load_state(instance)
+    adjust_loads(load_deltas(instance._load_state, state))
+    instance._load_state = state
+
+
+@receiver(post_delete, sender=Ticket)
+def release_support_load(sender, instance, **kwargs):
+    adjust_loads(load_deltas(load_state(instance), None))
+
+
+# Dashboard rollups: collect the change here, apply it in a job after commit
+
+@receiver(post_save, sender=Ticket)
+def update_ticket_metrics(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and "resolved_at" not in update_fields and "resolved_at" in instance.__dict__:
+        # Deferred or partial save: the stamp from prepare_ticket_save was not written
+        Ticket.objects.filter(pk=instance.pk).update(resolved_at=instance.resolved_at)
+    after = metrics.ticket_state(instance)
+    if after is None:  # saved with deferred fields
+        after = Ticket.objects.filter(pk=instance.pk).values_list(*metrics.STATE_FIELDS).first()
+    ops = metrics.change_ops(None if created else instance._metrics_state, after)
+    instance._metrics_state = after
+    if ops:
+        enqueue("tickets.apply_metrics", {"ops": ops})
+
+
+@receiver(post_save, sender=TicketComment)
+def record_first_response(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        ticket = instance.ticket
+        ops = metrics.first_response_ops(instance, ticket)
+        if ops:
+            ticket._metrics_state = metrics.ticket_state(ticket)
+            enqueue("tickets.apply_metrics", {"ops": ops})
+
+
+@receiver(post_delete, sender=Ticket)
+def remove_ticket_metrics(sender, instance, **kwargs):
+    state = metrics.ticket_state(instance)
+    if state is not None:
+        enqueue("tickets.apply_metrics", {"ops": metrics.change_ops(state, None)})
+
+
+# Cached page fragments: a new version of the ticket once the change commits
+
+@receiver(post_save, sender=Ticket)
+@receiver(post_delete, sender=Ticket)
+def bump_ticket_fragments(sender, instance, raw=False, **kwargs):
+    if not raw:
+        fragments.bump_on_commit(instance.pk)
+
+
+@receiver(post_save, sender=TicketComment)
+@receiver(post_delete, sender=TicketComment)
+@receiver(post_save, sender=TicketAttachment)
+@receiver(post_delete, sender=TicketAttachment)
+def bump_parent_fragments(sender, instance, raw=False, **kwargs):
+    if not raw:
+        fragments.bump_on_commit(instance.ticket_id)
@@ -0,0 +1,176 @@
+"""
+Near-duplicate tickets, by MinHash and locality-sensitive hashing.
+
+A ticket's subject and description (normalised like the search index, the
+first MAX_CHARS characters) are cut into overlapping SHINGLE-character
+pieces. Its signature holds, for each of NUM_HASHES hash functions, the
+smallest hash of any piece; two signatures agree on a position with
+probability equal to the Jaccard similarity of the two sets of pieces.
+
+The signature is split into BANDS bands of ROWS values and each band is
+hashed to a key in TicketBucket. A new ticket only compares signatures with
+tickets that share a key (one indexed lookup), instead of every open
+ticket. A ticket with similarity s shares a key with probability
+1 - (1 - s**ROWS)**BANDS: 99% at 0.7, 89% at 0.6, 12% at 0.3.
+
+Signatures are written when a ticket is created, and by the search index
+job when its text changes; `rebuild_similarity` recomputes them all.
+"""
+import hashlib
+import struct
+import zlib
+from datetime import timedelta
+from random import Random
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .assignment import OPEN_STATUSES
+from .models import Ticket, TicketBucket, TicketSignature
+from .search import tokenize
+
+SHINGLE = 5
+MAX_CHARS = 500
+BANDS = 16
+ROWS = 4
+NUM_HASHES = BANDS * ROWS
+# Candidates whose signatures are compared, most shared bands first
+MAX_CANDIDATES = 50
+
+# h(x) = (a * x + b) mod PRIME, with fixed coefficients: signatures are
+# stored, so they must not change between processes or releases
+_PRIME = (1 << 31) - 1
+_random = Random(20240611)
+_COEFFS = [(_random.randrange(1, _PRIME), _random.randrange(0, _PRIME)) for _ in range(NUM_HASHES)]
+_FORMAT = f"<{NUM_HASHES}I"
+
+
+def _text(subject, description):
+    return " ".join(tokenize(f"{subject}\n{description}"))[:MAX_CHARS]
+
+
+def signature(subject, description):
+    """MinHash signature (a tuple of NUM_HASHES ints), or None for a ticket without words."""
+    text = _text(subject, description)
+    if not text:
+        return None
+    pieces = list({
+        zlib.crc32(text[i:i + SHINGLE].encode()) % _PRIME for i in range(max(1, len(text) - SHINGLE + 1))
+    })
+    return tuple(min([(a * x + b) % _PRIME for x in pieces]) for a, b in _COEFFS)
+
+
+def band_keys(sig):
+    keys = []
+    for band in range(BANDS):
+        values = struct.pack(f"<B{ROWS}I", band, *sig[band * ROWS:(band + 1) * ROWS])
+        keys.append(int.from_bytes(hashlib.blake2b(values, digest_size=8).digest(), "little", signed=True))
+    return keys
+
+
+def similarity(a, b):
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(x == y for x, y in zip(a, b)) / NUM_HASHES
+
+
+def _pack(sig):
+    return struct.pack(_FORMAT, *sig)
+
+
+def _unpack(data):
+    return struct.unpack(_FORMAT, bytes(data))
+
+
+def index_ticket(ticket, sig=None, created=False):
+    """Store the ticket's signature and buckets (`sig` if already computed)."""
+    if sig is None:
+        sig = signature(ticket.subject, ticket.description)
+    if not created:
+        stored = TicketSignature.objects.filter(ticket_id=ticket.pk).values_list("signature", flat=True).first()
+        if (stored and _unpack(stored)) == sig:
+            return  # text unchanged, as on most saves
+        unindex_tickets([ticket.pk])
+    if sig:
+        TicketSignature.objects.create(ticket_id=ticket.pk, signature=_pack(sig))
+        TicketBucket.objects.bulk_create([TicketBucket(key=key, ticket_id=ticket.pk) for key in band_keys(sig)])
+
+
+def unindex_tickets(ticket_ids):
+    # The rows cascade with their ticket; archiving deletes tickets with raw SQL
+    TicketBucket.objects.filter(ticket_id__in=ticket_ids).delete()
+    TicketSignature.objects.filter(ticket_id__in=ticket_ids).delete()
+
+
+@transaction.atomic
+def rebuild(batch_size=2000):
+    """Recompute every ticket's signature. Returns the number of tickets indexed."""
+    TicketBucket.objects.all().delete()
+    TicketSignature.objects.all().delete()
+    count = 0
+    signatures, buckets = [], []
+    for ticket in Ticket.objects.only("pk", "subject", "description").iterator(chunk_size=batch_size):
+        sig = signature(ticket.subject, ticket.description)
+        if sig:
+            signatures.append(TicketSignature(ticket_id=ticket.pk, signature=_pack(sig)))
+            buckets += [TicketBucket(key=key, ticket_id=ticket.pk) for key in band_keys(sig)]
+        count += 1
+        if len(signatures) >= batch_size:
+            TicketSignature.objects.bulk_create(signatures)
+            TicketBucket.objects.bulk_create(buckets, batch_size=batch_size)
+            signatures, buckets = [], []
+    TicketSignature.objects.bulk_create(signatures)
+    TicketBucket.objects.bulk_create(buckets, batch_size=batch_size)
+    return count
+
+
+def candidates(sig, department_id, exclude=None):
+    """
+    Signatures of the open tickets of the department, created in the last
+    TICKET_DUPLICATE_DAYS, that share the most LSH buckets with `sig`.
+    """
+    since = timezone.now() - timedelta(days=settings.TICKET_DUPLICATE_DAYS)
+    buckets = TicketBucket.objects.filter(
+        key__in=band_keys(sig),
+        ticket__department_id=department_id,
+        ticket__status__in=OPEN_STATUSES,
+        ticket__created_at__gte=since,
+    )
+    if exclude is not None:
+        buckets = buckets.exclude(ticket_id=exclude)
+    top = buckets.values("ticket_id").annotate(bands=Count("pk")).order_by("-bands")[:MAX_CANDIDATES]
+    return TicketSignature.objects.filter(ticket_id__in=top.values("ticket_id")).values_list(
+        "ticket_id", "ticket__duplicate_of_id", "signature"
+    )
+
+
+def similar_tickets(sig, department_id, threshold, exclude=None, limit=5):
+    """
+    The candidates() at least `threshold` similar to `sig`, most similar
+    first: [(ticket id, its duplicate_of id, similarity)].
+    """
+    if not sig:
+        return []
+    matches = [
+        (pk, original, similarity(sig, _unpack(data)))
+        for pk, original, data in candidates(sig, department_id, exclude)
+    ]
+    matches = [m for m in matches if m[2] >= threshold]
+    matches.sort(key=lambda m: (-m[2], m[0]))
+    return matches[:limit]
+
+
+def likely_duplicate(ticket, sig):
+    """
+    Id of the ticket a new `ticket` most likely duplicates, or None. Chains
+    are followed one step, so an outage's tickets all point at the first.
+    """
+    threshold = getattr(settings, "TICKET_DUPLICATE_THRESHOLD", None)
+    if threshold is None:
+        return None
+    matches = similar_tickets(sig, ticket.department_id, threshold, exclude=ticket.pk, limit=1)
+    if not matches:
+        return None
+    pk, original, _ = matches[0]
+    return original or pk
@@ -0,0 +1,59 @@
+import hashlib
+import os
+import re
+
+from django.core.files.storage import FileSystemStorage, storages
+
+BLOB_NAME_RE = re.compile(r"^blobs/[0-9a-f]{2}/[0-9a-f]{2}/(?P<digest>[0-9a-f]{64})")
+
+
+def blob_name(digest, filename):
+    _, ext = os.path.splitext(filename)
+    return f"blobs/{digest[:2]}/{digest[2:4]}/{digest}{ext.lower()}"
+
+
+def blob_digest(name):
+    # sha256 of a content-addressed file name, None for legacy per-ticket paths
+    match = BLOB_NAME_RE.match(name or "")
+    return match.group("digest") if match else None
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores every file under blobs/<aa>/<bb>/<sha256><ext>, ignoring the
+    name produced by upload_to. Saving content that is already stored is a
+    no-op that returns the existing name, so identical uploads share one
+    file on disk. Reference counts and cleanup live in tickets.blobs; every
+    save reserves its blob there first.
+    """
+
+    def __init__(self, *args, allow_overwrite=True, **kwargs):
+        # Two requests racing to store the same digest write identical bytes,
+        # so letting the second rename win is safe
+        super().__init__(*args, allow_overwrite=allow_overwrite, **kwargs)
+
+    def _save(self, name, content):
+        from .blobs import reserve_blob  # blobs imports this module
+
+        digest = getattr(content, "sha256", None) or self._hash(content)
+        name = blob_name(digest, name)
+        # Before the existence check, so a file being collected is written again
+        reserve_blob(name)
+        if os.path.exists(self.path(name)):
+            return name
+        return super()._save(name, content)
+
+    @staticmethod
+    def _hash(content):
+        hasher = hashlib.sha256()
+        if hasattr(content, "seek"):
+            content.seek(0)
+        for chunk in content.chunks():
+            hasher.update(chunk)
+        if hasattr(content, "seek"):
+            content.seek(0)
+        return hasher.hexdigest()
+
+
+def attachment_storage():
+    return storages["attachments"]
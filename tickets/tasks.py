@@ -0,0 +1,60 @@
+from django.contrib.auth.models import User
+
+from jobs.queue import task
+from . import fragments, metrics, previews, search, similarity
+from .blobs import retain_blobs
+from .models import Ticket, TicketAttachment, TicketComment
+
+
+@task("tickets.index_ticket")
+def index_ticket(ticket_id):
+    ticket = Ticket.objects.filter(pk=ticket_id).only("pk", "subject", "description").first()
+    if ticket:  # deleted before the job ran
+        search.index_ticket(ticket)
+        similarity.index_ticket(ticket)
+
+
+@task("tickets.unindex_ticket")
+def unindex_ticket(ticket_id):
+    search.unindex_ticket(ticket_id)
+
+
+@task("tickets.index_comment")
+def index_comment(comment_id):
+    comment = TicketComment.objects.filter(pk=comment_id).only("pk", "ticket_id", "message", "is_internal").first()
+    if comment:
+        search.index_comment(comment)
+
+
+@task("tickets.index_comments")
+def index_comments(comment_ids):
+    # One job for comments inserted in bulk (no post_save)
+    for comment in TicketComment.objects.filter(pk__in=comment_ids).only("pk", "ticket_id", "message", "is_internal"):
+        search.index_comment(comment, created=True)
+
+
+@task("tickets.unindex_comment")
+def unindex_comment(comment_id):
+    search.unindex_comment(comment_id)
+
+
+@task("tickets.copy_attachments")
+def copy_attachments(source_id, target_id, user_id=None):
+    # Content-addressed storage: copying is new rows + references, no file I/O
+    user = User.objects.filter(pk=user_id).first()
+    attachments = TicketAttachment.objects.bulk_create([
+        TicketAttachment(ticket_id=target_id, file=att.file.name, original_name=att.original_name, uploaded_by=user)
+        for att in TicketAttachment.objects.filter(ticket_id=source_id)
+    ])
+    retain_blobs(attachments)
+    fragments.bump(target_id)
+
+
+@task("tickets.generate_previews")
+def generate_previews(ticket_id):
+    previews.ensure_previews(TicketAttachment.objects.filter(ticket_id=ticket_id))
+
+
+@task("tickets.apply_metrics")
+def apply_metrics(ops):
+    metrics.apply_ops(ops)
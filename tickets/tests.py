@@ -1,3 +1,840 @@
-from django.test import TestCase
+import base64
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache, caches
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from helpdesk_support.routers import PIN_COOKIE, REPLICA, replica_configured
+from jobs.models import Job
+from jobs.queue import claim, run as run_job
+
+from .models import (
+    ArchivedAttachment, ArchivedTicket, AttachmentBlob, DailyTicketStats, Department, DepartmentBacklog,
+    DurationBucket, SupportProfile, Ticket, TicketAttachment, TicketBucket, TicketComment, TicketSignature,
+)
+from . import (
+    archive, assignment, benchmark, blobs, export, metrics, queryplans, search, similarity, urls as ticket_urls, views,
+)
+from .bulk import ASSIGN, CLOSE, apply_bulk_action
+from .events import get_broker, ticket_event
+from .pagination import keyset_paginate
+from .storage import attachment_storage
+
+# Max queries per URL name in tickets/urls.py, independent of how many rows exist.
+# Every request pays 2 for session + user; role checks add 1; each saved
+# ticket or comment adds 1 search-index job, plus 1 metrics job when it changes
+# the rollups; auto-assigning a new ticket adds 2 (pick + claim); bulk actions
+# add 1 load update per affected support user; archived tickets cost 1 more
+# to open (the live table is tried first). The detail page and the lists run
+# a conditional GET precheck first: 1 query per list on the page (2 for
+# archived tickets), plus the role lookup its ETag includes.
+QUERY_BUDGETS = {
+    "employee_ticket_list": 5,
+    "ticket_create": 3,
+    "manager_ticket_list": 7,
+    "manager_ticket_assign": 5,
+    "manager_ticket_duplicate": 12,
+    "support_ticket_list": 8,
+    "ticket_detail": 9,
+    "ticket_add_comment": 6,
+    "ticket_search": 5,
+    "attachment_preview": 6,
+    "ticket_events": 4,
+    "manager_ticket_export": 6,
+    "manager_ticket_bulk": 16,
+    "manager_dashboard": 8,
+}
+
+
+# Versioned fragments are only cached in a cache shared by all processes
+SHARED_FRAGMENT_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "template_fragments": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": tempfile.mkdtemp(prefix="helpdesk-test-fragments-"),
+    },
+}
+
+
+# Budgets are counted on the primary's connection
+@override_settings(ROLE_CACHE_TIMEOUT=0, REPLICA_READS=False, CACHES=SHARED_FRAGMENT_CACHES)
+class QueryBudgetTests(TestCase):
+    ROWS = 20
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command("setup_roles", stdout=StringIO())
+        cls.dept = Department.objects.create(name="IT")
+        cls.manager = cls._user("manager", "Manager")
+        cls.support = cls._user("support", "Support")
+        cls.employee = cls._user("employee", "Employee")
+        SupportProfile.objects.create(user=cls.support, department=cls.dept)
+
+        # Keep every other ticket unassigned for the support list's second query
+        with override_settings(TICKET_AUTO_ASSIGN=None):
+            cls._create_tickets()
+
+    @classmethod
+    def _create_tickets(cls):
+        for i in range(cls.ROWS):
+            ticket = Ticket.objects.create(
+                employee=cls.employee,
+                department=cls.dept,
+                assigned_support=cls.support if i % 2 else None,
+                subject=f"Ticket {i}",
+                description="Printer is on fire",
+            )
+            for j in range(3):
+                TicketComment.objects.create(ticket=ticket, author=cls.support, message=f"Comment {j}")
+                TicketAttachment.objects.create(ticket=ticket, file=f"tickets/{ticket.ticket_id}/{j}.png")
+        cls.ticket = ticket
+
+    @staticmethod
+    def _user(username, role):
+        user = User.objects.create_user(username=username, password="pw")
+        user.groups.add(Group.objects.get(name=role))
+        return user
+
+    def setUp(self):
+        cache.clear()
+        caches["template_fragments"].clear()
+
+    def assertWithinBudget(self, name, user, url, method="get", data=None, status=(200, 302), consume=False):
+        self.client.force_login(user)
+        # Jobs are enqueued on commit; count those inserts too
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            response = getattr(self.client, method)(url, data or {})
+            if consume:
+                b"".join(response.streaming_content)
+        self.assertIn(response.status_code, status)
+        self.assertLessEqual(
+            len(ctx), QUERY_BUDGETS[name],
+            f"{name} ran {len(ctx)} queries:\n" + "\n".join(q["sql"] for q in ctx.captured_queries),
+        )
+
+    def test_every_url_has_a_budget(self):
+        names = {p.name for p in ticket_urls.urlpatterns}
+        self.assertEqual(names - set(QUERY_BUDGETS), set())
+
+    def test_every_url_has_a_benchmark_case(self):
+        names = {p.name for p in ticket_urls.urlpatterns}
+        self.assertEqual(names - set(benchmark.CASES), set())
+
+    def test_benchmark_runs_every_case(self):
+        results = benchmark.run_client(benchmark.Fixtures(), requests=1, warmup=0)
+        self.assertEqual({name for name, r in results.items() if r["errors"]}, set())
+
+    def test_hot_queries_use_indexes(self):
+        scans = {name: tables for name, plan, tables, sorts in queryplans.run() if tables}
+        self.assertEqual(scans, {})
+
+    def test_employee_ticket_list(self):
+        self.assertWithinBudget("employee_ticket_list", self.employee, reverse("employee_ticket_list"))
+
+    def test_ticket_create(self):
+        self.assertWithinBudget("ticket_create", self.employee, reverse("ticket_create"))
+
+    def test_manager_ticket_list(self):
+        self.assertWithinBudget("manager_ticket_list", self.manager, reverse("manager_ticket_list"))
+
+    def test_manager_ticket_assign(self):
+        url = reverse("manager_ticket_assign", args=[self.ticket.pk])
+        self.assertWithinBudget("manager_ticket_assign", self.manager, url)
+
+    def test_manager_ticket_duplicate(self):
+        url = reverse("manager_ticket_duplicate", args=[self.ticket.pk])
+        self.assertWithinBudget("manager_ticket_duplicate", self.manager, url)
+
+    def test_support_ticket_list(self):
+        self.assertWithinBudget("support_ticket_list", self.support, reverse("support_ticket_list"))
+
+    def test_ticket_detail(self):
+        url = reverse("ticket_detail", args=[self.ticket.pk])
+        for user in (self.manager, self.support, self.employee):
+            self.assertWithinBudget("ticket_detail", user, url)
+
+    def test_archived_ticket_detail(self):
+        ticket = Ticket.objects.order_by("pk").first()
+        Ticket.objects.filter(pk=ticket.pk).update(
+            status=Ticket.Status.CLOSED, updated_at=timezone.now() - timedelta(days=400),
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            moved = archive.archive(timezone.now() - timedelta(days=365))
+        self.assertEqual(moved, (1, 3, 3))
+        self.assertFalse(Ticket.objects.filter(pk=ticket.pk).exists())
+
+        url = reverse("ticket_detail", args=[ticket.pk])
+        for user in (self.manager, self.support, self.employee):
+            self.assertWithinBudget("ticket_detail", user, url)
+        self.assertContains(self.client.get(url), "Archived")
+        preview = reverse("attachment_preview", args=[ArchivedAttachment.objects.filter(ticket_id=ticket.pk)[0].pk])
+        self.assertWithinBudget("attachment_preview", self.employee, preview, status=(404,))
+
+    def test_ticket_detail_fragment_cache(self):
+        TicketComment.objects.create(ticket=self.ticket, author=self.support, message="Staff only", is_internal=True)
+        url = reverse("ticket_detail", args=[self.ticket.pk])
+        self.client.force_login(self.support)
+        self.assertContains(self.client.get(url), "Staff only")
+        self.client.force_login(self.employee)
+        self.assertNotContains(self.client.get(url), "Staff only")
+        # Repeat view: session, user, roles, precheck and the ticket row; the rest is cached
+        with self.assertNumQueries(5):
+            self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("ticket_add_comment", args=[self.ticket.pk]), {"message": "Any news?"})
+        self.assertContains(self.client.get(url), "Any news?")
+
+    def test_per_process_fragment_cache_is_not_used(self):
+        # A bump from a job worker or another web process would never reach this one
+        url = reverse("ticket_detail", args=[self.ticket.pk])
+        self.client.force_login(self.employee)
+        with self.settings(CACHES={
+            "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+            "template_fragments": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+        }):
+            self.client.get(url)
+            # Written without signals, as if by another process
+            TicketComment.objects.bulk_create([TicketComment(ticket=self.ticket, author=self.support, message="Done")])
+            self.assertContains(self.client.get(url), "Done")
+
+    def test_conditional_get(self):
+        self.client.force_login(self.support)
+        # Session, user, roles and the precheck (one query per list on the page)
+        pages = [(reverse("ticket_detail", args=[self.ticket.pk]), 4), (reverse("support_ticket_list"), 5)]
+        for url, queries in pages:
+            self.client.get(url)  # sets the CSRF cookie, which the ETag covers
+            etag = self.client.get(url)["ETag"]
+            with self.assertNumQueries(queries):
+                response = self.client.get(url, headers={"if-none-match": etag})
+            self.assertEqual(response.status_code, 304)
+            self.assertIn("no-cache", response["Cache-Control"])
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse("ticket_add_comment", args=[self.ticket.pk]), {"message": "On it"})
+                self.ticket.refresh_from_db()
+                self.ticket.save()
+            self.assertEqual(self.client.get(url, headers={"if-none-match": etag}).status_code, 200)
+        # Another user never matches
+        url = pages[0][0]
+        etag = self.client.get(url)["ETag"]
+        self.client.force_login(self.manager)
+        self.assertEqual(self.client.get(url, headers={"if-none-match": etag}).status_code, 200)
+
+    def test_conditional_headers_do_not_bypass_access(self):
+        # The precheck must not answer 304 (or anything) for pages the user cannot open
+        outsider = self._user("outsider", "Employee")
+        self.client.force_login(outsider)
+        archived = Ticket.objects.create(employee=self.employee, department=self.dept, subject="Old")
+        Ticket.objects.filter(pk=archived.pk).update(
+            status=Ticket.Status.CLOSED, updated_at=timezone.now() - timedelta(days=400),
+        )
+        archive.archive(timezone.now() - timedelta(days=365))
+        urls = [
+            reverse("ticket_detail", args=[self.ticket.pk]),
+            reverse("ticket_detail", args=[archived.pk]),
+            reverse("manager_ticket_list"),
+            reverse("support_ticket_list"),
+        ]
+        conditions = [
+            {}, {"if-modified-since": "Fri, 01 Jan 2100 00:00:00 GMT"},
+            {"if-modified-since": "Sat, 01 Jan 2000 00:00:00 GMT"}, {"if-none-match": "*"},
+        ]
+        for url in urls:
+            for headers in conditions:
+                with self.subTest(url=url, headers=headers):
+                    response = self.client.get(url, headers=headers)
+                    self.assertEqual(response.status_code, 403)
+                    self.assertNotIn("ETag", response)
+                    self.assertNotIn("Last-Modified", response)
+
+    def test_list_rows_follow_ticket_changes(self):
+        url = reverse("employee_ticket_list")
+        self.client.force_login(self.employee)
+        self.assertNotContains(self.client.get(url), "Waiting for Employee")
+        self.ticket.status = Ticket.Status.WAITING_EMPLOYEE
+        self.ticket.save()
+        self.assertContains(self.client.get(url), "Waiting for Employee")
+
+    def test_ticket_add_comment(self):
+        url = reverse("ticket_add_comment", args=[self.ticket.pk])
+        self.assertWithinBudget("ticket_add_comment", self.employee, url, "post", {"message": "Any update?"})
+
+    def test_ticket_search(self):
+        url = reverse("ticket_search")
+        for user in (self.manager, self.support, self.employee):
+            self.assertWithinBudget("ticket_search", user, url, data={"q": "printer fire"})
+
+    def test_attachment_preview(self):
+        # Fixture attachments have no file on disk, so this measures the access check + 404
+        url = reverse("attachment_preview", args=[self.ticket.attachments.first().pk])
+        self.assertWithinBudget("attachment_preview", self.employee, url, status=(404,))
+
+    def test_ticket_events(self):
+        # Only the work done before streaming starts (ASGI); the stream itself is never consumed
+        for user in (self.manager, self.support, self.employee):
+            self.async_client.force_login(user)
+            with CaptureQueriesContext(connection) as ctx:
+                response = async_to_sync(self.async_client.get)(reverse("ticket_events"))
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(ctx), QUERY_BUDGETS["ticket_events"])
+
+    async def test_ticket_events_stream(self):
+        await self.async_client.aforce_login(self.employee)
+        with mock.patch.object(views, "EVENT_HEARTBEAT", 0.01):
+            response = await self.async_client.get(reverse("ticket_events"), {"ticket": self.ticket.pk})
+            stream = aiter(response.streaming_content)
+            self.assertEqual(await anext(stream), b"retry: 5000\n\n")
+            self.assertEqual(await anext(stream), b": ping\n\n")
+            ticket = await Ticket.objects.select_related("assigned_support").aget(pk=self.ticket.pk)
+            get_broker().publish(ticket_event(ticket))
+            chunk = await anext(stream)
+            while chunk == b": ping\n\n":
+                chunk = await anext(stream)
+            await stream.aclose()
+        self.assertIn(b"event: ticket\n", chunk)
+        self.assertIn(f'"ticket_id": "{self.ticket.ticket_id}"'.encode(), chunk)
+
+    def test_ticket_events_need_asgi(self):
+        # Under WSGI the page has no EventSource and the stream is refused
+        self.client.force_login(self.employee)
+        self.assertEqual(self.client.get(reverse("ticket_events")).status_code, 501)
+        self.assertNotContains(self.client.get(reverse("employee_ticket_list")), "EventSource")
+
+    def test_manager_ticket_export(self):
+        # Whole stream consumed: one query per chunk per prefetch, not per ticket
+        url = reverse("manager_ticket_export")
+        for fmt in ("csv", "jsonl"):
+            self.assertWithinBudget("manager_ticket_export", self.manager, url, data={"format": fmt}, consume=True)
+
+    def test_manager_ticket_export_under_asgi(self):
+        # Same file, sent as an async iterator instead of buffered by Django
+        url = reverse("manager_ticket_export")
+        self.client.force_login(self.manager)
+        self.async_client.force_login(self.manager)
+
+        async def download():
+            response = await self.async_client.get(url, {"format": "jsonl"})
+            self.assertTrue(response.is_async)
+            return b"".join([chunk async for chunk in response.streaming_content])
+
+        expected = b"".join(self.client.get(url, {"format": "jsonl"}).streaming_content)
+        self.assertEqual(expected.count(b"\n"), self.ROWS)
+        self.assertEqual(async_to_sync(download)(), expected)
+
+    def test_export_rejects_invalid_dates(self):
+        url = reverse("manager_ticket_export")
+        self.client.force_login(self.manager)
+        for value in ("yesterday", "2024-13-45"):
+            response = self.client.get(url, {"from": value})
+            self.assertEqual(response.status_code, 400)
+            self.assertContains(response, "from must be a date", status_code=400)
+            with self.assertRaisesMessage(CommandError, "to must be a date"):
+                call_command("export_tickets", "--to", value, stdout=StringIO())
+
+    async def test_export_astream_reads_a_batch_at_a_time(self):
+        produced = []
+
+        def lines():
+            for i in range(5):
+                produced.append(i)
+                yield f"{i}\n"
+
+        stream = export.astream(lines(), batch=2)
+        self.assertEqual(await anext(stream), "0\n1\n")
+        self.assertEqual(produced, [0, 1])
+        self.assertEqual([chunk async for chunk in stream], ["2\n3\n", "4\n"])
+
+    def test_manager_ticket_bulk(self):
+        # Fixed cost for all 20 tickets: id select, one UPDATE, one comment INSERT, index and metrics jobs
+        url = reverse("manager_ticket_bulk")
+        self.assertWithinBudget("manager_ticket_bulk", self.manager, url, "post", {
+            "action": "assign", "support": self.support.pk, "filter_department": self.dept.pk,
+        })
+        self.assertEqual(Ticket.objects.filter(assigned_support=self.support).count(), self.ROWS)
+        self.assertEqual(TicketComment.objects.filter(is_internal=True).count(), self.ROWS)
+
+    def test_manager_dashboard(self):
+        # Reads the rollups, so the count does not depend on ROWS
+        self.assertWithinBudget("manager_dashboard", self.manager, reverse("manager_dashboard"))
+
+
+@override_settings(TICKET_AUTO_ASSIGN="least_loaded")
+class AssignmentTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command("setup_roles", stdout=StringIO())
+        cls.dept = Department.objects.create(name="IT")
+        cls.employee = QueryBudgetTests._user("employee", "Employee")
+        cls.manager = QueryBudgetTests._user("manager", "Manager")
+        cls.busy = QueryBudgetTests._user("busy", "Support")
+        cls.idle = QueryBudgetTests._user("idle", "Support")
+        # Moved out of support; the profile is left behind
+        cls.former = QueryBudgetTests._user("former", "Employee")
+        for user in (cls.busy, cls.idle, cls.former):
+            SupportProfile.objects.create(user=user, department=cls.dept)
+
+    def create(self, **fields):
+        return Ticket.objects.create(
+            employee=self.employee, department=self.dept, subject="VPN", description="Down", **fields
+        )
+
+    def loads(self):
+        return dict(SupportProfile.objects.values_list("user__username", "open_tickets"))
+
+    def test_least_loaded_support_user_gets_the_ticket(self):
+        SupportProfile.objects.filter(user=self.busy).update(open_tickets=3)
+        tickets = [self.create() for _ in range(4)]
+        # Level at 3, the tie goes to whoever was assigned longest ago
+        self.assertEqual([t.assigned_support_id for t in tickets], [self.idle.pk] * 3 + [self.busy.pk])
+        self.assertEqual(self.loads(), {"busy": 4, "idle": 3, "former": 0})
+
+    def test_load_counters_follow_tickets(self):
+        first, second, third = self.create(), self.create(), self.create(status=Ticket.Status.CLOSED)
+        self.assertEqual(self.loads(), {"busy": 1, "idle": 1, "former": 0})
+
+        first.status = Ticket.Status.RESOLVED
+        first.save()
+        second.assigned_support = first.assigned_support
+        second.save()
+        third.status = Ticket.Status.IN_PROGRESS
+        third.save()
+        Ticket.objects.get(pk=first.pk).delete()
+        apply_bulk_action(Ticket.objects.filter(pk=third.pk), ASSIGN, self.manager, support=self.idle)
+        self.assertEqual(self.loads(), {"busy": 1, "idle": 1, "former": 0})
+
+        # The counters match a recount from the tickets table
+        self.assertEqual(assignment.recount_loads(), 3)
+        self.assertEqual(self.loads(), {"busy": 1, "idle": 1, "former": 0})
+
+
+@override_settings(JOBS_EAGER=True, TICKET_AUTO_ASSIGN=None)
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command("setup_roles", stdout=StringIO())
+        cls.employee = QueryBudgetTests._user("employee", "Employee")
+        cls.support = QueryBudgetTests._user("support", "Support")
+        cls.dept = Department.objects.create(name="IT")
+        SupportProfile.objects.create(user=cls.support, department=cls.dept)
+
+    def setUp(self):
+        # Index on commit, as the jobs would
+        with self.captureOnCommitCallbacks(execute=True):
+            self.printer = Ticket.objects.create(
+                employee=self.employee, department=self.dept, assigned_support=self.support,
+                subject="Printer jam", description="Paper stuck on floor 2.",
+            )
+            Ticket.objects.create(employee=self.employee, department=self.dept, subject="VPN down")
+            TicketComment.objects.create(ticket=self.printer, author=self.support, message="Toner replaced.")
+            TicketComment.objects.create(
+                ticket=self.printer, author=self.support, message="Vendor invoice pending.", is_internal=True,
+            )
+
+    def found(self, user, query):
+        self.client.force_login(user)
+        response = self.client.get(reverse("ticket_search"), {"q": query})
+        return [t.pk for t in response.context["tickets"]]
+
+    def check_backend(self):
+        for query in ("printer", "PAPER", "toner", "print", "jam toner"):
+            with self.subTest(query=query):
+                self.assertEqual(self.found(self.employee, query), [self.printer.pk])
+        self.assertEqual(self.found(self.employee, "printer vpn"), [])
+        # Internal comments are for staff only
+        self.assertEqual(self.found(self.employee, "vendor"), [])
+        self.assertEqual(self.found(self.employee, "toner invoice"), [])
+        self.assertEqual(self.found(self.support, "vendor"), [self.printer.pk])
+
+    def test_fts5_backend(self):
+        if "tickets_search_fts" not in connection.introspection.table_names():
+            self.skipTest("SQLite without FTS5")
+        with mock.patch.object(search, "_backend", "fts5"):
+            search.rebuild()
+            self.check_backend()
+
+    def test_python_backend(self):
+        with mock.patch.object(search, "_backend", "python"):
+            search.rebuild()
+            self.check_backend()
+
+
+@override_settings(TICKET_AUTO_ASSIGN=None, REPLICA_READS=False)
+class PaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command("setup_roles", stdout=StringIO())
+        cls.employee = QueryBudgetTests._user("employee", "Employee")
+        dept = Department.objects.create(name="IT")
+        tickets = Ticket.objects.bulk_create([
+            Ticket(ticket_id=f"TCK{i:08X}", employee=cls.employee, department=dept, subject=f"#{i}")
+            for i in range(10)
+        ])
+        # Three timestamps for ten tickets: every page boundary falls inside a tie
+        now = timezone.now()
+        for i, ticket in enumerate(tickets):
+            Ticket.objects.filter(pk=ticket.pk).update(created_at=now - timedelta(hours=i // 4))
+        cls.newest_first = list(Ticket.objects.order_by("-created_at", "-id").values_list("pk", flat=True))
+
+    def page(self, **params):
+        request = RequestFactory().get("/", params)
+        return keyset_paginate(Ticket.objects.all(), request, per_page=4)
+
+    def test_cursors_across_ties(self):
+        pages = [self.page()]
+        while pages[-1].has_next:
+            pages.append(self.page(after=pages[-1].next_cursor))
+        self.assertEqual([t.pk for page in pages for t in page], self.newest_first)
+
+        back = [pages[-1]]
+        while back[-1].has_previous:
+            back.append(self.page(before=back[-1].prev_cursor))
+        self.assertEqual([[t.pk for t in page] for page in reversed(back)], [[t.pk for t in page] for page in pages])
+
+    def test_tampered_cursor_serves_the_first_page(self):
+        def token(raw):
+            return base64.urlsafe_b64encode(raw.encode()).decode()
+
+        self.client.force_login(self.employee)
+        url = reverse("employee_ticket_list")
+        first = [t.pk for t in self.client.get(url).context["tickets"]]
+        for cursor in ("not-a-cursor", "%%%", token("x|y"), token("a|b|c"),
+                       token(f"{timezone.now().isoformat()}|{2 ** 70}"), token("2024-01-01T00:00:00|5")):
+            for param in ("after", "before"):
+                with self.subTest(cursor=cursor, param=param):
+                    response = self.client.get(url, {param: cursor})
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual([t.pk for t in response.context["tickets"]], first)
+
+
+@override_settings(TICKET_AUTO_ASSIGN=None)
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command("setup_roles", stdout=StringIO())
+        cls.it, cls.hr = Department.objects.create(name="IT"), Department.objects.create(name="HR")
+        cls.employee = QueryBudgetTests._user("employee", "Employee")
+        cls.support = QueryBudgetTests._user("support", "Support")
+        cls.manager = QueryBudgetTests._user("manager", "Manager")
+
+    def create(self, department=None):
+        return Ticket.objects.create(
+            employee=self.employee, department=department or self.it, subject="VPN", description="Down",
+        )
+
+    def comment(self, ticket, author, is_internal=False):
+        TicketComment.objects.create(ticket=ticket, author=author, message="On it", is_internal=is_internal)
+
+    def rollups(self):
+        return (
+            set(DepartmentBacklog.objects.exclude(count=0).values_list("department_id", "status", "count")),
+            set(DailyTicketStats.objects.exclude(created=0, first_responses=0, resolved=0).values_list(
+                "department_id", "day", "created", "first_responses", "resolved",
+            )),
+            set(DurationBucket.objects.exclude(count=0).values_list(
+                "department_id", "day", "metric", "bucket", "count",
+            )),
+        )
+
+    def test_incremental_rollups_match_rebuild(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first, second, third, fourth = self.create(), self.create(), self.create(), self.create(self.hr)
+            old = self.create(self.hr)
+            self.comment(first, self.support)
+            self.comment(first, self.support)  # not the first response any more
+            self.comment(second, self.employee)
+            self.comment(third, self.support, is_internal=True)
+            first.status = Ticket.Status.RESOLVED
+            first.save()
+            second.department = self.hr
+            second.status = Ticket.Status.WAITING_EMPLOYEE
+            second.save()
+            apply_bulk_action(Ticket.objects.filter(pk__in=[third.pk, old.pk]), CLOSE, self.manager)
+            fourth.delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            first.status = Ticket.Status.IN_PROGRESS  # reopened
+            first.save()
+            Ticket.objects.filter(pk=old.pk).update(updated_at=timezone.now() - timedelta(days=400))
+            archive.archive(timezone.now() - timedelta(days=365))
+        self.assertTrue(ArchivedTicket.objects.filter(pk=old.pk).exists())
+        while jobs := claim(limit=100):
+            for job in jobs:
+                run_job(job)
+        self.assertFalse(Job.objects.exclude(status=Job.Status.DONE).exists())
+
+        incremental = self.rollups()
+        self.assertTrue(all(incremental))
+        metrics.rebuild()
+        self.assertEqual(self.rollups(), incremental)
+
+
+@override_settings(TICKET_AUTO_ASSIGN=None)
+class DuplicateTicketTests(TestCase):
+    OUTAGE = "The VPN is down, I cannot connect to the office network from home since this morning."
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command("setup_roles", stdout=StringIO())
+        cls.it, cls.hr = Department.objects.create(name="IT"), Department.objects.create(name="HR")
+        cls.employee = QueryBudgetTests._user("employee", "Employee")
+        cls.manager = QueryBudgetTests._user("manager", "Manager")
+
+    def create(self, subject, description, department=None):
+        self.client.force_login(self.employee)
+        self.client.post(reverse("ticket_create"), {
+            "department": (department or self.it).pk, "subject": subject, "description": description,
+        })
+        return Ticket.objects.latest("pk")
+
+    def test_similar_tickets_are_linked_to_the_first(self):
+        first = self.create("VPN down", self.OUTAGE)
+        self.assertIsNone(first.duplicate_of_id)
+        second = self.create("VPN is down", self.OUTAGE.replace("this morning", "8am"))
+        third = self.create("vpn down!!", self.OUTAGE.lower())
+        self.assertEqual((second.duplicate_of_id, third.duplicate_of_id), (first.pk, first.pk))
+        self.assertIsNone(self.create("Printer jam", "The printer on floor 2 eats every page.").duplicate_of_id)
+        self.assertIsNone(self.create("VPN down", self.OUTAGE, self.hr).duplicate_of_id)
+
+        # Closed tickets are not matched
+        Ticket.objects.filter(pk__in=[first.pk, second.pk, third.pk]).update(status=Ticket.Status.CLOSED)
+        self.assertIsNone(self.create("VPN down", self.OUTAGE).duplicate_of_id)
+
+        self.client.force_login(self.manager)
+        response = self.client.get(reverse("manager_ticket_list"), {"duplicates_of": first.pk})
+        self.assertEqual([t.pk for t in response.context["tickets"]], [third.pk, second.pk])
+        self.assertContains(self.client.get(reverse("ticket_detail", args=[second.pk])), first.ticket_id)
+
+    def test_signatures_follow_the_ticket(self):
+        ticket = self.create("VPN down", self.OUTAGE)
+        self.assertEqual(TicketBucket.objects.filter(ticket=ticket).count(), similarity.BANDS)
+        ticket.description = "Something else entirely."
+        ticket.save()
+        similarity.index_ticket(ticket)
+        self.assertIsNone(self.create("VPN down", self.OUTAGE).duplicate_of_id)
+
+        Ticket.objects.filter(pk=ticket.pk).update(
+            status=Ticket.Status.CLOSED, updated_at=timezone.now() - timedelta(days=400),
+        )
+        archive.archive(timezone.now() - timedelta(days=365))
+        self.assertFalse(TicketSignature.objects.filter(ticket_id=ticket.pk).exists())
+        self.assertEqual(similarity.rebuild(), 1)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(prefix="helpdesk-test-media-"))
+class BlobTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        employee = User.objects.create_user(username="employee")
+        cls.ticket = Ticket.objects.create(
+            employee=employee, department=Department.objects.create(name="IT"), subject="VPN", description="Down",
+        )
+
+    def attach(self, data=b"screenshot"):
+        return TicketAttachment.objects.create(ticket=self.ticket, file=ContentFile(data, name="shot.png"))
+
+    def refs(self, name):
+        return AttachmentBlob.objects.get(name=name).ref_count
+
+    def age(self, name, days=1):
+        AttachmentBlob.objects.filter(name=name).update(updated_at=timezone.now() - timedelta(days=days))
+
+    def test_references_follow_attachments(self):
+        first, second = self.attach(), self.attach()
+        name = first.file.name
+        self.assertEqual(second.file.name, name)
+        self.assertEqual(self.refs(name), 2)
+        blobs.add_references({name: 3})
+        self.assertEqual(self.refs(name), 5)
+        second.delete()
+        self.assertEqual(self.refs(name), 4)
+        blobs.release_blob("tickets/legacy/name.png")  # not content-addressed: ignored
+        self.assertEqual(blobs.recount_blobs(), 1)
+        self.assertEqual(self.refs(name), 1)
+
+    def test_garbage_collection(self):
+        kept, dropped, recent = self.attach(b"kept"), self.attach(b"dropped"), self.attach(b"recent")
+        dropped.delete()
+        recent.delete()
+        self.age(kept.file.name)
+        self.age(dropped.file.name)
+        storage = attachment_storage()
+        self.assertEqual(blobs.collect_garbage(timezone.now() - timedelta(hours=1)), [dropped.file.name])
+        self.assertFalse(storage.exists(dropped.file.name))
+        self.assertTrue(storage.exists(kept.file.name))
+        self.assertTrue(storage.exists(recent.file.name))
+        self.assertFalse(AttachmentBlob.objects.filter(name=dropped.file.name).exists())
+
+    def test_upload_of_collectable_content_keeps_the_file(self):
+        # An upload that reuses a stored file reserves its blob before its
+        # attachment row adds the reference; collection must leave it alone
+        old = self.attach()
+        name = old.file.name
+        old.delete()
+        self.age(name)
+        self.assertEqual(attachment_storage().save("again.png", ContentFile(b"screenshot")), name)
+        self.assertEqual(blobs.collect_garbage(timezone.now() - timedelta(hours=1)), [])
+        self.assertTrue(attachment_storage().exists(name))
+
+        # Once collected, the same content is written to disk again
+        self.age(name)
+        self.assertEqual(blobs.collect_garbage(timezone.now() - timedelta(hours=1)), [name])
+        self.assertEqual(self.attach().file.name, name)
+        self.assertTrue(attachment_storage().exists(name))
+        self.assertEqual(self.refs(name), 1)
+
+
+STAGING_DIR = tempfile.mkdtemp(prefix="helpdesk-test-staging-")
+PNG = b"\x89PNG\r\n\x1a\n" + b"\0" * 100
+
+
+@override_settings(
+    MEDIA_ROOT=tempfile.mkdtemp(prefix="helpdesk-test-media-"), ATTACHMENT_STAGING_DIR=STAGING_DIR,
+    TICKET_AUTO_ASSIGN=None,
+)
+class UploadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command("setup_roles", stdout=StringIO())
+        cls.dept = Department.objects.create(name="IT")
+        cls.employee = QueryBudgetTests._user("employee", "Employee")
+
+    def upload(self, name, data):
+        self.client.force_login(self.employee)
+        return self.client.post(reverse("ticket_create"), {
+            "department": self.dept.pk, "subject": "Printer jam", "description": "See attached.",
+            "attachments": SimpleUploadedFile(name, data),
+        })
+
+    def assertRejected(self, name, data, error):
+        response = self.upload(name, data)
+        self.assertContains(response, error)
+        self.assertFalse(Ticket.objects.exists())
+        self.assertEqual(os.listdir(STAGING_DIR), [])
+
+    def test_valid_upload(self):
+        response = self.upload("Shot.PNG", PNG)
+        ticket = Ticket.objects.get()
+        self.assertRedirects(response, reverse("ticket_detail", args=[ticket.pk]), fetch_redirect_response=False)
+        attachment = ticket.attachments.get()
+        self.assertEqual(attachment.original_name, "Shot.PNG")
+        self.assertTrue(attachment_storage().exists(attachment.file.name))
+        self.assertEqual(os.listdir(STAGING_DIR), [])
+
+    def test_wrong_type_is_rejected(self):
+        self.assertRejected("notes.exe", PNG, "Only PDF and image files are allowed.")
+        self.assertRejected("notes.png", b"MZ" + b"\0" * 100, "Only PDF and image files are allowed.")
+        self.assertRejected("notes.pdf", PNG, "The file name extension does not match its content.")
+        self.assertRejected("tiny.png", b"\x89PNG", "Only PDF and image files are allowed.")
+
+    def test_file_over_10mb_is_rejected(self):
+        self.assertRejected("huge.png", PNG + b"\0" * (10 * 1024 * 1024), "Each file must be &lt;= 10MB.")
+
+
+class ImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.dept = Department.objects.create(name="IT")
+        User.objects.create_user(username="alice")
+
+    def import_file(self, lines, suffix=".jsonl"):
+        with tempfile.NamedTemporaryFile("w", suffix=suffix, delete=False) as f:
+            f.write("\n".join(lines) + "\n")
+        self.addCleanup(os.remove, f.name)
+        out, err = StringIO(), StringIO()
+        call_command("import_tickets", f.name, stdout=out, stderr=err)
+        return err.getvalue()
+
+    def test_malformed_lines_are_skipped(self):
+        record = {"employee": "alice", "department": "IT", "subject": "VPN down"}
+        errors = self.import_file([
+            json.dumps(record),
+            '{"employee": "alice", "department":',
+            json.dumps({**record, "comments": ["not an object"]}),
+            json.dumps([record]),
+            json.dumps({**record, "subject": "Printer jam", "ticket_id": "TCK00000001"}),
+        ])
+        self.assertEqual(sorted(Ticket.objects.values_list("subject", flat=True)), ["Printer jam", "VPN down"])
+        self.assertIn("line 2: malformed JSON", errors)
+        self.assertIn("line 3: malformed record", errors)
+        self.assertIn("line 4: not a JSON object", errors)
+
+    def test_reimport_does_not_duplicate_records_without_an_id(self):
+        lines = [
+            json.dumps({"employee": "alice", "department": "IT", "subject": subject})
+            for subject in ("VPN down", "Printer jam")
+        ]
+        self.import_file(lines)
+        ids = set(Ticket.objects.values_list("ticket_id", flat=True))
+        self.assertEqual(len(ids), 2)
+        self.import_file(lines)
+        self.assertEqual(set(Ticket.objects.values_list("ticket_id", flat=True)), ids)
+
+    def test_csv_errors_report_the_line(self):
+        errors = self.import_file([
+            "employee,department,subject,comments",
+            'alice,IT,"VPN\ndown",[]',
+            "alice,IT,Printer jam,[oops",
+        ], suffix=".csv")
+        self.assertEqual(list(Ticket.objects.values_list("subject", flat=True)), ["VPN\ndown"])
+        self.assertIn("line 4: malformed comments column", errors)
+
+
+@skipUnless(replica_configured(), "Set REPLICA_DATABASE_URL to test replica reads.")
+class ReplicaRoutingTests(TransactionTestCase):
+    # In tests the replica alias mirrors the test database. Rows must be
+    # committed for its connection to see them, hence TransactionTestCase.
+    # (The runner sets up the databases of skipped classes too.)
+    databases = {"default", REPLICA} if replica_configured() else {"default"}
+
+    def setUp(self):
+        call_command("setup_roles", stdout=StringIO())
+        self.employee = User.objects.create_user(username="employee", password="pw")
+        self.employee.groups.add(Group.objects.get(name="Employee"))
+        self.ticket = Ticket.objects.create(
+            employee=self.employee, department=Department.objects.create(name="IT"), subject="VPN", description="Down",
+        )
+
+    def test_list_reads_from_replica_until_a_write(self):
+        self.client.force_login(self.employee)
+        url = reverse("employee_ticket_list")
+        with CaptureQueriesContext(connections["default"]) as primary, \
+                CaptureQueriesContext(connections[REPLICA]) as replica:
+            self.client.get(url)
+        # Conditional GET precheck, the roles its ETag includes, the page
+        self.assertEqual(len(replica), 3)
+        self.assertFalse(any("tickets_ticket" in q["sql"] for q in primary.captured_queries))
+
+        response = self.client.post(reverse("ticket_add_comment", args=[self.ticket.pk]), {"message": "Any news?"})
+        self.assertIn(PIN_COOKIE, response.cookies)
+        with CaptureQueriesContext(connections[REPLICA]) as replica:
+            self.client.get(url)
+        self.assertEqual(len(replica), 0)
+
+    def test_export_streams_from_replica_under_asgi(self):
+        manager = User.objects.create_user(username="manager", password="pw")
+        manager.groups.add(Group.objects.get(name="Manager"))
+        self.async_client.force_login(manager)
+
+        async def download():
+            response = await self.async_client.get(reverse("manager_ticket_export"))
+            return b"".join([chunk async for chunk in response.streaming_content])
+
+        # The rows are read while the body streams, after the view returned
+        with CaptureQueriesContext(connections["default"]) as primary, \
+                CaptureQueriesContext(connections[REPLICA]) as replica:
+            body = async_to_sync(download)()
+        self.assertIn(self.ticket.ticket_id.encode(), body)
+        self.assertTrue(any("tickets_ticket" in q["sql"] for q in replica.captured_queries))
+        self.assertFalse(any("tickets_ticket" in q["sql"] for q in primary.captured_queries))
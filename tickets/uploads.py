@@ -0,0 +1,111 @@
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+
+MAX_ATTACHMENT_SIZE = 10 * 1024 * 1024
+
+# Leading bytes of each allowed type; the client's Content-Type is not trusted
+SIGNATURES = [
+    (b"%PDF-", "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+]
+SNIFF_LENGTH = 12
+# File name extensions allowed for each type; the stored blob keeps the extension
+EXTENSIONS = {
+    "application/pdf": (".pdf",),
+    "image/png": (".png",),
+    "image/jpeg": (".jpg", ".jpeg"),
+    "image/webp": (".webp",),
+}
+TYPE_ERROR = "Only PDF and image files are allowed."
+
+
+def sniff_content_type(head):
+    for signature, content_type in SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def staging_dir():
+    # Inside MEDIA_ROOT so the final save is a rename on the same filesystem
+    path = getattr(settings, "ATTACHMENT_STAGING_DIR", os.path.join(settings.MEDIA_ROOT, ".staging"))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class StagedUploadedFile(TemporaryUploadedFile):
+    """A TemporaryUploadedFile created in the staging dir, with its sha256 and validation error."""
+
+    def __init__(self, name, content_type, size, charset, content_type_extra=None):
+        _, ext = os.path.splitext(name)
+        file = tempfile.NamedTemporaryFile(suffix=".upload" + ext, dir=staging_dir())
+        super(TemporaryUploadedFile, self).__init__(file, name, content_type, size, charset, content_type_extra)
+        self.sha256 = None
+        self.error = None
+
+
+class AttachmentUploadHandler(FileUploadHandler):
+    """
+    Streams files posted as `attachments` straight to the staging dir.
+
+    Each chunk is hashed and written as it arrives, so memory stays at one
+    chunk per request and storage only has to rename the file into place.
+    The type is checked from the first bytes (and must match the name's
+    extension) and the size limit as the data streams in; a rejected file
+    stops being written immediately and is returned with `.error` set.
+    """
+
+    field_name_to_handle = "attachments"
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.file = None
+        if field_name != self.field_name_to_handle:
+            return
+        self.file = StagedUploadedFile(self.file_name, self.content_type, 0, self.charset, self.content_type_extra)
+        self.hasher = hashlib.sha256()
+        self.head = b""
+        self.extension = os.path.splitext(self.file_name or "")[1].lower()
+        if not any(self.extension in extensions for extensions in EXTENSIONS.values()):
+            self.file.error = TYPE_ERROR
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.file is None:
+            return raw_data
+        if self.file.error:
+            return None
+
+        if len(self.head) < SNIFF_LENGTH:
+            self.head += raw_data[:SNIFF_LENGTH - len(self.head)]
+            if len(self.head) >= SNIFF_LENGTH and sniff_content_type(self.head) is None:
+                self.file.error = TYPE_ERROR
+                return None
+        if start + len(raw_data) > MAX_ATTACHMENT_SIZE:
+            self.file.error = "Each file must be <= 10MB."
+            return None
+
+        self.hasher.update(raw_data)
+        self.file.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if self.file is None:
+            return None
+        content_type = sniff_content_type(self.head)
+        if content_type is None and not self.file.error:
+            self.file.error = TYPE_ERROR
+        elif content_type and self.extension not in EXTENSIONS[content_type] and not self.file.error:
+            self.file.error = "The file name extension does not match its content."
+        self.file.content_type = content_type
+        self.file.sha256 = self.hasher.hexdigest()
+        self.file.size = file_size
+        self.file.seek(0)
+        return self.file
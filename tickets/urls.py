@@ -8,6 +8,9 @@ urlpatterns = [
 
     # manager
     path("manager/", views.manager_ticket_list, name="manager_ticket_list"),
+    path("manager/dashboard/", views.manager_dashboard, name="manager_dashboard"),
+    path("manager/bulk/", views.manager_ticket_bulk, name="manager_ticket_bulk"),
+    path("manager/export/", views.manager_ticket_export, name="manager_ticket_export"),
     path("manager/<int:pk>/assign/", views.manager_ticket_assign, name="manager_ticket_assign"),
     path("manager/<int:pk>/duplicate/", views.manager_ticket_duplicate, name="manager_ticket_duplicate"),
 
@@ -15,6 +18,9 @@ urlpatterns = [
     path("support/", views.support_ticket_list, name="support_ticket_list"),
 
     # shared
+    path("search/", views.ticket_search, name="ticket_search"),
+    path("events/", views.ticket_events, name="ticket_events"),
     path("<int:pk>/", views.ticket_detail, name="ticket_detail"),
     path("<int:pk>/comment/", views.ticket_add_comment, name="ticket_add_comment"),
+    path("attachments/<int:pk>/preview/", views.attachment_preview, name="attachment_preview"),
 ]
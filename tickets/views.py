@@ -1,143 +1,408 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
 from django.contrib.auth.decorators import login_required, permission_required
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponseForbidden
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, StreamingHttpResponse
+from django.utils import timezone
 from django.contrib.auth.models import User
-from .models import Ticket, TicketAttachment, TicketComment, SupportProfile
-from .forms import TicketCreateForm, TicketUpdateManagerForm, TicketUpdateSupportForm, CommentForm
-
-def is_manager(user): return user.groups.filter(name="Manager").exists()
-def is_support(user): return user.groups.filter(name="Support").exists()
-def is_employee(user): return user.groups.filter(name="Employee").exists() or (not is_manager(user) and not is_support(user))
+from django.db import transaction
+from django.db.models import Subquery
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from accounts.roles import aget_roles, is_manager, is_support, is_employee
+from helpdesk_support.routers import using_replica
+from jobs.queue import enqueue
+from .models import (
+    ArchivedAttachment, ArchivedTicket, Department, Ticket, TicketAttachment, TicketComment,
+    SupportProfile,
+)
+from .forms import (
+    BulkTicketActionForm, TicketCreateForm, TicketUpdateManagerForm, TicketUpdateSupportForm, CommentForm,
+)
+from .pagination import akeyset_paginate, keyset_paginate
+from .access import visible_tickets
+from .conditional import conditional, list_state, ticket_state
+from .uploads import AttachmentUploadHandler
+from .blobs import retain_blobs
+from .bulk import BulkActionError, apply_bulk_action
+from .assignment import department_support, load_label
+from .events import can_see, format_sse, get_broker, streaming_supported
+from . import export, fragments, metrics, previews, search, similarity
+
+EVENT_HEARTBEAT = 15  # seconds; keeps proxies from closing an idle stream
+
+def _employee_lists(request):
+    # Lists on the page by pagination prefix, for the conditional GET precheck
+    return {"": Ticket.objects.filter(employee=request.user)}
 
 @login_required
-def employee_ticket_list(request):
-    tickets = Ticket.objects.filter(employee=request.user).order_by("-created_at")
-    return render(request, "tickets/employee_ticket_list.html", {"tickets": tickets})
+@using_replica
+@conditional(list_state(_employee_lists))
+async def employee_ticket_list(request):
+    user = request.user = await request.auser()
+    tickets = await akeyset_paginate(Ticket.objects.filter(employee=user), request)
+    return render(request, "tickets/employee_ticket_list.html", {
+        "tickets": tickets, "row_timeout": settings.FRAGMENT_CACHE_TIMEOUT,
+    })
 
+@csrf_exempt
 @login_required
 def ticket_create(request):
+    # Upload handlers must be swapped in before CSRF reads request.POST
+    request.upload_handlers.insert(0, AttachmentUploadHandler(request))
+    return _ticket_create(request)
+
+@csrf_protect
+def _ticket_create(request):
     if request.method == "POST":
         form = TicketCreateForm(request.POST)
         files = request.FILES.getlist("attachments")
         if form.is_valid():
-            # Validate attachments server-side
-            allowed = {"application/pdf", "image/png", "image/jpeg", "image/jpg", "image/webp"}
-            max_size = 10 * 1024 * 1024
-            attachments_error = None
-            for f in files:
-                if getattr(f, "content_type", None) not in allowed:
-                    attachments_error = "Only PDF and image files are allowed."
-                    break
-                if f.size > max_size:
-                    attachments_error = "Each file must be <= 10MB."
-                    break
+            # Type (from magic bytes) and size were checked while streaming
+            attachments_error = next((f.error for f in files if getattr(f, "error", None)), None)
 
             if attachments_error:
+                for f in files:
+                    f.close()
                 return render(request, "tickets/ticket_create.html", {"form": form, "attachments_error": attachments_error})
 
-            ticket = form.save(commit=False)
-            ticket.employee = request.user
-            ticket.save()
-
-            for f in files:
-                TicketAttachment.objects.create(ticket=ticket, file=f, uploaded_by=request.user)
+            with transaction.atomic():
+                # Auto-assignment (tickets.assignment) claims a support user on save
+                ticket = form.save(commit=False)
+                ticket.employee = request.user
+                # Link to an open ticket about the same problem, and index this
+                # one right away so the next report of an outage finds it
+                sig = similarity.signature(ticket.subject, ticket.description)
+                ticket.duplicate_of_id = similarity.likely_duplicate(ticket, sig)
+                ticket.save()
+                similarity.index_ticket(ticket, sig, created=True)
+
+                # Staged files are renamed into place (or dropped if the content is
+                # already stored), then inserted in one query
+                attachments = TicketAttachment.objects.bulk_create([
+                    TicketAttachment(ticket=ticket, file=f, original_name=f.name, uploaded_by=request.user)
+                    for f in files
+                ])
+                retain_blobs(attachments)
+            if attachments:
+                enqueue("tickets.generate_previews", {"ticket_id": ticket.pk})
+            if ticket.duplicate_of_id:
+                messages.info(request, "A similar ticket is already open; support may handle them together.")
 
             return redirect("ticket_detail", pk=ticket.pk)
     else:
         form = TicketCreateForm()
     return render(request, "tickets/ticket_create.html", {"form": form})
 
+def _manager_lists(request):
+    if not is_manager(request.user):
+        return None
+    tickets = Ticket.objects.all()
+    # ?duplicates_of=<pk>: the tickets linked to one as its likely duplicates
+    duplicates_of = request.GET.get("duplicates_of", "")
+    if duplicates_of.isdigit():
+        tickets = tickets.filter(duplicate_of_id=duplicates_of)
+    return {"": tickets}
+
 @login_required
-def manager_ticket_list(request):
+@using_replica
+@conditional(list_state(_manager_lists))
+async def manager_ticket_list(request):
+    user = request.user = await request.auser()
+    await aget_roles(user)
+    if not is_manager(user):
+        return HttpResponseForbidden("Managers only.")
+    tickets = await akeyset_paginate(
+        _manager_lists(request)[""].select_related("employee", "department", "assigned_support"), request
+    )
+    # Choices for the bulk action bar
+    support_staff = [u async for u in User.objects.filter(groups__name="Support").only("id", "username")]
+    departments = [d async for d in Department.objects.all()]
+    return render(request, "tickets/manager_ticket_list.html", {
+        "tickets": tickets,
+        "support_staff": support_staff,
+        "departments": departments,
+        "statuses": Ticket.Status.choices,
+        "row_timeout": settings.FRAGMENT_CACHE_TIMEOUT,
+        "duplicates_of": request.GET.get("duplicates_of", ""),
+    })
+
+@login_required
+@using_replica
+def manager_dashboard(request):
     if not is_manager(request.user):
         return HttpResponseForbidden("Managers only.")
-    tickets = Ticket.objects.all().order_by("-created_at")
-    return render(request, "tickets/manager_ticket_list.html", {"tickets": tickets})
+    try:
+        days = min(max(int(request.GET.get("days", 30)), 1), 365)
+    except ValueError:
+        days = 30
+    # Rollups only: the cost grows with departments, not tickets
+    rows, totals = metrics.dashboard(days)
+    for row in [*rows, totals]:
+        for key in ("median_first_response", "median_resolution"):
+            row[key] = metrics.format_duration(row[key])
+    workload = SupportProfile.objects.select_related("user", "department").order_by("-open_tickets", "user__username")
+    return render(request, "tickets/manager_dashboard.html", {
+        "rows": rows,
+        "totals": totals,
+        "days": days,
+        "statuses": [label for _, label in Ticket.Status.choices],
+        "workload": workload,
+    })
 
 @login_required
-def support_ticket_list(request):
+def manager_ticket_bulk(request):
+    if not is_manager(request.user):
+        return HttpResponseForbidden("Managers only.")
+    if request.method != "POST":
+        return redirect("manager_ticket_list")
+
+    form = BulkTicketActionForm(request.POST)
+    if not form.is_valid():
+        for errors in form.errors.values():
+            for error in errors:
+                messages.warning(request, error)
+        return redirect("manager_ticket_list")
+    try:
+        count = apply_bulk_action(
+            form.tickets(), form.cleaned_data["action"], request.user,
+            support=form.cleaned_data["support"], status=form.cleaned_data["status"],
+        )
+    except BulkActionError as e:
+        messages.warning(request, str(e))
+    else:
+        messages.success(request, f"Updated {count} ticket{'s' if count != 1 else ''}.")
+    return redirect("manager_ticket_list")
+
+@login_required
+@using_replica
+def manager_ticket_export(request):
+    if not is_manager(request.user):
+        return HttpResponseForbidden("Managers only.")
+    fmt = request.GET.get("format", "csv")
+    try:
+        queryset = export.export_queryset(
+            request.GET.get("from"), request.GET.get("to"),
+            request.GET.getlist("status"), request.GET.get("department"),
+        )
+        lines = export.stream(fmt, queryset)
+    except export.ExportError as e:
+        return HttpResponseBadRequest(str(e))
+    if streaming_supported(request):
+        lines = export.astream(lines)
+
+    content_type = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    response = StreamingHttpResponse(lines, content_type=f"{content_type}; charset=utf-8")
+    filename = f"tickets-{timezone.localdate():%Y%m%d}.{fmt}"
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+def _support_lists(request):
     if not is_support(request.user):
+        return None
+    department = SupportProfile.objects.filter(user=request.user).values("department_id")[:1]
+    return {
+        "mine_": Ticket.objects.filter(assigned_support=request.user),
+        "unassigned_": Ticket.objects.filter(department_id=Subquery(department), assigned_support__isnull=True),
+    }
+
+@login_required
+@using_replica
+@conditional(list_state(_support_lists))
+async def support_ticket_list(request):
+    user = request.user = await request.auser()
+
+    # Role check and support profile (to find department) in parallel
+    _, profile = await asyncio.gather(
+        aget_roles(user),
+        SupportProfile.objects.select_related("department").filter(user=user).afirst(),
+    )
+    if not is_support(user):
         return HttpResponseForbidden("Support staff only.")
-    
-    # Get support profile to find department
-    try:
-        profile = request.user.supportprofile
-        dept = profile.department
-    except SupportProfile.DoesNotExist:
-        dept = None
-
-    # Tickets assigned to me
-    my_tickets = Ticket.objects.filter(assigned_support=request.user).order_by("-created_at")
-    
-    # Tickets unassigned in my department
-    unassigned_tickets = Ticket.objects.none()
+    dept = profile.department if profile else None
+
+    # Tickets assigned to me, and unassigned in my department
+    pages = [akeyset_paginate(Ticket.objects.filter(assigned_support=user), request, prefix="mine_")]
     if dept:
-        unassigned_tickets = Ticket.objects.filter(
-            department=dept,
-            assigned_support__isnull=True
-        ).order_by("-created_at")
+        pages.append(akeyset_paginate(
+            Ticket.objects.filter(department=dept, assigned_support__isnull=True),
+            request, prefix="unassigned_"
+        ))
+    my_tickets, *unassigned = await asyncio.gather(*pages)
+    unassigned_tickets = unassigned[0] if unassigned else Ticket.objects.none()
 
     return render(request, "tickets/support_ticket_list.html", {
         "my_tickets": my_tickets,
         "unassigned_tickets": unassigned_tickets,
-        "department": dept
+        "department": dept,
+        "row_timeout": settings.FRAGMENT_CACHE_TIMEOUT,
     })
 
 @login_required
-def ticket_detail(request, pk):
-    ticket = get_object_or_404(Ticket, pk=pk)
+def ticket_search(request):
+    query = request.GET.get("q", "").strip()
+    tickets = None
+    if query:
+        # Same visibility as ticket_detail; employees never match on internal notes
+        qs = search.search(
+            visible_tickets(request.user).select_related("employee", "department", "assigned_support"),
+            query,
+            include_internal=not is_employee(request.user),
+        )
+        tickets = keyset_paginate(qs, request)
+    return render(request, "tickets/ticket_search.html", {"query": query, "tickets": tickets})
+
+async def _aget_ticket(pk):
+    # Archived tickets (tickets.archive) are looked up only when there is no live one
+    related = ("employee", "department", "assigned_support")
+    for model, extra in ((Ticket, ("duplicate_of",)), (ArchivedTicket, ())):
+        try:
+            return await model.objects.select_related(*related, *extra).aget(pk=pk)
+        except model.DoesNotExist:
+            pass
+    raise Http404("No such ticket.")
+
+@login_required
+@conditional(ticket_state)
+async def ticket_detail(request, pk):
+    user = request.user = await request.auser()
+
+    # The fragment version is read before the ticket, so a fragment is never
+    # stored under a version newer than the data it was rendered from
+    version = await fragments.aversion(pk)
+    roles, ticket = await asyncio.gather(aget_roles(user), _aget_ticket(pk))
+    archived = isinstance(ticket, ArchivedTicket)
 
     # Access control:
-    if is_manager(request.user):
+    if is_manager(user):
         pass
-    elif is_support(request.user):
+    elif is_support(user):
         # Support can view if assigned OR if unassigned and in own department
-        try:
-            profile = request.user.supportprofile
-            is_same_dept = (ticket.department == profile.department)
-        except SupportProfile.DoesNotExist:
-            is_same_dept = False
+        dept_id = await SupportProfile.objects.filter(user=user).values_list("department_id", flat=True).afirst()
+        is_same_dept = dept_id is not None and ticket.department_id == dept_id
 
-        if ticket.assigned_support != request.user and not (is_same_dept and ticket.assigned_support is None):
+        if ticket.assigned_support_id != user.id and not (is_same_dept and ticket.assigned_support_id is None):
             return HttpResponseForbidden("You can only view your assigned tickets or unassigned tickets in your department.")
     else:
         # employee
-        if ticket.employee != request.user:
+        if ticket.employee_id != user.id:
             return HttpResponseForbidden("You can only view your own tickets.")
 
-    # Update forms (manager vs support)
+    # Update forms (manager vs support); validating, saving and rendering
+    # model choice fields all hit the DB, so they run through sync_to_async
     manager_form = None
     support_form = None
 
-    if is_manager(request.user):
+    if archived:
+        pass  # read-only
+    elif is_manager(user):
         if request.method == "POST" and request.POST.get("form_type") == "manager_update":
             manager_form = TicketUpdateManagerForm(request.POST, instance=ticket)
-            if manager_form.is_valid():
-                manager_form.save()
+            if await sync_to_async(manager_form.is_valid)():
+                await sync_to_async(manager_form.save)()
                 return redirect("ticket_detail", pk=ticket.pk)
         else:
             manager_form = TicketUpdateManagerForm(instance=ticket)
 
-        # For assignment: show only support of same department (optional)
-        # If you want strict department-wise assignment, filter here:
-        support_staff = User.objects.filter(groups__name="Support")
-        manager_form.fields["assigned_support"].queryset = support_staff
+        # For assignment: support of the ticket's department, least loaded first
+        field = manager_form.fields["assigned_support"]
+        field.queryset = department_support(ticket)
+        field.label_from_instance = load_label
 
-    elif is_support(request.user):
+    elif is_support(user):
         if request.method == "POST" and request.POST.get("form_type") == "support_update":
             support_form = TicketUpdateSupportForm(request.POST, instance=ticket)
-            if support_form.is_valid():
-                support_form.save()
+            if await sync_to_async(support_form.is_valid)():
+                await sync_to_async(support_form.save)()
                 return redirect("ticket_detail", pk=ticket.pk)
         else:
             support_form = TicketUpdateSupportForm(instance=ticket)
 
-    return render(request, "tickets/ticket_detail.html", {
-        "ticket": ticket,
+    return await sync_to_async(_render_ticket_detail)(request, ticket, roles, version, {
         "manager_form": manager_form,
         "support_form": support_form,
+        "archived": archived,
+    })
+
+def _render_ticket_detail(request, ticket, roles, version, context):
+    # Related querysets are built here, not in the async view: building one
+    # looks up the DB connection, which is per thread. They only run when
+    # the cached fragments are missing.
+    comments = ticket.comments.select_related("author")
+    if fragments.audience(roles) == fragments.EMPLOYEE:
+        comments = comments.filter(is_internal=False)
+    return render(request, "tickets/ticket_detail.html", {
+        **context,
+        "ticket": ticket,
+        "attachments": ticket.attachments.all(),
+        "comments": comments,
+        "fragment": fragments.context(version, roles),
     })
 
+@login_required
+def attachment_preview(request, pk):
+    attachment = TicketAttachment.objects.filter(pk=pk).first() or get_object_or_404(ArchivedAttachment, pk=pk)
+    model = ArchivedTicket if isinstance(attachment, ArchivedAttachment) else Ticket
+    if not visible_tickets(request.user, model).filter(pk=attachment.ticket_id).exists():
+        return HttpResponseForbidden("Not your ticket.")
+
+    # Usually pre-rendered by the generate_previews job; rendered here otherwise
+    path = previews.ensure_preview(attachment)
+    if path is None:
+        raise Http404("No preview for this attachment.")
+    response = FileResponse(open(path, "rb"), content_type="image/webp")
+    # Keyed by content hash, so a preview never changes for a given attachment
+    response["Cache-Control"] = "private, max-age=604800, immutable"
+    return response
+
+@login_required
+async def ticket_events(request):
+    """
+    Server-Sent Events stream of ticket/comment deltas the user may see.
+    ?ticket=<pk> narrows it to one ticket (the detail page). Only served
+    under ASGI; see README.
+    """
+    if not streaming_supported(request):
+        return HttpResponse("Live updates need the ASGI server.", status=501, content_type="text/plain")
+    user = request.user = await request.auser()
+    roles, dept_id = await asyncio.gather(
+        aget_roles(user),
+        SupportProfile.objects.filter(user=user).values_list("department_id", flat=True).afirst(),
+    )
+    try:
+        only_ticket = int(request.GET["ticket"]) if request.GET.get("ticket") else None
+    except ValueError:
+        only_ticket = None
+
+    async def stream():
+        # Subscribe inside the generator so an unconsumed response leaks nothing
+        subscription = get_broker().subscribe()
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), EVENT_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                if subscription.overflowed:
+                    # Fell behind and lost events: tell the page to reload
+                    subscription.overflowed = False
+                    yield "event: resync\ndata: {}\n\n"
+                if only_ticket is not None and event["ticket"] != only_ticket:
+                    continue
+                if can_see(event, user.id, roles, dept_id):
+                    yield format_sse(event)
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # nginx: don't buffer the stream
+    return response
+
 @login_required
 def ticket_add_comment(request, pk):
     ticket = get_object_or_404(Ticket, pk=pk)
@@ -146,10 +411,10 @@ def ticket_add_comment(request, pk):
     if is_manager(request.user):
         pass
     elif is_support(request.user):
-        if ticket.assigned_support != request.user:
+        if ticket.assigned_support_id != request.user.id:
             return HttpResponseForbidden("Not your ticket.")
     else:
-        if ticket.employee != request.user:
+        if ticket.employee_id != request.user.id:
             return HttpResponseForbidden("Not your ticket.")
 
     if request.method == "POST":
@@ -181,8 +446,7 @@ def manager_ticket_assign(request, pk):
         ticket.save()
         return redirect("ticket_detail", pk=ticket.pk)
 
-    support_staff = User.objects.filter(groups__name="Support")
-    return render(request, "tickets/manager_assign.html", {"ticket": ticket, "support_staff": support_staff})
+    return render(request, "tickets/manager_assign.html", {"ticket": ticket, "support_staff": department_support(ticket)})
 
 @login_required
 def manager_ticket_duplicate(request, pk):
@@ -191,15 +455,16 @@ def manager_ticket_duplicate(request, pk):
 
     ticket = get_object_or_404(Ticket, pk=pk)
     new_ticket = Ticket.objects.create(
-        employee=ticket.employee,
-        department=ticket.department,
+        employee_id=ticket.employee_id,
+        department_id=ticket.department_id,
         subject=f"[Duplicate] {ticket.subject}",
         description=ticket.description,
         status=Ticket.Status.NEW,
     )
-    # copy attachments (file copy is not performed, just references - for real copy, you’d need file duplication)
-    for att in ticket.attachments.all():
-        TicketAttachment.objects.create(ticket=new_ticket, file=att.file, uploaded_by=request.user)
+    # copy attachments in the background (content-addressed: new rows + references only)
+    enqueue("tickets.copy_attachments", {
+        "source_id": ticket.pk, "target_id": new_ticket.pk, "user_id": request.user.pk,
+    })
 
     TicketComment.objects.create(
         ticket=new_ticket,
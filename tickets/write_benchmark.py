@@ -0,0 +1,137 @@
+"""
+Write-contention benchmark (bench_writes): several processes post comments
+through ticket_add_comment, and now and then a ticket through ticket_create,
+at once, optionally next to processes reading ticket_detail, for a fixed
+time. Run once per database profile:
+
+  "configured": DATABASES as configured (helpdesk_support.database: WAL,
+                synchronous=NORMAL, busy_timeout, mmap, BEGIN IMMEDIATE,
+                persistent connections),
+  "baseline":   SQLite defaults: rollback journal, no pragmas, a new
+                connection per request (CONN_MAX_AGE=0).
+
+Each process is a fresh interpreter (the "spawn" start method), like a
+server process, and closes or keeps its connection after every request as
+the request handler would. The comments and tickets are deleted afterwards.
+Nothing from the tickets app is imported at module level so child
+processes can load this module before django.setup().
+"""
+import logging
+import multiprocessing
+import time
+
+import django
+
+PROFILES = ("baseline", "configured")
+BASELINE = {"OPTIONS": {}, "CONN_MAX_AGE": 0, "CONN_HEALTH_CHECKS": False}
+MESSAGE = "bench_writes: write-contention benchmark comment."
+SUBJECT = "bench_writes ticket"
+# One write in CREATE_EVERY creates a ticket (a transaction that reads
+# before it writes) instead of adding a comment
+CREATE_EVERY = 10
+START_TIMEOUT = 120
+
+
+def _worker(profile, cookie, plan, seconds, barrier, results):
+    django.setup()
+    from django.conf import settings
+    from django.db import close_old_connections, connection
+    from django.test import Client
+
+    if profile == "baseline":
+        connection.settings_dict.update(BASELINE)
+    # Failed and slow requests are counted, not logged one by one
+    logging.getLogger("django.request").setLevel(logging.CRITICAL)
+    logging.getLogger("helpdesk_support.requests").setLevel(logging.CRITICAL)
+    client = Client(raise_request_exception=False)
+    client.cookies[settings.SESSION_COOKIE_NAME] = cookie
+    latencies, errors, i = {}, {}, 0
+
+    barrier.wait(START_TIMEOUT)
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        kind, url, data = plan[i % len(plan)]
+        i += 1
+        started = time.perf_counter()
+        response = client.post(url, data) if data else client.get(url)
+        latencies.setdefault(kind, []).append(time.perf_counter() - started)
+        errors[kind] = errors.get(kind, 0) + (response.status_code >= 400)
+        # What the request handler does at request_finished (the test
+        # client leaves the connection open)
+        close_old_connections()
+    connection.close()
+    results.put((latencies, errors))
+
+
+def _cookie(user):
+    from django.conf import settings
+    from django.test import Client
+
+    client = Client()
+    client.force_login(user)
+    return client.cookies[settings.SESSION_COOKIE_NAME].value
+
+
+def _set_journal_mode(profile):
+    # journal_mode=WAL is stored in the database file: switch it back for
+    # the baseline, before any worker connects
+    from django.db import connection
+
+    mode = "DELETE" if profile == "baseline" else "WAL"
+    with connection.cursor() as cursor:
+        cursor.execute(f"PRAGMA journal_mode = {mode}")
+    connection.close()
+
+
+def run(fixtures, profile, writers=4, readers=0, seconds=10.0, create_every=CREATE_EVERY):
+    """Requests per second, latency and errors of one profile, per kind of request."""
+    from django.urls import reverse
+
+    from .benchmark import latency_summary
+    from .models import Ticket, TicketComment
+
+    writes = [
+        ("comment", reverse("ticket_add_comment", args=[pk]), {"message": MESSAGE}) for pk in fixtures.employee_tickets
+    ]
+    if create_every:
+        create = ("create", reverse("ticket_create"), {"department": fixtures.department, "subject": SUBJECT,
+                                                       "description": MESSAGE})
+        for i in range(create_every - 1, len(writes) + 1, create_every):
+            writes.insert(i, create)
+    reads = [("read", reverse("ticket_detail", args=[pk]), None) for pk in fixtures.tickets]
+    employee, manager = _cookie(fixtures.employee), _cookie(fixtures.manager)
+    _set_journal_mode(profile)
+
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(writers + readers)
+    results = context.Queue()
+    processes = []
+    for count, cookie, plan in ((writers, employee, writes), (readers, manager, reads)):
+        for n in range(count):
+            # Each process starts at a different ticket
+            rotated = plan[n:] + plan[:n]
+            processes.append(context.Process(target=_worker, args=(profile, cookie, rotated, seconds, barrier, results)))
+    for process in processes:
+        process.start()
+    outcomes = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    summary = {"profile": profile, "writers": writers, "readers": readers, "seconds": seconds, "requests": {}}
+    for kind in ("comment", "create", "read"):
+        latencies = [latency for done, _ in outcomes for latency in done.get(kind, ())]
+        if not latencies:
+            continue
+        errors = sum(failed.get(kind, 0) for _, failed in outcomes)
+        summary["requests"][kind] = {
+            "requests": len(latencies),
+            "errors": errors,
+            "per_second": round((len(latencies) - errors) / seconds, 1),
+            **latency_summary(latencies),
+        }
+    summary["comments_per_second"] = summary["requests"]["comment"]["per_second"]
+
+    # Clean up through the ORM so signals undo the counters and search entries
+    TicketComment.objects.filter(message=MESSAGE).delete()
+    Ticket.objects.filter(employee=fixtures.employee, subject=SUBJECT).delete()
+    return summary